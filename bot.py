@@ -89,6 +89,14 @@ async def on_startup():
         from services.publisher import init_publisher
         init_publisher(bot)
         
+        # Сброс кешей между репликами бота
+        from services.cache_bus import cache_bus
+        await cache_bus.start()
+        
+        # Общая HTTP-сессия для YandexGPT
+        from services.ai_service import ai_service
+        await ai_service.start()
+        
         logger.info("Bot startup completed")
         
     except Exception as e:
@@ -106,6 +114,12 @@ async def on_shutdown():
         from services.post_scheduler import post_scheduler
         await post_scheduler.stop_scheduler()
         
+        from services.cache_bus import cache_bus
+        await cache_bus.stop()
+        
+        from services.ai_service import ai_service
+        await ai_service.close()
+        
         await db.close()
         logger.info("Database connection closed")
         logger.info("Bot shutdown completed")
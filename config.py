@@ -1,6 +1,7 @@
 # Config loader
 
 import os
+import socket
 from typing import Optional, List
 from dotenv import load_dotenv
 
@@ -21,10 +22,30 @@ class Config:
     DB_NAME: str = os.getenv('DB_NAME', 'controllerbot_db')
     DB_USER: str = os.getenv('DB_USER', 'controllerbot')
     DB_PASSWORD: str = os.getenv('DB_PASSWORD', '')
+    DB_POOL_MIN_SIZE: int = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+    DB_POOL_MAX_SIZE: int = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+    DB_POOL_MAX_INACTIVE_LIFETIME: float = float(os.getenv('DB_POOL_MAX_INACTIVE_LIFETIME', '300'))
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '100'))
+    DB_COMMAND_TIMEOUT: float = float(os.getenv('DB_COMMAND_TIMEOUT', '60'))
+    # Реплика для отчетов и списков (пусто — все запросы идут на основную БД)
+    DB_REPLICA_DSN: str = os.getenv('DB_REPLICA_DSN', '')
+    DB_REPLICA_POOL_MAX_SIZE: int = int(os.getenv('DB_REPLICA_POOL_MAX_SIZE', '5'))
+    DB_REPLICA_MAX_LAG: float = float(os.getenv('DB_REPLICA_MAX_LAG', '10'))
+    DB_REPLICA_CHECK_INTERVAL: float = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5'))
+    # Медленные запросы: порог логирования (мс) и захват EXPLAIN (ANALYZE, BUFFERS)
+    DB_SLOW_QUERY_MS: float = float(os.getenv('DB_SLOW_QUERY_MS', '500'))
+    DB_EXPLAIN_SLOW_QUERIES: bool = os.getenv('DB_EXPLAIN_SLOW_QUERIES', 'false').lower() == 'true'
+    DB_EXPLAIN_INTERVAL: float = float(os.getenv('DB_EXPLAIN_INTERVAL', '600'))
     
     # YandexGPT
     YANDEX_API_KEY: Optional[str] = os.getenv('YANDEX_API_KEY')
     YANDEX_FOLDER_ID: Optional[str] = os.getenv('YANDEX_FOLDER_ID')
+    # Кеш ответов YandexGPT: записей в памяти, срок жизни (сек), общий кеш в PostgreSQL
+    AI_CACHE_SIZE: int = int(os.getenv('AI_CACHE_SIZE', '500'))
+    AI_CACHE_TTL: float = float(os.getenv('AI_CACHE_TTL', '86400'))
+    AI_CACHE_DB: bool = os.getenv('AI_CACHE_DB', 'false').lower() == 'true'
+    AI_MAX_CONCURRENCY: int = int(os.getenv('AI_MAX_CONCURRENCY', '4'))
+    AI_REQUEST_TIMEOUT: float = float(os.getenv('AI_REQUEST_TIMEOUT', '30'))
     
     # Logging
     LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
@@ -36,6 +57,40 @@ class Config:
     MAX_POST_LENGTH: int = int(os.getenv('MAX_POST_LENGTH', '4096'))
     MIN_TAGS_REQUIRED: int = int(os.getenv('MIN_TAGS_REQUIRED', '1'))
     
+    # Post scheduler
+    DISPATCHER_HORIZON_MINUTES: int = int(os.getenv('DISPATCHER_HORIZON_MINUTES', '60'))
+    DISPATCHER_RESYNC_SECONDS: int = int(os.getenv('DISPATCHER_RESYNC_SECONDS', '300'))
+    
+    # Publisher (лимиты Telegram Bot API)
+    PUBLISH_CONCURRENCY: int = int(os.getenv('PUBLISH_CONCURRENCY', '10'))
+    TELEGRAM_GLOBAL_RATE: float = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+    TELEGRAM_CHAT_PER_MINUTE: float = float(os.getenv('TELEGRAM_CHAT_PER_MINUTE', '20'))
+    
+    # Публикация несколькими репликами
+    INSTANCE_ID: str = os.getenv('INSTANCE_ID', f"{socket.gethostname()}:{os.getpid()}")
+    PUBLISH_CLAIM_BATCH: int = int(os.getenv('PUBLISH_CLAIM_BATCH', '100'))
+    PUBLISH_LEASE_SECONDS: int = int(os.getenv('PUBLISH_LEASE_SECONDS', '120'))
+    
+    # Пул воркеров публикации (канал закреплен за воркером по хешу)
+    PUBLISH_WORKERS: int = int(os.getenv('PUBLISH_WORKERS', '8'))
+    PUBLISH_QUEUE_SIZE: int = int(os.getenv('PUBLISH_QUEUE_SIZE', '100'))
+    
+    # Повторные попытки публикации (экспоненциальная задержка с jitter)
+    PUBLISH_MAX_RETRIES: int = int(os.getenv('PUBLISH_MAX_RETRIES', '3'))
+    PUBLISH_RETRY_DELAY: float = float(os.getenv('PUBLISH_RETRY_DELAY', '1'))
+    PUBLISH_RETRY_MAX_DELAY: float = float(os.getenv('PUBLISH_RETRY_MAX_DELAY', '300'))
+    
+    # Догоняющая публикация просроченных постов после простоя
+    CATCHUP_MAX_RATE: float = float(os.getenv('CATCHUP_MAX_RATE', '5'))
+    CATCHUP_PAGE_SIZE: int = int(os.getenv('CATCHUP_PAGE_SIZE', '100'))
+    
+    # Заблаговременная подготовка постов к отправке
+    PRERENDER_LOOKAHEAD_SECONDS: int = int(os.getenv('PRERENDER_LOOKAHEAD_SECONDS', '180'))
+    PRERENDER_CACHE_SIZE: int = int(os.getenv('PRERENDER_CACHE_SIZE', '500'))
+    
+    # Сброс кешей между репликами бота (LISTEN/NOTIFY): проверка LISTEN-подключения, сек
+    CACHE_BUS_CHECK_INTERVAL: float = float(os.getenv('CACHE_BUS_CHECK_INTERVAL', '30'))
+    
     @classmethod
     def validate(cls) -> bool:
         """Проверяет обязательные настройки"""
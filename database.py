@@ -1,62 +1,376 @@
 # Database connection
 
+import asyncio
+import hashlib
 import logging
-from typing import Optional, List, Any
+import time
+from pathlib import Path
+from typing import Optional, List, Any, Callable, Dict, Tuple
 from contextlib import asynccontextmanager
 
 import asyncpg
 from asyncpg import Pool
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 
 from config import config
-from models import Base
+from utils.metrics import Histogram, get_counter, get_histogram, increment, register_gauge
+from utils.query_stats import find_caller, fingerprint_query, is_read_query, normalize_query, redact_params
 
 logger = logging.getLogger(__name__)
 
+DEPLOY_DIR = Path(__file__).resolve().parent / 'deploy'
+# Ключ pg_advisory_lock для применения схемы: одна реплика за раз
+SCHEMA_LOCK_KEY = 4_210_014
+
+# Отставание реплики в секундах; 0, если все полученные WAL уже применены
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+# Ошибки подключения к реплике, после которых чтение повторяется на основной БД
+REPLICA_ERRORS = (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+
+# Предел различных (запрос, вызывающий метод) в статистике; остальные — в общую строку
+MAX_QUERY_STATS = 500
+# Сколько последних планов EXPLAIN хранить
+MAX_EXPLAIN_PLANS = 50
+
+class UnitOfWork:
+    """Запросы на одном подключении внутри одной транзакции (см. Database.transaction)
+    
+    round_trips — число запросов к серверу, выполненных через эту единицу работы.
+    """
+    
+    def __init__(self, conn: asyncpg.Connection, database: 'Database'):
+        self.conn = conn
+        self.round_trips = 0
+        self._db = database
+    
+    async def _call(self, method: str, query: str, args: tuple) -> Any:
+        self.round_trips += 1
+        return await self._db._call(self.conn, method, query, args)
+    
+    async def execute(self, query: str, *args) -> str:
+        """Выполняет SQL запрос без возврата данных"""
+        return await self._call('execute', query, args)
+    
+    async def executemany(self, query: str, args: List[tuple]) -> None:
+        """Выполняет запрос для каждого набора параметров (один пакет)"""
+        await self._call('executemany', query, (args,))
+    
+    async def fetch_one(self, query: str, *args) -> Optional[asyncpg.Record]:
+        """Выполняет запрос и возвращает одну запись"""
+        return await self._call('fetchrow', query, args)
+    
+    async def fetch_all(self, query: str, *args) -> List[asyncpg.Record]:
+        """Выполняет запрос и возвращает все записи"""
+        return await self._call('fetch', query, args)
+    
+    async def fetch_val(self, query: str, *args) -> Any:
+        """Выполняет запрос и возвращает одно значение"""
+        return await self._call('fetchval', query, args)
+    
+    async def notify(self, channel: str, payload: str = '') -> None:
+        """NOTIFY, который доставляется подписчикам только после COMMIT"""
+        await self.execute("SELECT pg_notify($1, $2)", channel, payload)
+
 class Database:
     """Менеджер подключения к PostgreSQL"""
     
     def __init__(self):
         self.pool: Optional[Pool] = None
-        self.engine = None
-        self.async_session = None
+        # Пул реплики для readonly-запросов (если задан DB_REPLICA_DSN)
+        self.replica_pool: Optional[Pool] = None
+        self.replica_lag: Optional[float] = None
+        self._replica_ok = False
+        self._replica_checked_at = 0.0
+        # SQLAlchemy нужен только миграциям и ORM-скриптам: создается при первом обращении
+        self._engine = None
+        self._async_session = None
+        # Выделенное подключение для LISTEN (не из пула)
+        self._listen_conn: Optional[asyncpg.Connection] = None
+        self._listeners: Dict[str, List[Callable]] = {}
+        # Именованные запросы: имя -> SQL (подготовку кеширует asyncpg на каждом подключении)
+        self._queries: Dict[str, str] = {}
+        # (имя запроса или отпечаток SQL, вызывающий метод) -> время выполнения
+        self._query_stats: Dict[Tuple[str, str], Histogram] = {}
+        # Планы EXPLAIN (ANALYZE, BUFFERS) медленных запросов по метке запроса
+        self._explain_plans: Dict[str, Dict[str, Any]] = {}
+        self._explain_tasks: set = set()
+        # Подключения, выданные из пула прямо сейчас
+        self._in_use = 0
+        register_gauge('db_pool_in_use', lambda: self._in_use)
+        register_gauge('db_pool_size', lambda: self.pool.get_size() if self.pool else 0)
+        self.schema_path = DEPLOY_DIR / 'schema.sql'
+        self.migrations_dir = DEPLOY_DIR / 'migrations'
+    
+    def _connect_kwargs(self) -> dict:
+        """Параметры подключения к PostgreSQL"""
+        return {
+            'host': config.DB_HOST,
+            'port': config.DB_PORT,
+            'database': config.DB_NAME,
+            'user': config.DB_USER,
+            'password': config.DB_PASSWORD,
+        }
     
     async def connect(self) -> None:
         """Создает пул подключений к БД"""
         try:
             # AsyncPG pool для прямых SQL запросов
             self.pool = await asyncpg.create_pool(
-                host=config.DB_HOST,
-                port=config.DB_PORT,
-                database=config.DB_NAME,
-                user=config.DB_USER,
-                password=config.DB_PASSWORD,
-                min_size=1,
-                max_size=10,
-                command_timeout=60
+                **self._connect_kwargs(),
+                min_size=config.DB_POOL_MIN_SIZE,
+                max_size=config.DB_POOL_MAX_SIZE,
+                max_inactive_connection_lifetime=config.DB_POOL_MAX_INACTIVE_LIFETIME,
+                statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+                command_timeout=config.DB_COMMAND_TIMEOUT
             )
-            logger.info("Database connection pool created")
-            
-            # SQLAlchemy engine для миграций и ORM
-            database_url = f"postgresql+asyncpg://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}"
-            self.engine = create_async_engine(database_url, echo=False)
-            self.async_session = sessionmaker(
-                self.engine, class_=AsyncSession, expire_on_commit=False
+            logger.info(
+                "Database connection pool created (min %s, max %s)",
+                config.DB_POOL_MIN_SIZE, config.DB_POOL_MAX_SIZE
             )
-            logger.info("SQLAlchemy engine created")
             
         except Exception as e:
             logger.error("Failed to connect to database: %s", e)
             raise
+        
+        if config.DB_REPLICA_DSN:
+            await self._connect_replica()
+    
+    async def _connect_replica(self) -> None:
+        """Создает пул реплики; без реплики бот продолжает работать на основной БД"""
+        try:
+            self.replica_pool = await asyncpg.create_pool(
+                dsn=config.DB_REPLICA_DSN,
+                min_size=1,
+                max_size=config.DB_REPLICA_POOL_MAX_SIZE,
+                max_inactive_connection_lifetime=config.DB_POOL_MAX_INACTIVE_LIFETIME,
+                statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+                command_timeout=config.DB_COMMAND_TIMEOUT
+            )
+            logger.info("Replica connection pool created (max %s)", config.DB_REPLICA_POOL_MAX_SIZE)
+        except Exception as e:
+            self.replica_pool = None
+            logger.warning("Replica unavailable, read-only queries will use primary: %s", e)
+    
+    async def _replica_available(self) -> bool:
+        """Можно ли читать с реплики: она доступна и отстает не больше DB_REPLICA_MAX_LAG
+        
+        Отставание проверяется не чаще раза в DB_REPLICA_CHECK_INTERVAL секунд.
+        """
+        if self.replica_pool is None:
+            return False
+        now = time.monotonic()
+        if now - self._replica_checked_at < config.DB_REPLICA_CHECK_INTERVAL:
+            return self._replica_ok
+        self._replica_checked_at = now
+        
+        try:
+            async with self.replica_pool.acquire() as conn:
+                self.replica_lag = float(await conn.fetchval(REPLICA_LAG_QUERY) or 0)
+        except Exception as e:
+            if self._replica_ok:
+                logger.warning("Replica unavailable, reading from primary: %s", e)
+            self._replica_ok = False
+            return False
+        
+        replica_ok = self.replica_lag <= config.DB_REPLICA_MAX_LAG
+        if replica_ok != self._replica_ok:
+            if replica_ok:
+                logger.info("Replica is back (lag %.1fs), routing read-only queries to it", self.replica_lag)
+            else:
+                logger.warning("Replica lag %.1fs exceeds %.1fs, reading from primary",
+                               self.replica_lag, config.DB_REPLICA_MAX_LAG)
+        self._replica_ok = replica_ok
+        return replica_ok
+    
+    async def _fetch_readonly(self, method: str, query: str, args: tuple, name: Optional[str] = None) -> Any:
+        """Выполняет читающий запрос на реплике, при недоступности — на основной БД"""
+        if await self._replica_available():
+            try:
+                async with self.replica_pool.acquire() as conn:
+                    result = await self._call(conn, method, query, args, name)
+                increment('db_replica_reads')
+                return result
+            except REPLICA_ERRORS as e:
+                # До следующей проверки читаем с основной БД
+                self._replica_ok = False
+                self._replica_checked_at = time.monotonic()
+                logger.warning("Replica query failed, retrying on primary: %s", e)
+        if self.replica_pool is not None:
+            increment('db_replica_fallbacks')
+        async with self.get_connection() as conn:
+            return await self._call(conn, method, query, args, name)
+    
+    async def _call(self, conn, method: str, query: str, args: tuple, name: Optional[str] = None) -> Any:
+        """Выполняет запрос на подключении и учитывает время (без ожидания пула)"""
+        started = time.perf_counter()
+        try:
+            return await getattr(conn, method)(query, *args)
+        finally:
+            self._observe(name, query, args, time.perf_counter() - started)
+    
+    def _observe(self, name: Optional[str], query: str, args: tuple, elapsed: float) -> None:
+        """Учитывает выполненный запрос: гистограмма по (запрос, вызывающий метод),
+        лог медленных запросов и, если включено, захват EXPLAIN
+        """
+        label = name or fingerprint_query(query)
+        caller = find_caller((__file__,))
+        key = (label, caller)
+        stats = self._query_stats.get(key)
+        if stats is None:
+            if len(self._query_stats) >= MAX_QUERY_STATS:
+                key = ('other', '?')
+                stats = self._query_stats.get(key)
+            if stats is None:
+                stats = self._query_stats[key] = Histogram(key[0], window=200)
+        stats.observe(elapsed)
+        get_histogram('db_query_seconds').observe(elapsed)
+        
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < config.DB_SLOW_QUERY_MS:
+            return
+        increment('db_slow_queries')
+        # Значения параметров (тексты постов, ID пользователей) в лог не пишем
+        logger.warning(
+            "Slow query %.0f ms [%s] from %s: %s params=%s",
+            elapsed_ms, label, caller, normalize_query(query)[:500], redact_params(args)
+        )
+        if config.DB_EXPLAIN_SLOW_QUERIES:
+            self._schedule_explain(label, query, args, elapsed_ms)
+    
+    def _schedule_explain(self, label: str, query: str, args: tuple, elapsed_ms: float) -> None:
+        """Запускает в фоне захват плана, не чаще раза в DB_EXPLAIN_INTERVAL на запрос"""
+        if self.pool is None or not is_read_query(query):
+            return
+        previous = self._explain_plans.get(label)
+        if previous and time.time() - previous['captured_at'] < config.DB_EXPLAIN_INTERVAL:
+            return
+        # Место занимается сразу, чтобы серия медленных вызовов не запустила несколько EXPLAIN
+        self._explain_plans[label] = {
+            'name': label, 'query': normalize_query(query), 'elapsed_ms': round(elapsed_ms, 1),
+            'captured_at': time.time(), 'plan': None
+        }
+        while len(self._explain_plans) > MAX_EXPLAIN_PLANS:
+            self._explain_plans.pop(next(iter(self._explain_plans)))
+        try:
+            task = asyncio.get_running_loop().create_task(self._capture_explain(label, query, args))
+        except RuntimeError:
+            return
+        self._explain_tasks.add(task)
+        task.add_done_callback(self._explain_tasks.discard)
+    
+    async def _capture_explain(self, label: str, query: str, args: tuple) -> None:
+        """EXPLAIN (ANALYZE, BUFFERS) в read-only транзакции, которая всегда откатывается"""
+        try:
+            async with self.pool.acquire() as conn:
+                transaction = conn.transaction(readonly=True)
+                await transaction.start()
+                try:
+                    rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {query}", *args)
+                finally:
+                    await transaction.rollback()
+            plan = '\n'.join(row[0] for row in rows)
+            entry = self._explain_plans.get(label)
+            if entry is not None:
+                entry['plan'] = plan
+            logger.warning("EXPLAIN for slow query [%s]:\n%s", label, plan)
+        except Exception as e:
+            logger.warning("Failed to capture EXPLAIN for [%s]: %s", label, e)
+    
+    def get_slow_query_plans(self) -> List[Dict[str, Any]]:
+        """Захваченные планы медленных запросов, от новых к старым"""
+        return sorted(self._explain_plans.values(), key=lambda item: item['captured_at'], reverse=True)
+    
+    @property
+    def engine(self):
+        """SQLAlchemy engine для миграций и ORM (создается лениво)"""
+        if self._engine is None:
+            # Импорт здесь: рантайму бота SQLAlchemy не нужен
+            from sqlalchemy.ext.asyncio import create_async_engine
+            database_url = f"postgresql+asyncpg://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}"
+            self._engine = create_async_engine(database_url, echo=False)
+            logger.info("SQLAlchemy engine created")
+        return self._engine
+    
+    @property
+    def async_session(self):
+        """Фабрика ORM-сессий (создается лениво вместе с engine)"""
+        if self._async_session is None:
+            from sqlalchemy.ext.asyncio import AsyncSession
+            from sqlalchemy.orm import sessionmaker
+            self._async_session = sessionmaker(
+                self.engine, class_=AsyncSession, expire_on_commit=False
+            )
+        return self._async_session
+    
+    def register_query(self, name: str, query: str) -> None:
+        """Регистрирует именованный запрос для вызова через fetch_*_named
+        
+        Объекты PreparedStatement между выдачами подключения не хранятся:
+        asyncpg привязывает их к выдаче из пула. Запрос подготавливается
+        один раз на подключении встроенным кешем (DB_STATEMENT_CACHE_SIZE).
+        """
+        if self._queries.get(name, query) != query:
+            raise ValueError(f"Query {name!r} is already registered with different SQL")
+        self._queries[name] = query
+    
+    async def _run_named(self, name: str, method: str, *args, readonly: bool = False) -> Any:
+        """Выполняет именованный запрос и учитывает время в статистике под его именем"""
+        if name not in self._queries:
+            raise KeyError(f"Query {name!r} is not registered")
+        query = self._queries[name]
+        if readonly and self.replica_pool is not None:
+            return await self._fetch_readonly(method, query, args, name)
+        async with self.get_connection() as conn:
+            return await self._call(conn, method, query, args, name)
+    
+    async def fetch_one_named(self, name: str, *args, readonly: bool = False) -> Optional[asyncpg.Record]:
+        """Выполняет именованный запрос и возвращает одну запись"""
+        return await self._run_named(name, 'fetchrow', *args, readonly=readonly)
+    
+    async def fetch_all_named(self, name: str, *args, readonly: bool = False) -> List[asyncpg.Record]:
+        """Выполняет именованный запрос и возвращает все записи"""
+        return await self._run_named(name, 'fetch', *args, readonly=readonly)
+    
+    async def fetch_val_named(self, name: str, *args, readonly: bool = False) -> Any:
+        """Выполняет именованный запрос и возвращает одно значение"""
+        return await self._run_named(name, 'fetchval', *args, readonly=readonly)
+    
+    def get_query_stats(self) -> List[Dict[str, Any]]:
+        """Статистика запросов по (имя или отпечаток, вызывающий метод), по убыванию суммарного времени"""
+        stats = [
+            {
+                'name': name,
+                'caller': caller,
+                'calls': histogram.count,
+                'total_seconds': round(histogram.total, 6),
+                'mean_seconds': round(histogram.mean, 6),
+                'p95_seconds': round(histogram.percentile(95), 6)
+            }
+            for (name, caller), histogram in self._query_stats.items()
+        ]
+        return sorted(stats, key=lambda item: item['total_seconds'], reverse=True)
     
     async def close(self) -> None:
         """Закрывает пул подключений"""
+        if self._listen_conn:
+            await self._listen_conn.close()
+            self._listen_conn = None
+            self._listeners.clear()
+        if self.replica_pool:
+            await self.replica_pool.close()
+            self.replica_pool = None
+            self._replica_ok = False
         if self.pool:
             await self.pool.close()
-        if self.engine:
-            await self.engine.dispose()
             logger.info("Database connection pool closed")
+        if self._engine:
+            await self._engine.dispose()
+            self._engine = None
+            self._async_session = None
     
     @asynccontextmanager
     async def get_connection(self):
@@ -64,42 +378,215 @@ class Database:
         if not self.pool:
             raise RuntimeError("Database not connected")
         
+        # Все подключения заняты: запрос будет ждать освобождения
+        if self._in_use >= self.pool.get_max_size():
+            increment('db_pool_saturation')
+        
+        started = time.perf_counter()
         async with self.pool.acquire() as connection:
-            yield connection
+            get_histogram('db_pool_acquire_seconds').observe(time.perf_counter() - started)
+            self._in_use += 1
+            try:
+                yield connection
+            finally:
+                self._in_use -= 1
+    
+    @asynccontextmanager
+    async def transaction(self):
+        """Единица работы: все запросы выполняются в одной транзакции
+        
+        async with db.transaction() as tx:
+            post_id = await tx.fetch_val(...)
+            await tx.execute(...)
+        
+        Исключение внутри блока откатывает все изменения.
+        """
+        async with self.get_connection() as conn:
+            async with conn.transaction():
+                yield UnitOfWork(conn, self)
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Состояние пула и время ожидания подключения"""
+        return {
+            'size': self.pool.get_size() if self.pool else 0,
+            'idle': self.pool.get_idle_size() if self.pool else 0,
+            'in_use': self._in_use,
+            'min_size': config.DB_POOL_MIN_SIZE,
+            'max_size': config.DB_POOL_MAX_SIZE,
+            'saturation_events': get_counter('db_pool_saturation'),
+            'acquire_seconds': get_histogram('db_pool_acquire_seconds').snapshot(),
+            'replica': self.get_replica_stats()
+        }
+    
+    def get_replica_stats(self) -> Dict[str, Any]:
+        """Состояние реплики и распределение readonly-запросов"""
+        return {
+            'configured': bool(config.DB_REPLICA_DSN),
+            'connected': self.replica_pool is not None,
+            'available': self._replica_ok,
+            'lag_seconds': self.replica_lag,
+            'max_lag_seconds': config.DB_REPLICA_MAX_LAG,
+            'reads': get_counter('db_replica_reads'),
+            'fallbacks': get_counter('db_replica_fallbacks')
+        }
     
     async def execute(self, query: str, *args) -> str:
         """Выполняет SQL запрос без возврата данных"""
         async with self.get_connection() as conn:
-            return await conn.execute(query, *args)
+            return await self._call(conn, 'execute', query, args)
     
-    async def fetch_one(self, query: str, *args) -> Optional[asyncpg.Record]:
-        """Выполняет запрос и возвращает одну запись"""
+    async def fetch_one(self, query: str, *args, readonly: bool = False) -> Optional[asyncpg.Record]:
+        """Выполняет запрос и возвращает одну запись (readonly=True — с реплики, если она настроена)"""
+        if readonly:
+            return await self._fetch_readonly('fetchrow', query, args)
         async with self.get_connection() as conn:
-            return await conn.fetchrow(query, *args)
+            return await self._call(conn, 'fetchrow', query, args)
     
-    async def fetch_all(self, query: str, *args) -> List[asyncpg.Record]:
-        """Выполняет запрос и возвращает все записи"""
+    async def fetch_all(self, query: str, *args, readonly: bool = False) -> List[asyncpg.Record]:
+        """Выполняет запрос и возвращает все записи (readonly=True — с реплики, если она настроена)"""
+        if readonly:
+            return await self._fetch_readonly('fetch', query, args)
         async with self.get_connection() as conn:
-            return await conn.fetch(query, *args)
+            return await self._call(conn, 'fetch', query, args)
     
-    async def fetch_val(self, query: str, *args) -> Any:
-        """Выполняет запрос и возвращает одно значение"""
+    async def fetch_val(self, query: str, *args, readonly: bool = False) -> Any:
+        """Выполняет запрос и возвращает одно значение (readonly=True — с реплики, если она настроена)"""
+        if readonly:
+            return await self._fetch_readonly('fetchval', query, args)
         async with self.get_connection() as conn:
-            return await conn.fetchval(query, *args)
+            return await self._call(conn, 'fetchval', query, args)
+    
+    async def notify(self, channel: str, payload: str = '') -> None:
+        """Отправляет NOTIFY в канал PostgreSQL"""
+        await self.execute("SELECT pg_notify($1, $2)", channel, payload)
+    
+    async def add_listener(self, channel: str, callback: Callable) -> None:
+        """Подписывается на LISTEN канал через выделенное подключение
+        
+        callback вызывается как callback(connection, pid, channel, payload).
+        Подписка запоминается до подключения: если БД сейчас недоступна,
+        ошибка пробрасывается, а ensure_listening подпишет callback при
+        следующем открытии подключения.
+        """
+        self._listeners.setdefault(channel, []).append(callback)
+        if not await self.ensure_listening():
+            # Подключение уже было открыто — ensure_listening подписки не восстанавливал
+            await self._listen_conn.add_listener(channel, callback)
+        logger.info("Listening on channel %s", channel)
+    
+    @property
+    def is_listening(self) -> bool:
+        """LISTEN-подключение открыто"""
+        return self._listen_conn is not None and not self._listen_conn.is_closed()
+    
+    async def ensure_listening(self) -> bool:
+        """Открывает LISTEN-подключение, если оно закрыто, и восстанавливает подписки
+        
+        Возвращает True, если подключение пришлось открыть заново: уведомления,
+        отправленные пока его не было, потеряны.
+        """
+        if self.is_listening:
+            return False
+        conn = await asyncpg.connect(**self._connect_kwargs())
+        try:
+            for existing_channel, callbacks in self._listeners.items():
+                for existing_callback in callbacks:
+                    await conn.add_listener(existing_channel, existing_callback)
+        except Exception:
+            # Подключение без всех подписок не считается открытым: следующая проверка повторит
+            await conn.close()
+            raise
+        self._listen_conn = conn
+        logger.info("LISTEN connection opened")
+        return True
     
-    async def init_schema(self) -> None:
-        """Инициализирует схему БД из schema.sql"""
+    async def remove_listener(self, channel: str, callback: Callable) -> None:
+        """Отписывается от LISTEN канала"""
+        callbacks = self._listeners.get(channel, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if self._listen_conn and not self._listen_conn.is_closed():
+            await self._listen_conn.remove_listener(channel, callback)
+    
+    def _read_schema_files(self) -> Tuple[str, List[Tuple[str, str, str]], str]:
+        """schema.sql, миграции [(имя, SQL, sha256)] по порядку имен и общий отпечаток"""
+        schema_sql = self.schema_path.read_text(encoding='utf-8')
+        fingerprint = hashlib.sha256(schema_sql.encode('utf-8'))
+        migrations = []
+        for path in sorted(self.migrations_dir.glob('*.sql')):
+            sql = path.read_text(encoding='utf-8')
+            checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+            migrations.append((path.name, sql, checksum))
+            fingerprint.update(f"\n{path.name}:{checksum}".encode('utf-8'))
+        return schema_sql, migrations, fingerprint.hexdigest()
+    
+    async def _stored_fingerprint(self, conn) -> Optional[str]:
+        """Отпечаток схемы, записанный в БД (None — схема еще не версионирована)"""
         try:
-            # Читаем схему из файла
-            with open('deploy/schema.sql', 'r', encoding='utf-8') as f:
-                schema_sql = f.read()
-            
-            # Выполняем схему
-            await self.execute(schema_sql)
-            logger.info("Database schema initialized")
+            return await conn.fetchval("SELECT fingerprint FROM schema_version WHERE id = 1")
+        except asyncpg.exceptions.UndefinedTableError:
+            return None
+    
+    async def init_schema(self) -> int:
+        """Приводит схему БД к deploy/schema.sql + deploy/migrations/*.sql
+        
+        Если отпечаток файлов совпадает с записанным в schema_version,
+        проверяется одна строка и больше ничего не выполняется. Иначе под
+        advisory lock (одна реплика за раз) выполняется schema.sql и один раз,
+        по порядку имен, — еще не примененные миграции. Возвращает количество
+        примененных миграций.
+        """
+        schema_sql, migrations, fingerprint = self._read_schema_files()
+        try:
+            async with self.get_connection() as conn:
+                if await self._stored_fingerprint(conn) == fingerprint:
+                    logger.info("Database schema is up to date (%s)", fingerprint[:12])
+                    return 0
+                
+                await conn.execute("SELECT pg_advisory_lock($1)", SCHEMA_LOCK_KEY)
+                try:
+                    # Пока ждали блокировку, схему могла обновить другая реплика
+                    if await self._stored_fingerprint(conn) == fingerprint:
+                        logger.info("Database schema was updated by another instance")
+                        return 0
+                    return await self._apply_schema(conn, schema_sql, migrations, fingerprint)
+                finally:
+                    await conn.execute("SELECT pg_advisory_unlock($1)", SCHEMA_LOCK_KEY)
         except Exception as e:
             logger.error("Failed to initialize schema: %s", e)
             raise
+    
+    async def _apply_schema(self, conn, schema_sql: str,
+                            migrations: List[Tuple[str, str, str]], fingerprint: str) -> int:
+        """Выполняет schema.sql и непримененные миграции, записывает отпечаток"""
+        # schema.sql идемпотентен и создает таблицы версий
+        await conn.execute(schema_sql)
+        
+        applied = {
+            row['name']: row['checksum']
+            for row in await conn.fetch("SELECT name, checksum FROM schema_migrations")
+        }
+        count = 0
+        for name, sql, checksum in migrations:
+            if name in applied:
+                if applied[name] != checksum:
+                    logger.warning("Migration %s changed after it was applied; not re-running", name)
+                continue
+            async with conn.transaction():
+                await conn.execute(sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (name, checksum) VALUES ($1, $2)",
+                    name, checksum
+                )
+            count += 1
+            logger.info("Applied migration %s", name)
+        
+        await conn.execute("""
+            INSERT INTO schema_version (id, fingerprint, updated_at) VALUES (1, $1, NOW())
+            ON CONFLICT (id) DO UPDATE SET fingerprint = EXCLUDED.fingerprint, updated_at = NOW()
+        """, fingerprint)
+        logger.info("Database schema initialized (%s migrations applied, %s)", count, fingerprint[:12])
+        return count
 
 # Глобальный экземпляр БД
 db = Database()
@@ -0,0 +1,15 @@
+-- Миграция: кеш ответов YandexGPT (AIResponseCache, AI_CACHE_DB=true)
+-- Ключ — sha256 от (операция, нормализованный текст, параметры, модель);
+-- таблица общая для всех реплик бота и переживает перезапуск
+
+CREATE TABLE IF NOT EXISTS ai_response_cache (
+  key text PRIMARY KEY,
+  operation text NOT NULL,
+  response text NOT NULL,
+  created_at timestamptz DEFAULT now(),
+  expires_at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_response_cache_expires ON ai_response_cache (expires_at);
+
+COMMENT ON TABLE ai_response_cache IS 'Ответы YandexGPT по хешу запроса, до expires_at';
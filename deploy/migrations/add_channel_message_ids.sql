@@ -0,0 +1,8 @@
+-- Миграция: ID опубликованных сообщений по каналам
+-- Альбом (sendMediaGroup) — это несколько сообщений; для удаления поста
+-- нужны ID всех элементов в каждом канале: {"<tg_channel_id>": [message_id, ...]}
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS channel_message_ids jsonb;
+
+COMMENT ON COLUMN posts.channel_message_ids IS 'ID сообщений поста по каналам (включая все элементы альбома)';
+COMMENT ON COLUMN posts.media_data IS 'Данные медиа: объект для одного файла или массив объектов для альбома';
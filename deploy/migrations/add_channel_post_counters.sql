@@ -0,0 +1,112 @@
+-- Миграция: счетчики постов по каналам (channel_post_counters, channel_post_daily)
+-- Таблицы поддерживаются триггером posts_channel_counters в той же транзакции,
+-- что и изменение поста; дашборды читают O(каналов) строк вместо COUNT по posts.
+-- После создания счетчики заполняются из существующих постов.
+
+-- Счетчики постов по каналам и статусам, поддерживаются триггером на posts.
+-- Дашборды читают их вместо COUNT(*) по всей таблице posts
+create table if not exists channel_post_counters (
+  channel_id bigint not null references channels(id) on delete cascade,
+  status post_status not null,
+  posts bigint not null default 0,
+  media_posts bigint not null default 0,  -- media_type is not null
+  scheduled_posts bigint not null default 0,  -- scheduled_at is not null
+  primary key (channel_id, status)
+);
+
+-- Созданные и опубликованные посты по дням (UTC)
+create table if not exists channel_post_daily (
+  channel_id bigint not null references channels(id) on delete cascade,
+  day date not null,
+  created bigint not null default 0,
+  published bigint not null default 0,
+  primary key (channel_id, day)
+);
+
+create or replace function channel_post_counters_apply(p posts, delta int) returns void as $$
+begin
+  -- Канал удаляется вместе со своими счетчиками (каскад): не пересоздаем их
+  if not exists (select 1 from channels where id = p.channel_id) then
+    return;
+  end if;
+
+  insert into channel_post_counters (channel_id, status, posts, media_posts, scheduled_posts)
+  values (
+    p.channel_id, coalesce(p.status, 'draft'), delta,
+    case when p.media_type is not null then delta else 0 end,
+    case when p.scheduled_at is not null then delta else 0 end
+  )
+  on conflict (channel_id, status) do update set
+    posts = channel_post_counters.posts + excluded.posts,
+    media_posts = channel_post_counters.media_posts + excluded.media_posts,
+    scheduled_posts = channel_post_counters.scheduled_posts + excluded.scheduled_posts;
+
+  if p.created_at is not null then
+    insert into channel_post_daily (channel_id, day, created)
+    values (p.channel_id, (p.created_at at time zone 'UTC')::date, delta)
+    on conflict (channel_id, day) do update set created = channel_post_daily.created + excluded.created;
+  end if;
+
+  if p.status = 'published' and p.published_at is not null then
+    insert into channel_post_daily (channel_id, day, published)
+    values (p.channel_id, (p.published_at at time zone 'UTC')::date, delta)
+    on conflict (channel_id, day) do update set published = channel_post_daily.published + excluded.published;
+  end if;
+end;
+$$ language plpgsql;
+
+create or replace function channel_post_counters_trg() returns trigger as $$
+begin
+  if tg_op = 'UPDATE' and
+     (old.channel_id, old.status, old.media_type is null, old.scheduled_at is null, old.created_at, old.published_at)
+     is not distinct from
+     (new.channel_id, new.status, new.media_type is null, new.scheduled_at is null, new.created_at, new.published_at) then
+    return null;
+  end if;
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform channel_post_counters_apply(old, -1);
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform channel_post_counters_apply(new, 1);
+  end if;
+  return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists posts_channel_counters on posts;
+create trigger posts_channel_counters
+  after insert or delete or update of channel_id, status, media_type, scheduled_at, created_at, published_at
+  on posts for each row execute function channel_post_counters_trg();
+
+-- Пересчет счетчиков с нуля (на случай расхождения): /rebuild_counters
+create or replace function rebuild_channel_post_counters() returns void as $$
+begin
+  -- Запись в posts ждет окончания пересчета, чтобы не потерять изменения
+  lock table posts in share mode;
+  delete from channel_post_counters;
+  delete from channel_post_daily;
+
+  insert into channel_post_counters (channel_id, status, posts, media_posts, scheduled_posts)
+  select channel_id, coalesce(status, 'draft'), count(*),
+         count(*) filter (where media_type is not null),
+         count(*) filter (where scheduled_at is not null)
+  from posts
+  group by channel_id, coalesce(status, 'draft');
+
+  insert into channel_post_daily (channel_id, day, created, published)
+  select channel_id, day, sum(created), sum(published)
+  from (
+    select channel_id, (created_at at time zone 'UTC')::date as day, 1 as created, 0 as published
+    from posts where created_at is not null
+    union all
+    select channel_id, (published_at at time zone 'UTC')::date, 0, 1
+    from posts where status = 'published' and published_at is not null
+  ) events
+  group by channel_id, day;
+end;
+$$ language plpgsql;
+
+SELECT rebuild_channel_post_counters();
+
+COMMENT ON TABLE channel_post_counters IS 'Число постов канала по статусам (триггер posts_channel_counters)';
+COMMENT ON TABLE channel_post_daily IS 'Созданные и опубликованные посты канала по дням UTC';
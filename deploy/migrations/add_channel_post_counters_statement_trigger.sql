@@ -0,0 +1,139 @@
+-- Миграция: счетчики постов по каналам ведет statement-level триггер
+-- Построчный триггер posts_channel_counters обновлял общие строки
+-- channel_post_counters / channel_post_daily в порядке строк оператора:
+-- две реплики, записывающие итоги пачек публикации по одним каналам,
+-- могли взаимно заблокироваться, и откат оставлял опубликованные посты
+-- в статусе scheduled. Теперь изменения оператора складываются и
+-- применяются в порядке (channel_id, status) / (channel_id, day).
+-- Счетчики пересчитываются, так как старый триггер мог их не довести.
+
+-- Изменения счетчиков от одного оператора: старые версии строк с delta = -1,
+-- новые с delta = +1. Они складываются по (канал, статус) и (канал, день)
+-- и применяются в порядке ключа. Две транзакции, меняющие посты одних
+-- каналов (запись итогов публикации разными репликами), блокируют строки
+-- счетчиков в одном порядке и не могут заблокировать друг друга
+create or replace function channel_post_counters_apply_changes(changes jsonb) returns void as $$
+begin
+  insert into channel_post_counters (channel_id, status, posts, media_posts, scheduled_posts)
+  select r.channel_id, r.status, sum(r.delta),
+         coalesce(sum(r.delta) filter (where r.has_media), 0),
+         coalesce(sum(r.delta) filter (where r.is_scheduled), 0)
+  from jsonb_to_recordset(changes) as r(
+    channel_id bigint, status post_status, has_media boolean, is_scheduled boolean,
+    created_day date, published_day date, delta int
+  )
+  -- Канал удаляется вместе со своими счетчиками (каскад): не пересоздаем их
+  where exists (select 1 from channels ch where ch.id = r.channel_id)
+  group by r.channel_id, r.status
+  having sum(r.delta) <> 0
+      or coalesce(sum(r.delta) filter (where r.has_media), 0) <> 0
+      or coalesce(sum(r.delta) filter (where r.is_scheduled), 0) <> 0
+  order by r.channel_id, r.status
+  on conflict (channel_id, status) do update set
+    posts = channel_post_counters.posts + excluded.posts,
+    media_posts = channel_post_counters.media_posts + excluded.media_posts,
+    scheduled_posts = channel_post_counters.scheduled_posts + excluded.scheduled_posts;
+
+  insert into channel_post_daily (channel_id, day, created, published)
+  select e.channel_id, e.day, sum(e.created), sum(e.published)
+  from (
+    select r.channel_id, r.created_day as day, r.delta as created, 0 as published
+    from jsonb_to_recordset(changes) as r(channel_id bigint, created_day date, delta int)
+    where r.created_day is not null
+    union all
+    select r.channel_id, r.published_day, 0, r.delta
+    from jsonb_to_recordset(changes) as r(channel_id bigint, published_day date, delta int)
+    where r.published_day is not null
+  ) e
+  where exists (select 1 from channels ch where ch.id = e.channel_id)
+  group by e.channel_id, e.day
+  having sum(e.created) <> 0 or sum(e.published) <> 0
+  order by e.channel_id, e.day
+  on conflict (channel_id, day) do update set
+    created = channel_post_daily.created + excluded.created,
+    published = channel_post_daily.published + excluded.published;
+end;
+$$ language plpgsql;
+
+-- Statement-level триггер: один вызов на оператор (например, запись итогов
+-- пачки публикации через UPDATE ... FROM unnest), строки — из transition tables.
+-- old_rows есть только у UPDATE/DELETE, new_rows — у INSERT/UPDATE, поэтому
+-- запросы к ним разнесены по веткам tg_op
+create or replace function channel_post_counters_stmt_trg() returns trigger as $$
+declare
+  removed jsonb := '[]';
+  added jsonb := '[]';
+begin
+  if tg_op = 'UPDATE' then
+    -- Захват, продление аренды и другие изменения, не влияющие на счетчики
+    if not exists (
+      select 1
+      from old_rows o
+      join new_rows n on n.id = o.id
+      where (o.channel_id, o.status, o.media_type is null, o.scheduled_at is null, o.created_at, o.published_at)
+            is distinct from
+            (n.channel_id, n.status, n.media_type is null, n.scheduled_at is null, n.created_at, n.published_at)
+    ) then
+      return null;
+    end if;
+  end if;
+
+  if tg_op in ('UPDATE', 'DELETE') then
+    select coalesce(jsonb_agg(jsonb_build_object(
+      'channel_id', o.channel_id,
+      'status', coalesce(o.status, 'draft'),
+      'has_media', o.media_type is not null,
+      'is_scheduled', o.scheduled_at is not null,
+      'created_day', (o.created_at at time zone 'UTC')::date,
+      'published_day', case when o.status = 'published' then (o.published_at at time zone 'UTC')::date end,
+      'delta', -1
+    )), '[]')
+    into removed
+    from old_rows o;
+  end if;
+
+  if tg_op in ('INSERT', 'UPDATE') then
+    select coalesce(jsonb_agg(jsonb_build_object(
+      'channel_id', n.channel_id,
+      'status', coalesce(n.status, 'draft'),
+      'has_media', n.media_type is not null,
+      'is_scheduled', n.scheduled_at is not null,
+      'created_day', (n.created_at at time zone 'UTC')::date,
+      'published_day', case when n.status = 'published' then (n.published_at at time zone 'UTC')::date end,
+      'delta', 1
+    )), '[]')
+    into added
+    from new_rows n;
+  end if;
+
+  perform channel_post_counters_apply_changes(removed || added);
+  return null;
+end;
+$$ language plpgsql;
+
+-- Построчный триггер первой версии блокировал строки счетчиков в порядке строк оператора
+drop trigger if exists posts_channel_counters on posts;
+drop function if exists channel_post_counters_trg();
+drop function if exists channel_post_counters_apply(posts, int);
+
+-- Transition tables поддерживаются только у триггеров на одно событие и без
+-- списка столбцов UPDATE OF — по триггеру на событие
+drop trigger if exists posts_channel_counters_insert on posts;
+create trigger posts_channel_counters_insert
+  after insert on posts
+  referencing new table as new_rows
+  for each statement execute function channel_post_counters_stmt_trg();
+
+drop trigger if exists posts_channel_counters_update on posts;
+create trigger posts_channel_counters_update
+  after update on posts
+  referencing old table as old_rows new table as new_rows
+  for each statement execute function channel_post_counters_stmt_trg();
+
+drop trigger if exists posts_channel_counters_delete on posts;
+create trigger posts_channel_counters_delete
+  after delete on posts
+  referencing old table as old_rows
+  for each statement execute function channel_post_counters_stmt_trg();
+
+SELECT rebuild_channel_post_counters();
@@ -0,0 +1,12 @@
+-- Миграция: индексы для фильтров списка постов (PostFilters.build_query)
+-- Фильтр по статусу и окну дат с сортировкой по (created_at, id) читает
+-- ровно страницу из индекса, независимо от размера истории
+
+CREATE INDEX IF NOT EXISTS idx_posts_user_status_created
+ON posts (user_id, status, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_posts_channel_status_created
+ON posts (channel_id, status, created_at DESC, id DESC);
+
+COMMENT ON INDEX idx_posts_user_status_created IS 'Посты пользователя по статусу, новые сверху';
+COMMENT ON INDEX idx_posts_channel_status_created IS 'Посты канала по статусу, новые сверху';
@@ -0,0 +1,9 @@
+-- Миграция: захват отложенных постов для публикации несколькими репликами
+-- Реплика помечает пост claimed_by/claimed_until (SELECT ... FOR UPDATE SKIP LOCKED),
+-- другие реплики пропускают его, пока аренда не истекла
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS claimed_by text;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS claimed_until timestamptz;
+
+COMMENT ON COLUMN posts.claimed_by IS 'Идентификатор реплики, захватившей пост для публикации';
+COMMENT ON COLUMN posts.claimed_until IS 'Время истечения аренды захвата';
@@ -0,0 +1,12 @@
+-- Миграция: повторные попытки публикации с экспоненциальной задержкой
+-- Неудачная отправка увеличивает publish_attempts, сохраняет last_error и
+-- переносит следующую попытку на next_attempt_at; после исчерпания попыток
+-- пост получает статус failed
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS publish_attempts integer NOT NULL DEFAULT 0;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS last_error text;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS next_attempt_at timestamptz;
+
+COMMENT ON COLUMN posts.publish_attempts IS 'Количество попыток публикации';
+COMMENT ON COLUMN posts.last_error IS 'Ошибка последней неудачной попытки';
+COMMENT ON COLUMN posts.next_attempt_at IS 'Время следующей попытки после ошибки';
@@ -0,0 +1,8 @@
+-- Миграция: индекс для листания «Мои посты» по ключу (created_at, id)
+-- Страница выбирается как WHERE user_id = $1 AND (created_at, id) < курсор
+-- ORDER BY created_at DESC, id DESC LIMIT n — без OFFSET и без чтения всех постов
+
+CREATE INDEX IF NOT EXISTS idx_posts_user_created
+ON posts (user_id, created_at DESC, id DESC);
+
+COMMENT ON INDEX idx_posts_user_created IS 'Keyset-пагинация постов пользователя';
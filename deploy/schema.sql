@@ -1,5 +1,19 @@
 -- deploy/schema.sql — базовая схема ControllerBot-лайт 2.0
 
+-- Версия схемы: отпечаток schema.sql + migrations/*.sql (см. Database.init_schema)
+create table if not exists schema_version (
+  id int primary key default 1 check (id = 1),
+  fingerprint text not null,
+  updated_at timestamptz default now()
+);
+
+-- Примененные миграции из deploy/migrations
+create table if not exists schema_migrations (
+  name text primary key,
+  checksum text not null,
+  applied_at timestamptz default now()
+);
+
 create table if not exists channels (
   id bigserial primary key,
   tg_channel_id bigint unique not null,
@@ -31,15 +45,21 @@ create table if not exists posts (
   title text,
   body_md text not null,
   entities jsonb,  -- Telegram entities для сохранения форматирования
-  media_type text,  -- Тип медиа: photo, video, document, voice, audio, video_note
+  media_type text,  -- Тип медиа: photo, video, document, voice, audio, video_note, album
   media_file_id text,  -- Telegram file_id медиа
-  media_data jsonb,  -- Дополнительные данные медиа (размеры, длительность и т.д.)
+  media_data jsonb,  -- Данные медиа; массив объектов — альбом (sendMediaGroup)
   status post_status default 'draft',
   scheduled_at timestamptz,
   published_at timestamptz,
   message_id bigint,
   series_id bigint references series(id) on delete set null,
   tags_cache text[],
+  channel_message_ids jsonb,  -- ID сообщений по каналам, включая элементы альбома
+  claimed_by text,  -- Реплика, захватившая пост для публикации
+  claimed_until timestamptz,  -- Истечение аренды захвата
+  publish_attempts integer not null default 0,  -- Попытки публикации
+  last_error text,  -- Ошибка последней попытки
+  next_attempt_at timestamptz,  -- Следующая попытка после ошибки
   created_at timestamptz default now(),
   updated_at timestamptz default now()
 );
@@ -78,5 +98,195 @@ create table if not exists digests (
   created_at timestamptz default now()
 );
 
+-- Кеш ответов YandexGPT (AI_CACHE_DB=true): ключ — sha256 запроса
+create table if not exists ai_response_cache (
+  key text primary key,
+  operation text not null,
+  response text not null,
+  created_at timestamptz default now(),
+  expires_at timestamptz not null
+);
+
 create index if not exists idx_posts_sched on posts (status, scheduled_at);
 create index if not exists idx_posts_channel_created on posts (channel_id, created_at desc);
+create index if not exists idx_posts_user_created on posts (user_id, created_at desc, id desc);
+create index if not exists idx_posts_user_status_created on posts (user_id, status, created_at desc, id desc);
+create index if not exists idx_posts_channel_status_created on posts (channel_id, status, created_at desc, id desc);
+create index if not exists idx_ai_response_cache_expires on ai_response_cache (expires_at);
+
+-- Счетчики постов по каналам и статусам, поддерживаются триггером на posts.
+-- Дашборды читают их вместо COUNT(*) по всей таблице posts
+create table if not exists channel_post_counters (
+  channel_id bigint not null references channels(id) on delete cascade,
+  status post_status not null,
+  posts bigint not null default 0,
+  media_posts bigint not null default 0,  -- media_type is not null
+  scheduled_posts bigint not null default 0,  -- scheduled_at is not null
+  primary key (channel_id, status)
+);
+
+-- Созданные и опубликованные посты по дням (UTC)
+create table if not exists channel_post_daily (
+  channel_id bigint not null references channels(id) on delete cascade,
+  day date not null,
+  created bigint not null default 0,
+  published bigint not null default 0,
+  primary key (channel_id, day)
+);
+
+-- Изменения счетчиков от одного оператора: старые версии строк с delta = -1,
+-- новые с delta = +1. Они складываются по (канал, статус) и (канал, день)
+-- и применяются в порядке ключа. Две транзакции, меняющие посты одних
+-- каналов (запись итогов публикации разными репликами), блокируют строки
+-- счетчиков в одном порядке и не могут заблокировать друг друга
+create or replace function channel_post_counters_apply_changes(changes jsonb) returns void as $$
+begin
+  insert into channel_post_counters (channel_id, status, posts, media_posts, scheduled_posts)
+  select r.channel_id, r.status, sum(r.delta),
+         coalesce(sum(r.delta) filter (where r.has_media), 0),
+         coalesce(sum(r.delta) filter (where r.is_scheduled), 0)
+  from jsonb_to_recordset(changes) as r(
+    channel_id bigint, status post_status, has_media boolean, is_scheduled boolean,
+    created_day date, published_day date, delta int
+  )
+  -- Канал удаляется вместе со своими счетчиками (каскад): не пересоздаем их
+  where exists (select 1 from channels ch where ch.id = r.channel_id)
+  group by r.channel_id, r.status
+  having sum(r.delta) <> 0
+      or coalesce(sum(r.delta) filter (where r.has_media), 0) <> 0
+      or coalesce(sum(r.delta) filter (where r.is_scheduled), 0) <> 0
+  order by r.channel_id, r.status
+  on conflict (channel_id, status) do update set
+    posts = channel_post_counters.posts + excluded.posts,
+    media_posts = channel_post_counters.media_posts + excluded.media_posts,
+    scheduled_posts = channel_post_counters.scheduled_posts + excluded.scheduled_posts;
+
+  insert into channel_post_daily (channel_id, day, created, published)
+  select e.channel_id, e.day, sum(e.created), sum(e.published)
+  from (
+    select r.channel_id, r.created_day as day, r.delta as created, 0 as published
+    from jsonb_to_recordset(changes) as r(channel_id bigint, created_day date, delta int)
+    where r.created_day is not null
+    union all
+    select r.channel_id, r.published_day, 0, r.delta
+    from jsonb_to_recordset(changes) as r(channel_id bigint, published_day date, delta int)
+    where r.published_day is not null
+  ) e
+  where exists (select 1 from channels ch where ch.id = e.channel_id)
+  group by e.channel_id, e.day
+  having sum(e.created) <> 0 or sum(e.published) <> 0
+  order by e.channel_id, e.day
+  on conflict (channel_id, day) do update set
+    created = channel_post_daily.created + excluded.created,
+    published = channel_post_daily.published + excluded.published;
+end;
+$$ language plpgsql;
+
+-- Statement-level триггер: один вызов на оператор (например, запись итогов
+-- пачки публикации через UPDATE ... FROM unnest), строки — из transition tables.
+-- old_rows есть только у UPDATE/DELETE, new_rows — у INSERT/UPDATE, поэтому
+-- запросы к ним разнесены по веткам tg_op
+create or replace function channel_post_counters_stmt_trg() returns trigger as $$
+declare
+  removed jsonb := '[]';
+  added jsonb := '[]';
+begin
+  if tg_op = 'UPDATE' then
+    -- Захват, продление аренды и другие изменения, не влияющие на счетчики
+    if not exists (
+      select 1
+      from old_rows o
+      join new_rows n on n.id = o.id
+      where (o.channel_id, o.status, o.media_type is null, o.scheduled_at is null, o.created_at, o.published_at)
+            is distinct from
+            (n.channel_id, n.status, n.media_type is null, n.scheduled_at is null, n.created_at, n.published_at)
+    ) then
+      return null;
+    end if;
+  end if;
+
+  if tg_op in ('UPDATE', 'DELETE') then
+    select coalesce(jsonb_agg(jsonb_build_object(
+      'channel_id', o.channel_id,
+      'status', coalesce(o.status, 'draft'),
+      'has_media', o.media_type is not null,
+      'is_scheduled', o.scheduled_at is not null,
+      'created_day', (o.created_at at time zone 'UTC')::date,
+      'published_day', case when o.status = 'published' then (o.published_at at time zone 'UTC')::date end,
+      'delta', -1
+    )), '[]')
+    into removed
+    from old_rows o;
+  end if;
+
+  if tg_op in ('INSERT', 'UPDATE') then
+    select coalesce(jsonb_agg(jsonb_build_object(
+      'channel_id', n.channel_id,
+      'status', coalesce(n.status, 'draft'),
+      'has_media', n.media_type is not null,
+      'is_scheduled', n.scheduled_at is not null,
+      'created_day', (n.created_at at time zone 'UTC')::date,
+      'published_day', case when n.status = 'published' then (n.published_at at time zone 'UTC')::date end,
+      'delta', 1
+    )), '[]')
+    into added
+    from new_rows n;
+  end if;
+
+  perform channel_post_counters_apply_changes(removed || added);
+  return null;
+end;
+$$ language plpgsql;
+
+-- Построчный триггер первой версии блокировал строки счетчиков в порядке строк оператора
+drop trigger if exists posts_channel_counters on posts;
+drop function if exists channel_post_counters_trg();
+drop function if exists channel_post_counters_apply(posts, int);
+
+-- Transition tables поддерживаются только у триггеров на одно событие и без
+-- списка столбцов UPDATE OF — по триггеру на событие
+drop trigger if exists posts_channel_counters_insert on posts;
+create trigger posts_channel_counters_insert
+  after insert on posts
+  referencing new table as new_rows
+  for each statement execute function channel_post_counters_stmt_trg();
+
+drop trigger if exists posts_channel_counters_update on posts;
+create trigger posts_channel_counters_update
+  after update on posts
+  referencing old table as old_rows new table as new_rows
+  for each statement execute function channel_post_counters_stmt_trg();
+
+drop trigger if exists posts_channel_counters_delete on posts;
+create trigger posts_channel_counters_delete
+  after delete on posts
+  referencing old table as old_rows
+  for each statement execute function channel_post_counters_stmt_trg();
+
+-- Пересчет счетчиков с нуля (на случай расхождения): /rebuild_counters
+create or replace function rebuild_channel_post_counters() returns void as $$
+begin
+  -- Запись в posts ждет окончания пересчета, чтобы не потерять изменения
+  lock table posts in share mode;
+  delete from channel_post_counters;
+  delete from channel_post_daily;
+
+  insert into channel_post_counters (channel_id, status, posts, media_posts, scheduled_posts)
+  select channel_id, coalesce(status, 'draft'), count(*),
+         count(*) filter (where media_type is not null),
+         count(*) filter (where scheduled_at is not null)
+  from posts
+  group by channel_id, coalesce(status, 'draft');
+
+  insert into channel_post_daily (channel_id, day, created, published)
+  select channel_id, day, sum(created), sum(published)
+  from (
+    select channel_id, (created_at at time zone 'UTC')::date as day, 1 as created, 0 as published
+    from posts where created_at is not null
+    union all
+    select channel_id, (published_at at time zone 'UTC')::date, 0, 1
+    from posts where status = 'published' and published_at is not null
+  ) events
+  group by channel_id, day;
+end;
+$$ language plpgsql;
@@ -231,16 +231,12 @@ async def cmd_add_channel_in_channel(message: Message):
         if bot_member.status in ['administrator', 'creator']:
             # Проверяем права на публикацию
             if bot_member.can_post_messages:
-                # Добавляем канал в базу данных
-                from database import db
+                # Добавляем канал в базу данных и в реестр каналов
+                from services.channel_registry import channel_registry
                 
-                # Проверяем, есть ли уже такой канал
-                existing_channel = await db.fetch_one(
-                    "SELECT id FROM channels WHERE tg_channel_id = $1", 
-                    channel_id
-                )
+                _, created = await channel_registry.add_channel(channel_id, channel_title)
                 
-                if existing_channel:
+                if not created:
                     await message.answer(
                         f"ℹ️ *Канал уже добавлен*\n\n"
                         f"📢 *Канал:* {channel_title}\n"
@@ -251,15 +247,6 @@ async def cmd_add_channel_in_channel(message: Message):
                         ])
                     )
                 else:
-                    # Добавляем новый канал
-                    await db.execute(
-                        """
-                        INSERT INTO channels (tg_channel_id, title, enabled, created_at)
-                        VALUES ($1, $2, true, NOW())
-                        """,
-                        channel_id, channel_title
-                    )
-                    
                     await message.answer(
                         f"✅ *Канал успешно добавлен!*\n\n"
                         f"📢 *Канал:* {channel_title}\n"
@@ -497,23 +484,16 @@ async def callback_add_channel_inline(callback: CallbackQuery):
     logger.info(f"Adding channel: {channel_title} (ID: {channel_id})")
     
     try:
-        # Проверяем, существует ли канал уже
-        existing_channel = await db.fetch_one(
-            "SELECT id FROM channels WHERE tg_channel_id = $1",
-            channel_id
-        )
+        from services.channel_registry import channel_registry
+        
+        # Добавляем канал в базу данных и в реестр каналов
+        _, created = await channel_registry.add_channel(channel_id, channel_title)
         
-        if existing_channel:
+        if not created:
             logger.info(f"Channel {channel_id} already exists")
             await callback.answer("✅ Канал уже добавлен в систему!")
             return
         
-        # Добавляем канал в базу данных
-        await db.execute(
-            "INSERT INTO channels (tg_channel_id, title, enabled, created_at) VALUES ($1, $2, $3, $4)",
-            channel_id, channel_title, True, datetime.now()
-        )
-        
         logger.info(f"Channel {channel_id} added successfully")
         
         await callback.answer(
@@ -571,6 +551,140 @@ async def cmd_config(message: Message):
     
     await message.answer(config_info)
 
+@router.message(Command("dbstats"), admin_filter)
+async def cmd_dbstats(message: Message):
+    """Состояние пула подключений и самые затратные запросы"""
+    from database import db
+    from utils.metrics import get_counter
+    
+    pool = db.get_pool_stats()
+    acquire = pool['acquire_seconds']
+    text = f"""
+🗄️ *Пул подключений к БД*
+
+• Подключений: {pool['size']} (мин. {pool['min_size']}, макс. {pool['max_size']})
+• Занято: {pool['in_use']}, свободно: {pool['idle']}
+• Пул исчерпан: {pool['saturation_events']} раз
+
+*Ожидание подключения:*
+• Запросов: {acquire['count']}
+• p50: {acquire['p50'] * 1000:.1f} мс, p95: {acquire['p95'] * 1000:.1f} мс, макс.: {acquire['max'] * 1000:.1f} мс
+"""
+    
+    replica = pool['replica']
+    if replica['configured']:
+        state = "доступна" if replica['available'] else "недоступна или отстает"
+        lag = f"{replica['lag_seconds']:.1f} с" if replica['lag_seconds'] is not None else "н/д"
+        text += (
+            f"\n*Реплика:* {state}, отставание {lag} (макс. {replica['max_lag_seconds']:.0f} с)\n"
+            f"• Чтений с реплики: {replica['reads']}, переключений на основную БД: {replica['fallbacks']}\n"
+        )
+    
+    from services.channel_registry import channel_registry
+    registry = channel_registry.get_stats()
+    text += (
+        f"\n*Реестр каналов:* {registry['channels']} каналов, "
+        f"попаданий {registry['hits']}, промахов {registry['misses']}\n"
+    )
+    
+    from services.tags import tag_service
+    from services.series import series_service
+    for cache in (tag_service.get_cache_stats(), series_service.get_cache_stats()):
+        text += f"• Кеш `{cache['name']}`: {cache['size']} каналов, попаданий {cache['hit_rate'] * 100:.0f}%\n"
+    
+    from services.cache_bus import cache_bus
+    bus = cache_bus.get_stats()
+    bus_state = "слушает" if bus['listening'] else "не подключена"
+    text += (
+        f"• Шина сброса кешей: {bus_state}, отправлено {bus['sent']}, получено {bus['received']}, "
+        f"задержка p95 {bus['lag_seconds']['p95'] * 1000:.1f} мс\n"
+    )
+    
+    query_stats = db.get_query_stats()[:5]
+    if query_stats:
+        text += "\n*Запросы по суммарному времени:*\n"
+        for item in query_stats:
+            text += (
+                f"• `{item['name']}` ({item['caller']}): {item['calls']} вызовов, "
+                f"всего {item['total_seconds'] * 1000:.0f} мс, "
+                f"в среднем {item['mean_seconds'] * 1000:.1f} мс, p95 {item['p95_seconds'] * 1000:.1f} мс\n"
+            )
+    
+    slow_queries = get_counter('db_slow_queries')
+    if slow_queries:
+        text += f"\n🐢 Медленных запросов (> {config.DB_SLOW_QUERY_MS:.0f} мс): {slow_queries}\n"
+
+    await message.answer(text)
+
+def _format_metrics(snapshot: dict) -> str:
+    """Снимок utils.metrics текстом: gauges, счетчики, гистограммы (*_seconds — в мс)"""
+    lines = ["📊 *Метрики процесса*"]
+    if snapshot['gauges']:
+        lines.append("\n*Gauges:*")
+        lines += [f"• `{name}`: {value if value is not None else 'н/д'}" for name, value in snapshot['gauges'].items()]
+    if snapshot['counters']:
+        lines.append("\n*Счетчики:*")
+        lines += [f"• `{name}`: {value}" for name, value in snapshot['counters'].items()]
+    if snapshot['histograms']:
+        lines.append("\n*Гистограммы:*")
+        for name, h in snapshot['histograms'].items():
+            if not h['count']:
+                continue
+            if name.endswith('_seconds'):
+                lines.append(
+                    f"• `{name}`: {h['count']}, p50 {h['p50'] * 1000:.1f} мс, "
+                    f"p95 {h['p95'] * 1000:.1f} мс, макс. {h['max'] * 1000:.1f} мс"
+                )
+            else:
+                lines.append(f"• `{name}`: {h['count']}, p50 {h['p50']:g}, p95 {h['p95']:g}, макс. {h['max']:g}")
+    return "\n".join(lines)
+
+def _split_message(text: str, limit: int = 4000) -> list:
+    """Делит текст по строкам на части не длиннее limit (лимит сообщения Telegram — 4096)"""
+    parts, current = [], ""
+    for line in text.split("\n"):
+        if current and len(current) + len(line) + 1 > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        parts.append(current)
+    return parts
+
+@router.message(Command("metrics"), admin_filter)
+async def cmd_metrics(message: Message):
+    """Все метрики процесса: пул БД, публикация, кеши, AI"""
+    from utils.metrics import get_metrics_snapshot
+
+    for part in _split_message(_format_metrics(get_metrics_snapshot())):
+        await message.answer(part)
+
+@router.message(Command("flush_caches"), admin_filter)
+async def cmd_flush_caches(message: Message):
+    """Сброс in-process кешей (каналы, теги, серии, посты) на всех репликах бота"""
+    from services.cache_bus import cache_bus
+
+    await cache_bus.flush_all()
+    await message.answer("✅ Кеши сброшены на всех репликах бота")
+
+@router.message(Command("rebuild_counters"), admin_filter)
+async def cmd_rebuild_counters(message: Message):
+    """Пересчет счетчиков постов по каналам из таблицы posts"""
+    from services.channel_stats import channel_stats_service
+
+    try:
+        drifted = await channel_stats_service.rebuild()
+    except Exception as e:
+        logger.error("Failed to rebuild channel counters: %s", e)
+        await message.answer("❌ Не удалось пересчитать счетчики постов")
+        return
+
+    if drifted:
+        await message.answer(f"✅ Счетчики постов пересчитаны, исправлено расхождений: {drifted}")
+    else:
+        await message.answer("✅ Счетчики постов пересчитаны, расхождений не было")
+
 @router.message(F.forward_from_chat, admin_filter)
 async def handle_forwarded_message(message: Message):
     """Обработка пересланных сообщений для получения ID канала"""
@@ -686,27 +800,10 @@ async def save_channel_id_to_env(channel_id: int):
 async def callback_channel_settings(callback: CallbackQuery):
     """Настройки канала"""
     try:
-        from database import db
+        from services.channel_stats import channel_stats_service
         
-        # Получаем расширенную информацию о каналах
-        channels_query = """
-            SELECT 
-                c.*,
-                COUNT(p.id) as posts_count,
-                COUNT(CASE WHEN p.status = 'published' THEN 1 END) as published_count,
-                COUNT(CASE WHEN p.status = 'scheduled' THEN 1 END) as scheduled_count,
-                COUNT(CASE WHEN p.status = 'draft' THEN 1 END) as draft_count,
-                COUNT(CASE WHEN p.status = 'deleted' THEN 1 END) as deleted_count,
-                COUNT(CASE WHEN p.media_type IS NOT NULL THEN 1 END) as media_posts_count,
-                COUNT(CASE WHEN p.scheduled_at IS NOT NULL THEN 1 END) as scheduled_posts_count,
-                MAX(p.created_at) as last_post_date,
-                MIN(p.created_at) as first_post_date
-            FROM channels c
-            LEFT JOIN posts p ON c.id = p.channel_id
-            GROUP BY c.id, c.title, c.tg_channel_id, c.created_at
-            ORDER BY c.title ASC
-        """
-        channels = await db.fetch_all(channels_query)
+        # Расширенная информация о каналах из счетчиков постов
+        channels = await channel_stats_service.get_channel_stats()
         
         if not channels:
             text = "📢 *Настройки канала*\n\n❌ У вас нет доступных каналов"
@@ -783,20 +880,10 @@ async def callback_channel_settings(callback: CallbackQuery):
 async def callback_manage_channels(callback: CallbackQuery):
     """Управление каналами"""
     try:
-        from database import db
+        from services.channel_stats import channel_stats_service
         
         # Получаем каналы с базовой информацией
-        channels_query = """
-            SELECT 
-                c.*,
-                COUNT(p.id) as posts_count,
-                COUNT(CASE WHEN p.status = 'published' THEN 1 END) as published_count
-            FROM channels c
-            LEFT JOIN posts p ON c.id = p.channel_id
-            GROUP BY c.id, c.title, c.tg_channel_id, c.created_at
-            ORDER BY c.title ASC
-        """
-        channels = await db.fetch_all(channels_query)
+        channels = await channel_stats_service.get_channel_stats()
         
         if not channels:
             text = "⚙️ *Управление каналами*\n\n❌ У вас нет доступных каналов"
@@ -865,29 +952,14 @@ async def callback_manage_channels(callback: CallbackQuery):
 async def callback_channel_detail(callback: CallbackQuery):
     """Детальная информация о канале"""
     try:
-        from database import db
+        from services.channel_stats import channel_stats_service
         
         # Извлекаем ID канала из callback_data
         channel_id = int(callback.data.split("_")[-1])
         
         # Получаем детальную информацию о канале
-        channel_query = """
-            SELECT 
-                c.*,
-                COUNT(p.id) as posts_count,
-                COUNT(CASE WHEN p.status = 'published' THEN 1 END) as published_count,
-                COUNT(CASE WHEN p.status = 'scheduled' THEN 1 END) as scheduled_count,
-                COUNT(CASE WHEN p.status = 'draft' THEN 1 END) as draft_count,
-                COUNT(CASE WHEN p.status = 'deleted' THEN 1 END) as deleted_count,
-                COUNT(CASE WHEN p.media_type IS NOT NULL THEN 1 END) as media_posts_count,
-                MAX(p.created_at) as last_post_date,
-                MIN(p.created_at) as first_post_date
-            FROM channels c
-            LEFT JOIN posts p ON c.id = p.channel_id
-            WHERE c.id = $1
-            GROUP BY c.id, c.title, c.tg_channel_id, c.created_at
-        """
-        channel = await db.fetch_one(channel_query, channel_id)
+        channels = await channel_stats_service.get_channel_stats(channel_id)
+        channel = channels[0] if channels else None
         
         if not channel:
             text = "❌ *Канал не найден*"
@@ -961,11 +1033,10 @@ async def callback_manage_tags(callback: CallbackQuery):
     """Управление тегами"""
     try:
         from services.tags import tag_service
-        from database import db
+        from services.channel_registry import channel_registry
         
         # Получаем каналы пользователя
-        channels_query = "SELECT * FROM channels ORDER BY title ASC"
-        channels = await db.fetch_all(channels_query)
+        channels = await channel_registry.list_channels()
         
         if not channels:
             text = "🏷️ *Управление тегами*\n\n❌ У вас нет доступных каналов"
@@ -1016,11 +1087,10 @@ async def callback_manage_series(callback: CallbackQuery):
     """Управление сериями"""
     try:
         from services.series import series_service
-        from database import db
+        from services.channel_registry import channel_registry
         
         # Получаем каналы пользователя
-        channels_query = "SELECT * FROM channels ORDER BY title ASC"
-        channels = await db.fetch_all(channels_query)
+        channels = await channel_registry.list_channels()
         
         if not channels:
             text = "📚 *Управление сериями*\n\n❌ У вас нет доступных каналов"
@@ -1196,8 +1266,8 @@ async def callback_create_post(callback: CallbackQuery, state: FSMContext):
     from utils.keyboards import get_post_actions_keyboard
     
     # Проверяем, есть ли привязанные каналы
-    from database import db
-    channels = await db.fetch_all("SELECT id, tg_channel_id, title FROM channels")
+    from services.channel_registry import channel_registry
+    channels = await channel_registry.list_channels()
     
     if not channels:
         # Нет каналов - показываем инструкцию
@@ -1243,8 +1313,8 @@ async def callback_create_poll(callback: CallbackQuery, state: FSMContext):
     from utils.states import PollCreationStates
     
     # Проверяем, есть ли привязанные каналы
-    from database import db
-    channels = await db.fetch_all("SELECT id, tg_channel_id, title FROM channels")
+    from services.channel_registry import channel_registry
+    channels = await channel_registry.list_channels()
     
     if not channels:
         # Нет каналов - показываем инструкцию
@@ -1506,15 +1576,11 @@ async def handle_channel_forward(message: Message):
         
         logger.info(f"📢 Получено сообщение из канала: {channel_id} ({channel_title})")
         
-        # Проверяем, есть ли канал в БД
-        from database import db
-        existing_channel = await db.fetch_one("""
-            SELECT id, tg_channel_id, title 
-            FROM channels 
-            WHERE tg_channel_id = $1
-        """, channel_id)
+        # Добавляем канал в БД и в реестр каналов, если его еще нет
+        from services.channel_registry import channel_registry
+        _, created = await channel_registry.add_channel(channel_id, channel_title)
         
-        if existing_channel:
+        if not created:
             await message.answer(
                 f"✅ *Канал уже настроен!*\n\n"
                 f"📢 *Канал:* {channel_title}\n"
@@ -1526,12 +1592,6 @@ async def handle_channel_forward(message: Message):
                 ])
             )
         else:
-            # Добавляем канал в БД
-            await db.execute("""
-                INSERT INTO channels (tg_channel_id, title, created_at)
-                VALUES ($1, $2, NOW())
-            """, channel_id, channel_title)
-            
             logger.info(f"✅ Канал {channel_id} ({channel_title}) добавлен в БД")
             
             await message.answer(
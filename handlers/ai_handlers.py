@@ -132,6 +132,8 @@ async def callback_ai_settings(callback: CallbackQuery):
     """Настройки AI"""
     try:
         status = await ai_service.check_api_status()
+        cache = ai_service.get_cache_stats()
+        requests = ai_service.get_request_stats()
         
         await callback.message.edit_text(
             f"🔧 *Настройки AI*\n\n"
@@ -144,7 +146,12 @@ async def callback_ai_settings(callback: CallbackQuery):
             f"• Создание аннотаций\n\n"
             f"*Настройка:*\n"
             f"• YANDEX_API_KEY: {'✅ Настроен' if ai_service.api_key else '❌ Не настроен'}\n"
-            f"• YANDEX_FOLDER_ID: {'✅ Настроен' if ai_service.folder_id else '❌ Не настроен'}",
+            f"• YANDEX_FOLDER_ID: {'✅ Настроен' if ai_service.folder_id else '❌ Не настроен'}\n\n"
+            f"*Кеш ответов:* {cache['size']} из {cache['maxsize']}, "
+            f"попаданий {cache['hit_rate'] * 100:.0f}% "
+            f"(память {cache['memory_hits']}, БД {cache['db_hits']}, промахов {cache['misses']})\n"
+            f"*Запросы к API:* {requests['requests']}, ошибок {requests['errors']}, "
+            f"объединено {requests['coalesced']}, p95 {requests['latency_seconds']['p95']:.1f} с",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="🔙 Назад", callback_data="ai_functions")]
             ])
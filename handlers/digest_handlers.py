@@ -24,18 +24,17 @@ admin_filter = IsConfigAdminFilter()
 async def cmd_digest(message: Message):
     """Управление дайджестами"""
     try:
-        from database import db
+        from services.channel_stats import channel_stats_service
         
-        # Получаем статистику постов за последние 7 дней
-        stats_query = """
-            SELECT 
-                COUNT(*) as total_posts,
-                COUNT(CASE WHEN status = 'published' THEN 1 END) as published_posts,
-                COUNT(CASE WHEN status = 'scheduled' THEN 1 END) as scheduled_posts,
-                COUNT(CASE WHEN created_at >= NOW() - INTERVAL '7 days' THEN 1 END) as recent_posts
-            FROM posts
-        """
-        stats = await db.fetch_one(stats_query)
+        # Счетчики постов и дневные корзины за последние 7 дней
+        totals = await channel_stats_service.get_totals()
+        recent = await channel_stats_service.get_recent_totals(days=7)
+        stats = {
+            'total_posts': totals['posts_count'],
+            'published_posts': totals['published_count'],
+            'scheduled_posts': totals['scheduled_count'],
+            'recent_posts': recent['created']
+        }
         
         text = "📊 *Управление дайджестами*\n\n"
         text += f"📈 *Статистика за неделю:*\n"
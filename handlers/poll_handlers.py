@@ -9,7 +9,7 @@ from aiogram.enums import ParseMode
 from utils.states import PollCreationStates
 from utils.logging import get_logger
 from services.publisher import publisher
-from database import db
+from services.channel_registry import channel_registry
 
 logger = get_logger(__name__)
 router = Router()
@@ -231,7 +231,7 @@ async def callback_poll_publish_now(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     
     # Получаем каналы
-    channels = await db.fetch_all("SELECT id, tg_channel_id, title FROM channels")
+    channels = await channel_registry.list_channels()
     
     if not channels:
         await callback.answer("❌ Нет доступных каналов!")
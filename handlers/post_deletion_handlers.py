@@ -166,16 +166,13 @@ async def callback_confirm_delete_post(callback: CallbackQuery):
         channel_deleted = False
         if post['status'] == 'published' and post['message_id']:
             try:
-                # Получаем tg_channel_id из таблицы channels
-                from database import db
-                channel = await db.fetch_one(
-                    "SELECT tg_channel_id FROM channels WHERE id = $1", 
-                    post['channel_id']
-                )
+                # tg_channel_id из реестра каналов
+                from services.channel_registry import channel_registry
+                channel = await channel_registry.get(post['channel_id'])
                 
                 if channel and channel['tg_channel_id']:
                     publisher = get_publisher()
-                    channel_deleted = await publisher.delete_message_from_channel(channel['tg_channel_id'], post['message_id'])
+                    channel_deleted = await publisher.delete_post_messages(post, channel['tg_channel_id'])
                     if channel_deleted:
                         logger.info(f"✅ Сообщение {post['message_id']} удалено из канала {channel['tg_channel_id']}")
                     else:
@@ -277,16 +274,13 @@ async def callback_confirm_permanent_delete(callback: CallbackQuery):
         channel_deleted = False
         if post['status'] == 'published' and post['message_id']:
             try:
-                # Получаем tg_channel_id из таблицы channels
-                from database import db
-                channel = await db.fetch_one(
-                    "SELECT tg_channel_id FROM channels WHERE id = $1", 
-                    post['channel_id']
-                )
+                # tg_channel_id из реестра каналов
+                from services.channel_registry import channel_registry
+                channel = await channel_registry.get(post['channel_id'])
                 
                 if channel and channel['tg_channel_id']:
                     publisher = get_publisher()
-                    channel_deleted = await publisher.delete_message_from_channel(channel['tg_channel_id'], post['message_id'])
+                    channel_deleted = await publisher.delete_post_messages(post, channel['tg_channel_id'])
                     if channel_deleted:
                         logger.info(f"✅ Сообщение {post['message_id']} удалено из канала {channel['tg_channel_id']}")
                     else:
@@ -365,16 +359,13 @@ async def callback_confirm_delete_from_channel(callback: CallbackQuery):
         # Сначала удаляем сообщение из канала (внешняя операция)
         channel_deleted = False
         try:
-            # Получаем tg_channel_id из таблицы channels
-            from database import db
-            channel = await db.fetch_one(
-                "SELECT tg_channel_id FROM channels WHERE id = $1", 
-                post['channel_id']
-            )
+            # tg_channel_id из реестра каналов
+            from services.channel_registry import channel_registry
+            channel = await channel_registry.get(post['channel_id'])
             
             if channel and channel['tg_channel_id']:
                 publisher = get_publisher()
-                channel_deleted = await publisher.delete_message_from_channel(channel['tg_channel_id'], post['message_id'])
+                channel_deleted = await publisher.delete_post_messages(post, channel['tg_channel_id'])
                 if channel_deleted:
                     logger.info(f"✅ Сообщение {post['message_id']} удалено из канала {channel['tg_channel_id']}")
                 else:
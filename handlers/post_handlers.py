@@ -6,6 +6,7 @@
 """
 
 import re
+from typing import Optional
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.enums import ParseMode
@@ -18,6 +19,7 @@ from aiogram.fsm.state import default_state
 from services.post_service import post_service
 from services.tags import tag_service
 from services.series import series_service
+from services.channel_registry import channel_registry
 from utils.keyboards import (
     get_main_menu_keyboard,
     get_post_actions_keyboard,
@@ -26,7 +28,7 @@ from utils.keyboards import (
     get_schedule_keyboard,
     get_confirmation_keyboard
 )
-from utils.pagination import get_pagination_manager
+from utils.pagination import decode_cursor, get_pagination_manager
 from utils.timezone_utils import format_datetime
 from utils.states import PostCreationStates
 from utils.filters import IsConfigAdminFilter, PostTextFilter
@@ -219,8 +221,11 @@ async def callback_add_tags(callback: CallbackQuery, state: FSMContext):
             await callback.answer("❌ Каналы не настроены!", show_alert=True)
             return
         
-        # Получаем теги для первого канала
-        channel_id = channel_ids[0]
+        # Получаем теги для первого канала (в CHANNEL_IDS — Telegram ID)
+        channel_id = await channel_registry.get_id(channel_ids[0])
+        if channel_id is None:
+            await callback.answer("❌ Канал не найден!", show_alert=True)
+            return
         tags = await tag_service.get_tags_by_channel(channel_id)
         
         if not tags:
@@ -233,6 +238,7 @@ async def callback_add_tags(callback: CallbackQuery, state: FSMContext):
             )
         else:
             await state.set_state(PostCreationStates.add_tags)
+            await state.update_data(tags_channel_id=channel_id)
             await callback.message.edit_text(
                 "🏷️ *Выберите теги для поста:*\n\n"
                 "Отметьте нужные теги и нажмите 'Готово'",
@@ -262,13 +268,8 @@ async def callback_toggle_tag(callback: CallbackQuery, state: FSMContext):
     
     await state.update_data(selected_tags=selected_tags)
     
-    # Обновляем клавиатуру
-    tags = [
-        {"id": 1, "name": "новости"},
-        {"id": 2, "name": "анонсы"},
-        {"id": 3, "name": "объявления"},
-        {"id": 4, "name": "важно"}
-    ]
+    # Обновляем клавиатуру: теги канала из кеша, без запроса к БД
+    tags = await tag_service.get_tags_by_channel(data.get('tags_channel_id'))
     
     await callback.message.edit_reply_markup(
         reply_markup=get_tags_keyboard(tags, selected_tags)
@@ -298,7 +299,7 @@ async def callback_tags_done(callback: CallbackQuery, state: FSMContext):
             return
         
         # Получаем серии для первого канала
-        channel_id = channel_ids[0]
+        channel_id = data.get('tags_channel_id') or await channel_registry.get_id(channel_ids[0])
         series = await series_service.get_series_by_channel(channel_id)
         
         if not series:
@@ -685,25 +686,63 @@ async def callback_confirm_publish(callback: CallbackQuery, state: FSMContext):
     
     await callback.answer()
 
+async def _load_my_posts_page(user_id: int, callback_data: Optional[str] = None):
+    """Страница «Мои посты» по курсору из callback_data (posts_next_/posts_prev_)
+    
+    Загружается ровно одна страница; номер страницы едет в callback_data,
+    общее количество — из кешированного счетчика.
+    """
+    pagination = get_pagination_manager()
+    page, cursor, backward = 1, None, False
+    if callback_data and callback_data.startswith(("posts_next_", "posts_prev_")):
+        try:
+            _, direction, page_text, cursor_text = callback_data.split("_", 3)
+            page, cursor, backward = int(page_text), decode_cursor(cursor_text), direction == "prev"
+        except ValueError:
+            logger.warning(f"Некорректный курсор пагинации: {callback_data}")
+            page, cursor, backward = 1, None, False
+    
+    result = await post_service.list_user_posts(user_id, cursor, backward, limit=pagination.items_per_page)
+    if cursor is not None and not result['posts']:
+        # Посты с той стороны курсора удалены — начинаем сначала
+        page, cursor, backward = 1, None, False
+        result = await post_service.list_user_posts(user_id, limit=pagination.items_per_page)
+    
+    posts = result['posts']
+    if backward:
+        if not result['has_more']:
+            page = 1
+        has_previous, has_next = result['has_more'], True
+    else:
+        has_previous, has_next = page > 1, result['has_more']
+    
+    total = await post_service.count_user_posts(user_id)
+    page_info = pagination.get_cursor_page_info(
+        total, page, len(posts), has_previous, has_next, "posts",
+        first_key=(posts[0]['created_at'], posts[0]['id']) if posts else None,
+        last_key=(posts[-1]['created_at'], posts[-1]['id']) if posts else None
+    )
+    return posts, page_info
+
 @router.callback_query(F.data == "my_posts")
 async def callback_my_posts(callback: CallbackQuery):
     """Просмотр постов пользователя с пагинацией"""
     await callback_my_posts_page(callback, page=1)
 
-@router.callback_query(F.data.startswith("posts_page_"))
+@router.callback_query(F.data.startswith(("posts_page_", "posts_next_", "posts_prev_")))
 async def callback_my_posts_page(callback: CallbackQuery, page: int = None):
-    """Просмотр постов пользователя с пагинацией и новым интерфейсом"""
+    """Просмотр постов пользователя с пагинацией и новым интерфейсом
+    
+    page=1 — первая страница; иначе страница по курсору из callback_data
+    (старые кнопки posts_page_N открывают первую страницу).
+    """
     try:
-        # Извлекаем номер страницы из callback_data
-        if page is None:
-            page = int(callback.data.split("_")[2])
-        
-        logger.info(f"📋 Просмотр постов пользователя {callback.from_user.id}, страница {page}")
+        callback_data = None if page == 1 else callback.data
+        page_posts, page_info = await _load_my_posts_page(callback.from_user.id, callback_data)
         
-        # Получаем все посты пользователя (без лимита)
-        all_posts = await post_service.get_user_posts(callback.from_user.id, limit=1000)
+        logger.info(f"📋 Просмотр постов пользователя {callback.from_user.id}, страница {page_info['current_page']}")
         
-        if not all_posts:
+        if not page_posts:
             await callback.message.edit_text(
                 "📋 *Мои посты*\n\n"
                 "У вас пока нет постов.\n"
@@ -716,9 +755,7 @@ async def callback_my_posts_page(callback: CallbackQuery, page: int = None):
             await callback.answer()
             return
         
-        # Используем пагинацию
         pagination = get_pagination_manager()
-        page_posts, page_info = pagination.get_page_items(all_posts, page)
         
         # Временно используем простой интерфейс
         text = f"📋 *МОИ ПОСТЫ* (стр. {page_info['current_page']}/{page_info['total_pages']})\n\n"
@@ -1167,10 +1204,10 @@ async def callback_cancel_post(callback: CallbackQuery, state: FSMContext):
 async def cmd_my_posts(message: Message):
     """Команда просмотра постов с пагинацией"""
     try:
-        # Получаем все посты пользователя
-        all_posts = await post_service.get_user_posts(message.from_user.id, limit=1000)
+        # Первая страница и курсор для следующей
+        page_posts, page_info = await _load_my_posts_page(message.from_user.id)
         
-        if not all_posts:
+        if not page_posts:
             await message.answer(
                 "📋 *Мои посты*\n\n"
                 "У вас пока нет постов.\n"
@@ -1181,9 +1218,7 @@ async def cmd_my_posts(message: Message):
             )
             return
         
-        # Используем пагинацию
         pagination = get_pagination_manager()
-        page_posts, page_info = pagination.get_page_items(all_posts, 1)
         
         # Формируем список постов
         text = f"📋 *Мои посты* (стр. {page_info['current_page']}/{page_info['total_pages']})\n\n"
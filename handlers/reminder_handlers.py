@@ -12,6 +12,7 @@ from aiogram.fsm.context import FSMContext
 from datetime import datetime, timedelta
 
 from services.reminder_service import reminder_service
+from services.channel_registry import channel_registry
 from utils.keyboards import get_main_menu_keyboard
 from utils.filters import IsConfigAdminFilter
 from utils.logging import get_logger
@@ -216,10 +217,7 @@ async def callback_select_channel(callback: CallbackQuery):
         channel_id = int(callback.data.split("_")[-1])
         
         # Получаем информацию о канале
-        channel = await db.fetch_one(
-            "SELECT id, title, tg_channel_id FROM channels WHERE id = $1", 
-            channel_id
-        )
+        channel = await channel_registry.get(channel_id)
         
         if not channel:
             await callback.message.edit_text(
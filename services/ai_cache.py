@@ -0,0 +1,131 @@
+"""
+@file: services/ai_cache.py
+@description: Кеш ответов YandexGPT по хешу (операция, нормализованный текст, параметры, модель)
+@dependencies: database.py, utils/cache.py
+@created: 2026-10-17
+"""
+
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from typing import Any, Dict, Optional
+
+from config import config
+from database import db
+from utils.cache import TTLCache
+from utils.logging import get_logger
+from utils.metrics import increment
+
+logger = get_logger(__name__)
+
+_SPACES = re.compile(r'[ \t ]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+# Просроченные записи удаляются при записи, не чаще раза в PURGE_INTERVAL секунд
+PURGE_INTERVAL = 3600
+
+def normalize_text(text: str) -> str:
+    """Текст без различий, не влияющих на ответ: NFC, переводы строк, лишние пробелы"""
+    normalized = unicodedata.normalize('NFC', text or '').replace('\r\n', '\n').replace('\r', '\n')
+    lines = [_SPACES.sub(' ', line).strip() for line in normalized.split('\n')]
+    return _BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip()
+
+def make_cache_key(operation: str, text: str, params: Dict[str, Any], model_uri: str) -> str:
+    """sha256 от (операция, нормализованный текст, параметры, модель)"""
+    material = json.dumps(
+        [operation, normalize_text(text), params, model_uri],
+        ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class AIResponseCache:
+    """Двухуровневый кеш ответов: LRU в памяти и (AI_CACHE_DB=true) таблица ai_response_cache
+
+    Таблица общая для всех реплик бота и переживает перезапуск; ответ,
+    найденный в ней, поднимается в память.
+    """
+
+    def __init__(self, maxsize: int = 500, ttl: float = 86400, use_db: bool = False):
+        self.ttl = ttl
+        self.use_db = use_db
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl, name='ai_responses')
+        self._purged_at = 0.0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        """Ответ по ключу или None"""
+        response = self._memory.get(key)
+        if response is not None:
+            self.memory_hits += 1
+            increment('ai_cache_hits')
+            return response
+
+        if self.use_db:
+            try:
+                response = await db.fetch_val(
+                    "SELECT response FROM ai_response_cache WHERE key = $1 AND expires_at > NOW()",
+                    key
+                )
+            except Exception as e:
+                logger.warning("AI cache lookup failed: %s", e)
+                response = None
+            if response is not None:
+                self.db_hits += 1
+                increment('ai_cache_hits')
+                self._memory.set(key, response)
+                return response
+
+        self.misses += 1
+        increment('ai_cache_misses')
+        return None
+
+    async def set(self, key: str, operation: str, response: str) -> None:
+        """Сохраняет ответ в памяти и, если включено, в БД"""
+        self._memory.set(key, response)
+        if not self.use_db:
+            return
+        try:
+            await db.execute(
+                """
+                INSERT INTO ai_response_cache (key, operation, response, expires_at)
+                VALUES ($1, $2, $3, NOW() + make_interval(secs => $4))
+                ON CONFLICT (key) DO UPDATE SET
+                    response = EXCLUDED.response,
+                    created_at = NOW(),
+                    expires_at = EXCLUDED.expires_at
+                """,
+                key, operation, response, float(self.ttl)
+            )
+            if time.monotonic() - self._purged_at > PURGE_INTERVAL:
+                self._purged_at = time.monotonic()
+                await db.execute("DELETE FROM ai_response_cache WHERE expires_at <= NOW()")
+        except Exception as e:
+            logger.warning("AI cache write failed: %s", e)
+
+    def clear(self) -> None:
+        """Очищает кеш в памяти (таблица не трогается)"""
+        self._memory.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Попадания по уровням и доля попаданий"""
+        total = self.memory_hits + self.db_hits + self.misses
+        return {
+            'size': len(self._memory),
+            'maxsize': self._memory.maxsize,
+            'db_enabled': self.use_db,
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.memory_hits + self.db_hits) / total, 4) if total else 0.0
+        }
+
+# Глобальный экземпляр
+ai_response_cache = AIResponseCache(
+    maxsize=config.AI_CACHE_SIZE,
+    ttl=config.AI_CACHE_TTL,
+    use_db=config.AI_CACHE_DB
+)
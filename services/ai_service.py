@@ -1,72 +1,171 @@
 """
 @file: services/ai.py
 @description: Сервис для работы с YandexGPT API
-@dependencies: config.py, aiohttp
+@dependencies: config.py, services/ai_cache.py, utils/metrics.py, aiohttp
 @created: 2025-09-13
 """
 
 import aiohttp
+import asyncio
+import hashlib
 import json
+import time
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
 from config import config
+from services.ai_cache import ai_response_cache, make_cache_key
 from utils.logging import get_logger
+from utils.metrics import get_counter, get_histogram, increment
 
 logger = get_logger(__name__)
 
+TEMPERATURE = 0.6
+
 class AIService:
-    """Сервис для работы с YandexGPT API"""
+    """Сервис для работы с YandexGPT API
+    
+    Запросы идут через одну ClientSession с пулом соединений (start/close
+    в on_startup/on_shutdown бота), не более AI_MAX_CONCURRENCY одновременно.
+    Одинаковые запросы, пока первый еще выполняется, ждут его ответа.
+    """
     
     def __init__(self):
         self.api_key = config.YANDEX_API_KEY
         self.folder_id = config.YANDEX_FOLDER_ID
         self.base_url = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
-        self.headers = {
+        self.cache = ai_response_cache
+        self.max_concurrency = config.AI_MAX_CONCURRENCY
+        self.timeout = config.AI_REQUEST_TIMEOUT
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Хеш тела запроса -> выполняющийся запрос
+        self._inflight: Dict[str, asyncio.Task] = {}
+    
+    @property
+    def model_uri(self) -> str:
+        return f"gpt://{self.folder_id}/yandexgpt-lite"
+    
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Api-Key {self.api_key}",
             "Content-Type": "application/json"
         }
     
+    async def start(self) -> None:
+        """Создает общую сессию; соединения с API переиспользуются между запросами"""
+        if self._session and not self._session.closed:
+            return
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        logger.info("✅ AI HTTP session started (max %s concurrent requests)", self.max_concurrency)
+    
+    async def close(self) -> None:
+        """Закрывает общую сессию"""
+        if self._session:
+            await self._session.close()
+            self._session = None
+            logger.info("AI HTTP session closed")
+    
     async def _make_request(self, prompt: str, max_tokens: int = 1000) -> Optional[Dict[str, Any]]:
         """Выполнение запроса к YandexGPT API"""
         if not self.api_key or not self.folder_id:
             logger.warning("YandexGPT API not configured")
             return None
         
-        try:
-            payload = {
-                "modelUri": f"gpt://{self.folder_id}/yandexgpt-lite",
-                "completionOptions": {
-                    "stream": False,
-                    "temperature": 0.6,
-                    "maxTokens": max_tokens
-                },
-                "messages": [
-                    {
-                        "role": "user",
-                        "text": prompt
-                    }
-                ]
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
+        payload = {
+            "modelUri": self.model_uri,
+            "completionOptions": {
+                "stream": False,
+                "temperature": TEMPERATURE,
+                "maxTokens": max_tokens
+            },
+            "messages": [
+                {
+                    "role": "user",
+                    "text": prompt
+                }
+            ]
+        }
+        key = hashlib.sha256(
+            json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._send(payload))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            increment('ai_requests_coalesced')
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(task)
+    
+    async def _send(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Один HTTP-запрос к API под семафором; None при ошибке"""
+        if self._session is None or self._session.closed:
+            # Вне бота (скрипты, тесты) сессия создается при первом запросе
+            await self.start()
+        
+        async with self._semaphore:
+            increment('ai_requests')
+            started = time.perf_counter()
+            try:
+                async with self._session.post(self.base_url, headers=self.headers, json=payload) as response:
                     if response.status == 200:
-                        result = await response.json()
-                        return result
-                    else:
-                        error_text = await response.text()
-                        logger.error("YandexGPT API error %s: %s", response.status, error_text)
-                        return None
-                        
-        except Exception as e:
-            logger.error("Failed to make YandexGPT request: %s", e)
-            return None
+                        return await response.json()
+                    error_text = await response.text()
+                    increment('ai_request_errors')
+                    logger.error("YandexGPT API error %s: %s", response.status, error_text)
+                    return None
+            except Exception as e:
+                increment('ai_request_errors')
+                logger.error("Failed to make YandexGPT request: %s", e)
+                return None
+            finally:
+                get_histogram('ai_request_seconds').observe(time.perf_counter() - started)
+    
+    async def _complete(self, operation: str, text: str, params: Dict[str, Any],
+                        prompt: str, max_tokens: int) -> str:
+        """Текст ответа модели с кешем по (операция, текст, параметры, модель); '' при ошибке
+        
+        Повторное нажатие той же кнопки на том же черновике не тратит квоту
+        и отвечает из кеша. Пустые ответы и ошибки не кешируются.
+        """
+        key = make_cache_key(
+            operation, text,
+            {**params, 'max_tokens': max_tokens, 'temperature': TEMPERATURE},
+            self.model_uri
+        )
+        cached = await self.cache.get(key)
+        if cached is not None:
+            logger.debug("AI cache hit: %s", operation)
+            return cached
+        
+        result = await self._make_request(prompt, max_tokens=max_tokens)
+        if not result:
+            return ''
+        response_text = result.get("result", {}).get("alternatives", [{}])[0].get("message", {}).get("text", "")
+        if response_text:
+            await self.cache.set(key, operation, response_text)
+        return response_text
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кеша ответов"""
+        return self.cache.get_stats()
+    
+    def get_request_stats(self) -> Dict[str, Any]:
+        """Запросы к API: число, ошибки, объединенные дубли, задержка"""
+        return {
+            'requests': get_counter('ai_requests'),
+            'errors': get_counter('ai_request_errors'),
+            'coalesced': get_counter('ai_requests_coalesced'),
+            'in_flight': len(self._inflight),
+            'latency_seconds': get_histogram('ai_request_seconds').snapshot()
+        }
     
     async def suggest_tags(self, post_text: str, existing_tags: List[str] = None) -> List[str]:
         """Предложение тегов на основе текста поста"""
@@ -91,12 +190,9 @@ class AIService:
 Пример: новости, технологии, анонс, важное, обновление
 """
             
-            result = await self._make_request(prompt, max_tokens=200)
-            if not result:
-                return []
-            
-            # Извлекаем текст ответа
-            response_text = result.get("result", {}).get("alternatives", [{}])[0].get("message", {}).get("text", "")
+            response_text = await self._complete(
+                'suggest_tags', post_text[:500], {'existing_tags': existing_tags or []}, prompt, 200
+            )
             
             if not response_text:
                 return []
@@ -129,11 +225,9 @@ class AIService:
 - Сохрани структуру, если есть списки или абзацы
 """
             
-            result = await self._make_request(prompt, max_tokens=500)
-            if not result:
-                return text[:max_length] + "..."
-            
-            response_text = result.get("result", {}).get("alternatives", [{}])[0].get("message", {}).get("text", "")
+            response_text = await self._complete(
+                'shorten_text', text, {'max_length': max_length}, prompt, 500
+            )
             
             if not response_text:
                 return text[:max_length] + "..."
@@ -171,11 +265,7 @@ class AIService:
 - Сделай текст более подходящим для выбранного стиля
 """
             
-            result = await self._make_request(prompt, max_tokens=1000)
-            if not result:
-                return text
-            
-            response_text = result.get("result", {}).get("alternatives", [{}])[0].get("message", {}).get("text", "")
+            response_text = await self._complete('change_style', text, {'style': style}, prompt, 1000)
             
             if not response_text:
                 return text
@@ -203,11 +293,7 @@ class AIService:
 - Используй русский язык
 """
             
-            result = await self._make_request(prompt, max_tokens=300)
-            if not result:
-                return "Аннотация недоступна"
-            
-            response_text = result.get("result", {}).get("alternatives", [{}])[0].get("message", {}).get("text", "")
+            response_text = await self._complete('generate_annotation', text, {}, prompt, 300)
             
             if not response_text:
                 return "Аннотация недоступна"
@@ -236,11 +322,7 @@ class AIService:
 - Используй русский язык
 """
             
-            result = await self._make_request(prompt, max_tokens=1000)
-            if not result:
-                return text
-            
-            response_text = result.get("result", {}).get("alternatives", [{}])[0].get("message", {}).get("text", "")
+            response_text = await self._complete('improve_text', text, {}, prompt, 1000)
             
             if not response_text:
                 return text
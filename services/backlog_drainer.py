@@ -0,0 +1,143 @@
+"""
+@file: services/backlog_drainer.py
+@description: Догоняющая публикация просроченных постов после простоя бота
+@dependencies: services/post_service.py, utils/rate_limiter.py, utils/metrics.py
+@created: 2026-10-17
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from config import config
+from services.post_service import post_service
+from utils.logging import get_logger
+from utils.metrics import increment
+from utils.rate_limiter import TokenBucket
+
+logger = get_logger(__name__)
+
+class BacklogDrainer:
+    """Проходит по всем просроченным постам страницами по (scheduled_at, id)
+
+    Обычный путь публикации берет только посты за последний час; после
+    простоя дольше часа остальные просроченные посты публикует этот
+    drainer, не быстрее max_rate постов в секунду.
+    """
+
+    def __init__(self, max_rate: float = 5, page_size: int = 100):
+        self.max_rate = max_rate
+        self.page_size = page_size
+        self._task: Optional[asyncio.Task] = None
+        self._bucket: Optional[TokenBucket] = None
+        self._reset_progress()
+
+    def _reset_progress(self) -> None:
+        self.total = 0
+        self.processed = 0
+        self.published = 0
+        self.failed = 0
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._started_monotonic = 0.0
+        self._elapsed = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Запускает догоняющую публикацию в фоне (если еще не идет)"""
+        if self.is_running:
+            logger.warning("Backlog drain already running")
+            return
+        self._task = asyncio.create_task(self.drain())
+
+    async def stop(self) -> None:
+        """Прерывает догоняющую публикацию"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _throttle(self) -> None:
+        """Ждет, пока скорость публикации не опустится до max_rate"""
+        while True:
+            now = time.monotonic()
+            wait = self._bucket.wait_time(now)
+            if wait <= 0:
+                self._bucket.consume(now)
+                return
+            await asyncio.sleep(wait)
+
+    async def drain(self) -> int:
+        """Публикует все просроченные посты, возвращает количество опубликованных"""
+        self._reset_progress()
+        self._bucket = TokenBucket(self.max_rate, 1)
+        self.started_at = datetime.now(timezone.utc)
+        self._started_monotonic = time.monotonic()
+
+        try:
+            self.total = await post_service.count_overdue_posts()
+            if not self.total:
+                logger.info("📭 Просроченных постов нет, догоняющая публикация не нужна")
+                return 0
+
+            logger.info(f"⏩ Догоняющая публикация: {self.total} просроченных постов, до {self.max_rate} постов/сек")
+            after: Optional[Tuple[datetime, int]] = None
+            while True:
+                posts = await post_service.claim_overdue_posts(after, self.page_size)
+                if not posts:
+                    break
+                after = (posts[-1]['scheduled_at'], posts[-1]['id'])
+
+                published, failed_ids = await post_service.publish_claimed_posts(posts, throttle=self._throttle)
+                self.processed += len(posts)
+                self.published += published
+                self.failed += len(failed_ids)
+                increment('catchup_posts_published', published)
+                self._elapsed = time.monotonic() - self._started_monotonic
+
+                logger.info(
+                    f"⏩ Догоняющая публикация: {self.processed}/{self.total} "
+                    f"({self.throughput:.2f} постов/сек, ошибок {self.failed})"
+                )
+
+            logger.info(f"✅ Догоняющая публикация завершена: {self.published}/{self.processed} за {self._elapsed:.1f} сек")
+            return self.published
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка догоняющей публикации: {e}")
+            return self.published
+        finally:
+            self._elapsed = time.monotonic() - self._started_monotonic
+            self.finished_at = datetime.now(timezone.utc)
+
+    @property
+    def throughput(self) -> float:
+        """Обработано постов в секунду"""
+        return self.processed / self._elapsed if self._elapsed > 0 else 0.0
+
+    def get_stats(self) -> dict:
+        """Прогресс и скорость догоняющей публикации"""
+        return {
+            "running": self.is_running,
+            "total": self.total,
+            "processed": self.processed,
+            "published": self.published,
+            "failed": self.failed,
+            "throughput_per_second": round(self.throughput, 2),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+# Глобальный экземпляр
+backlog_drainer = BacklogDrainer(
+    max_rate=config.CATCHUP_MAX_RATE,
+    page_size=config.CATCHUP_PAGE_SIZE
+)
@@ -0,0 +1,182 @@
+"""
+@file: services/cache_bus.py
+@description: Сброс in-process кешей на всех репликах бота через PostgreSQL LISTEN/NOTIFY
+@dependencies: database.py, utils/metrics.py
+@created: 2026-10-17
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import config
+from database import db
+from utils.logging import get_logger
+from utils.metrics import get_histogram, increment
+
+logger = get_logger(__name__)
+
+# Канал LISTEN/NOTIFY для сообщений о сбросе кешей
+INVALIDATION_CHANNEL = 'cache_invalidation'
+
+# Типы сообщений: ключи — ID соответствующих сущностей
+CHANNELS = 'channels'  # ID каналов (реестр каналов)
+TAGS = 'tags'  # ID каналов (теги канала)
+SERIES = 'series'  # ID каналов (серии канала)
+POSTS = 'posts'  # ID постов (подготовленные к отправке данные)
+USER_POSTS = 'user_posts'  # ID пользователей (число постов пользователя)
+ALL = 'all'  # полный сброс всех кешей
+
+# NOTIFY принимает до 8000 байт; длинный список ключей заменяется сбросом всего типа
+MAX_PAYLOAD_BYTES = 7000
+
+Evict = Callable[[Any], None]
+Flush = Callable[[], None]
+
+class CacheInvalidationBus:
+    """Типизированные сообщения о сбросе кешей между репликами
+
+    Запись (сервисный слой) вызывает publish(kind, *keys): ключи сразу
+    сбрасываются в своем процессе, затем NOTIFY доставляет сообщение
+    остальным репликам, и их подписчики сбрасывают те же ключи.
+    Все реплики слушают через одно выделенное LISTEN-подключение Database.
+    Если оно обрывалось, сообщения за это время потеряны — после
+    переподключения локальные кеши очищаются целиком.
+    """
+
+    def __init__(self, check_interval: float = 30.0):
+        self.check_interval = check_interval
+        # Метка процесса: свои сообщения не применяются повторно
+        self.origin = uuid.uuid4().hex[:12]
+        self._subscribers: Dict[str, List[Tuple[Evict, Flush]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.received = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def subscribe(self, kind: str, evict: Evict, flush: Flush) -> None:
+        """evict(key) сбрасывает один ключ, flush() — весь кеш этого типа"""
+        self._subscribers.setdefault(kind, []).append((evict, flush))
+
+    async def start(self) -> None:
+        """Подписывается на канал и запускает проверку LISTEN-подключения"""
+        if self.is_running:
+            return
+        try:
+            await db.add_listener(INVALIDATION_CHANNEL, self._on_notify)
+        except Exception as e:
+            # Подписка уже записана в db: _watch откроет LISTEN-подключение и подпишет ее
+            logger.error("Failed to LISTEN on %s: %s", INVALIDATION_CHANNEL, e)
+        self._task = asyncio.create_task(self._watch())
+        logger.info("✅ Cache invalidation bus started (origin %s)", self.origin)
+
+    async def stop(self) -> None:
+        """Останавливает проверку и отписывается от канала"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await db.remove_listener(INVALIDATION_CHANNEL, self._on_notify)
+        except Exception as e:
+            logger.warning("Failed to UNLISTEN %s: %s", INVALIDATION_CHANNEL, e)
+        logger.info("Cache invalidation bus stopped")
+
+    async def publish(self, kind: str, *keys: Any, local: bool = True) -> None:
+        """Сбрасывает ключи локально и рассылает сообщение остальным репликам
+
+        Без ключей сбрасывается весь кеш типа kind. local=False — локальный кеш
+        уже обновлен записью (write-through), сообщение нужно только другим репликам.
+        Вызывается после COMMIT записи. Ошибка отправки не прерывает запись:
+        устаревание ограничено TTL кешей.
+        """
+        key_list = [key for key in keys if key is not None]
+        if keys and not key_list:
+            return
+        if local:
+            self._apply(kind, key_list or None)
+
+        message = {'kind': kind, 'keys': key_list or None, 'origin': self.origin, 'sent_at': time.time()}
+        payload = json.dumps(message, separators=(',', ':'))
+        if len(payload.encode('utf-8')) > MAX_PAYLOAD_BYTES:
+            message['keys'] = None
+            payload = json.dumps(message, separators=(',', ':'))
+        try:
+            await db.notify(INVALIDATION_CHANNEL, payload)
+            self.sent += 1
+            increment('cache_invalidations_sent')
+        except Exception as e:
+            increment('cache_invalidations_failed')
+            logger.warning("Failed to publish %s invalidation: %s", kind, e)
+
+    async def flush_all(self) -> None:
+        """Полный сброс всех кешей на всех репликах"""
+        await self.publish(ALL)
+
+    def _apply(self, kind: str, keys: Optional[Iterable[Any]]) -> None:
+        """Вызывает подписчиков: keys=None — сброс всего типа, kind=ALL — всех типов"""
+        kinds = list(self._subscribers) if kind == ALL else [kind]
+        for subscriber_kind in kinds:
+            for evict, flush in self._subscribers.get(subscriber_kind, []):
+                try:
+                    if keys is None or kind == ALL:
+                        flush()
+                    else:
+                        for key in keys:
+                            evict(key)
+                except Exception as e:
+                    logger.error("Cache invalidation %s failed: %s", subscriber_kind, e)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        """Обработчик NOTIFY: сбрасывает ключи из сообщения другой реплики"""
+        try:
+            message = json.loads(payload)
+            kind = message['kind']
+        except (TypeError, ValueError, KeyError):
+            logger.warning("Unexpected %s payload: %r", channel, payload)
+            return
+
+        self.received += 1
+        increment('cache_invalidations_received')
+        sent_at = message.get('sent_at')
+        if sent_at:
+            # Между разными хостами включает расхождение часов
+            get_histogram('cache_invalidation_lag_seconds').observe(max(0.0, time.time() - sent_at))
+        if message.get('origin') == self.origin:
+            return
+        self._apply(kind, message.get('keys'))
+
+    async def _watch(self) -> None:
+        """Следит за LISTEN-подключением; после переподключения очищает локальные кеши"""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                if await db.ensure_listening():
+                    increment('cache_bus_reconnects')
+                    logger.warning("LISTEN connection restored, flushing local caches")
+                    self._apply(ALL, None)
+            except Exception as e:
+                logger.error("Failed to restore LISTEN connection: %s", e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Отправленные и полученные сообщения, задержка доставки"""
+        return {
+            'running': self.is_running,
+            'listening': db.is_listening,
+            'origin': self.origin,
+            'subscribers': {kind: len(items) for kind, items in self._subscribers.items()},
+            'sent': self.sent,
+            'received': self.received,
+            'lag_seconds': get_histogram('cache_invalidation_lag_seconds').snapshot()
+        }
+
+# Глобальный экземпляр
+cache_bus = CacheInvalidationBus(check_interval=config.CACHE_BUS_CHECK_INTERVAL)
@@ -0,0 +1,166 @@
+"""
+@file: services/channel_registry.py
+@description: Реестр каналов в памяти: id ↔ tg_channel_id ↔ title без запросов к БД на интерактивных путях
+@dependencies: database.py
+@created: 2026-10-17
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import db
+from services.cache_bus import CHANNELS, cache_bus
+from utils.logging import get_logger
+from utils.metrics import increment
+
+logger = get_logger(__name__)
+
+CHANNELS_QUERY = "SELECT id, tg_channel_id, title FROM channels"
+
+# Канал, которого еще нет в реестре (добавлен другой репликой бота)
+CHANNEL_BY_TG_ID_QUERY = "SELECT id, tg_channel_id, title FROM channels WHERE tg_channel_id = $1"
+CHANNEL_BY_ID_QUERY = "SELECT id, tg_channel_id, title FROM channels WHERE id = $1"
+
+# Добавление канала: существующий возвращается как есть, created = false
+ADD_CHANNEL_QUERY = """
+    WITH inserted AS (
+        INSERT INTO channels (tg_channel_id, title)
+        VALUES ($1, $2)
+        ON CONFLICT (tg_channel_id) DO NOTHING
+        RETURNING id, tg_channel_id, title
+    )
+    SELECT id, tg_channel_id, title, true AS created FROM inserted
+    UNION ALL
+    SELECT id, tg_channel_id, title, false AS created FROM channels WHERE tg_channel_id = $1
+    LIMIT 1
+"""
+
+class ChannelRegistry:
+    """Все каналы загружаются один раз и дальше читаются из памяти
+
+    Каналов единицы-десятки, меняются они только при добавлении канала,
+    поэтому реестр держит их целиком. Запись идет через add_channel
+    (write-through); неизвестный ID один раз проверяется в БД.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[int, Tuple[int, Optional[str]]] = {}  # id -> (tg_channel_id, title)
+        self._by_tg_id: Dict[int, int] = {}  # tg_channel_id -> id
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _put(self, channel_id: int, tg_channel_id: int, title: Optional[str]) -> None:
+        previous = self._by_id.get(channel_id)
+        if previous and previous[0] != tg_channel_id:
+            self._by_tg_id.pop(previous[0], None)
+        self._by_id[channel_id] = (tg_channel_id, title)
+        self._by_tg_id[tg_channel_id] = channel_id
+
+    def _hit(self) -> None:
+        self.hits += 1
+        increment('channel_registry_hits')
+
+    def _miss(self) -> None:
+        self.misses += 1
+        increment('channel_registry_misses')
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            rows = await db.fetch_all(CHANNELS_QUERY)
+            for row in rows:
+                self._put(row['id'], row['tg_channel_id'], row['title'])
+            self._loaded = True
+            logger.info("Channel registry loaded: %s channels", len(rows))
+
+    async def _lookup(self, query: str, value: int) -> Optional[Dict[str, Any]]:
+        """Промах: канал ищется в БД и, если найден, добавляется в реестр"""
+        self._miss()
+        row = await db.fetch_one(query, value)
+        if not row:
+            return None
+        self._put(row['id'], row['tg_channel_id'], row['title'])
+        return self._as_dict(row['id'])
+
+    def _as_dict(self, channel_id: int) -> Dict[str, Any]:
+        tg_channel_id, title = self._by_id[channel_id]
+        return {'id': channel_id, 'tg_channel_id': tg_channel_id, 'title': title}
+
+    async def list_channels(self) -> List[Dict[str, Any]]:
+        """Все каналы, по названию"""
+        await self._ensure_loaded()
+        self._hit()
+        channels = [self._as_dict(channel_id) for channel_id in self._by_id]
+        return sorted(channels, key=lambda channel: ((channel['title'] or '').lower(), channel['id']))
+
+    async def get_by_tg_id(self, tg_channel_id: int) -> Optional[Dict[str, Any]]:
+        """Канал по Telegram ID или None"""
+        await self._ensure_loaded()
+        channel_id = self._by_tg_id.get(tg_channel_id)
+        if channel_id is not None:
+            self._hit()
+            return self._as_dict(channel_id)
+        return await self._lookup(CHANNEL_BY_TG_ID_QUERY, tg_channel_id)
+
+    async def get(self, channel_id: int) -> Optional[Dict[str, Any]]:
+        """Канал по внутреннему ID или None"""
+        await self._ensure_loaded()
+        if channel_id in self._by_id:
+            self._hit()
+            return self._as_dict(channel_id)
+        return await self._lookup(CHANNEL_BY_ID_QUERY, channel_id)
+
+    async def get_id(self, tg_channel_id: int) -> Optional[int]:
+        """Внутренний ID канала по Telegram ID"""
+        channel = await self.get_by_tg_id(tg_channel_id)
+        return channel['id'] if channel else None
+
+    async def get_tg_id(self, channel_id: int) -> Optional[int]:
+        """Telegram ID канала по внутреннему ID"""
+        channel = await self.get(channel_id)
+        return channel['tg_channel_id'] if channel else None
+
+    async def add_channel(self, tg_channel_id: int, title: Optional[str]) -> Tuple[Dict[str, Any], bool]:
+        """Добавляет канал в БД и в реестр; возвращает (канал, создан ли он сейчас)"""
+        row = await db.fetch_one(ADD_CHANNEL_QUERY, tg_channel_id, title)
+        if row is None:
+            # Канал только что добавлен параллельно и не виден в снимке этого запроса
+            row = await db.fetch_one(CHANNEL_BY_TG_ID_QUERY, tg_channel_id)
+            row = {**dict(row), 'created': False}
+        self._put(row['id'], row['tg_channel_id'], row['title'])
+        if row['created']:
+            await cache_bus.publish(CHANNELS, row['id'], local=False)
+        return self._as_dict(row['id']), row['created']
+
+    def invalidate(self, channel_id: int) -> None:
+        """Канал изменен другой репликой: убирает его и перечитывает список при следующем обращении"""
+        entry = self._by_id.pop(channel_id, None)
+        if entry:
+            self._by_tg_id.pop(entry[0], None)
+        self._loaded = False
+
+    def reset(self) -> None:
+        """Следующее обращение перечитает все каналы из БД"""
+        self._loaded = False
+        self._by_id.clear()
+        self._by_tg_id.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Размер реестра и попадания"""
+        total = self.hits + self.misses
+        return {
+            'loaded': self._loaded,
+            'channels': len(self._by_id),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+# Глобальный экземпляр
+channel_registry = ChannelRegistry()
+cache_bus.subscribe(CHANNELS, channel_registry.invalidate, channel_registry.reset)
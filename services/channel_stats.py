@@ -0,0 +1,118 @@
+"""
+@file: services/channel_stats.py
+@description: Статистика постов по каналам из таблиц-счетчиков channel_post_counters / channel_post_daily
+@dependencies: database.py
+@created: 2026-10-17
+"""
+
+from typing import Any, Dict, List, Optional
+
+from database import db
+from utils.logging import get_logger
+from utils.metrics import increment
+
+logger = get_logger(__name__)
+
+# Счетчики ведут statement-level триггеры posts_channel_counters_* (deploy/schema.sql) в той же
+# транзакции, что и изменение поста, поэтому чтение — O(каналов × статусов)
+COUNTER_COLUMNS = """
+    COALESCE(SUM(k.posts), 0)::bigint AS posts_count,
+    COALESCE(SUM(k.posts) FILTER (WHERE k.status::text = 'published'), 0)::bigint AS published_count,
+    COALESCE(SUM(k.posts) FILTER (WHERE k.status::text = 'scheduled'), 0)::bigint AS scheduled_count,
+    COALESCE(SUM(k.posts) FILTER (WHERE k.status::text = 'draft'), 0)::bigint AS draft_count,
+    COALESCE(SUM(k.posts) FILTER (WHERE k.status::text = 'deleted'), 0)::bigint AS deleted_count,
+    COALESCE(SUM(k.posts) FILTER (WHERE k.status::text = 'failed'), 0)::bigint AS failed_count,
+    COALESCE(SUM(k.media_posts), 0)::bigint AS media_posts_count,
+    COALESCE(SUM(k.scheduled_posts), 0)::bigint AS scheduled_posts_count
+"""
+
+# Даты первого и последнего поста — по индексу idx_posts_channel_created, без скана канала
+CHANNEL_STATS_QUERY = f"""
+    SELECT
+        c.*,
+        k.posts_count, k.published_count, k.scheduled_count, k.draft_count,
+        k.deleted_count, k.failed_count, k.media_posts_count, k.scheduled_posts_count,
+        (SELECT p.created_at FROM posts p WHERE p.channel_id = c.id
+         ORDER BY p.created_at DESC LIMIT 1) AS last_post_date,
+        (SELECT p.created_at FROM posts p WHERE p.channel_id = c.id
+         ORDER BY p.created_at ASC LIMIT 1) AS first_post_date
+    FROM channels c
+    CROSS JOIN LATERAL (
+        SELECT {COUNTER_COLUMNS}
+        FROM channel_post_counters k
+        WHERE k.channel_id = c.id
+    ) k
+    WHERE $1::bigint IS NULL OR c.id = $1
+    ORDER BY c.title ASC
+"""
+
+TOTALS_QUERY = f"""
+    SELECT {COUNTER_COLUMNS}
+    FROM channel_post_counters k
+    WHERE $1::bigint IS NULL OR k.channel_id = $1
+"""
+
+DAILY_TOTALS_QUERY = """
+    SELECT
+        COALESCE(SUM(created), 0)::bigint AS created,
+        COALESCE(SUM(published), 0)::bigint AS published
+    FROM channel_post_daily
+    WHERE day >= (NOW() AT TIME ZONE 'UTC')::date - ($1::int - 1)
+      AND ($2::bigint IS NULL OR channel_id = $2)
+"""
+
+# Расхождения счетчиков с posts (полный скан — только для /rebuild_counters)
+DRIFT_QUERY = """
+    SELECT
+        COALESCE(a.channel_id, k.channel_id) AS channel_id,
+        COALESCE(a.status, k.status) AS status,
+        COALESCE(a.posts, 0) AS actual,
+        COALESCE(k.posts, 0) AS counted
+    FROM (
+        SELECT channel_id, COALESCE(status, 'draft') AS status, COUNT(*) AS posts
+        FROM posts
+        GROUP BY channel_id, COALESCE(status, 'draft')
+    ) a
+    FULL JOIN channel_post_counters k
+        ON k.channel_id = a.channel_id AND k.status = a.status
+    WHERE COALESCE(a.posts, 0) <> COALESCE(k.posts, 0)
+"""
+
+class ChannelStatsService:
+    """Статистика постов по каналам для дашбордов, /digest и экспорта"""
+
+    async def get_channel_stats(self, channel_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Каналы со счетчиками постов по статусам, датами первого и последнего поста"""
+        rows = await db.fetch_all(CHANNEL_STATS_QUERY, channel_id, readonly=True)
+        return [dict(row) for row in rows]
+
+    async def get_totals(self, channel_id: Optional[int] = None) -> Dict[str, int]:
+        """Суммарные счетчики по всем каналам или по одному каналу"""
+        row = await db.fetch_one(TOTALS_QUERY, channel_id, readonly=True)
+        return dict(row)
+
+    async def get_recent_totals(self, days: int = 7, channel_id: Optional[int] = None) -> Dict[str, int]:
+        """Созданные и опубликованные посты за последние days дней (по дням UTC, включая сегодня)"""
+        row = await db.fetch_one(DAILY_TOTALS_QUERY, days, channel_id, readonly=True)
+        return dict(row)
+
+    async def find_drift(self) -> List[Dict[str, Any]]:
+        """(канал, статус), где счетчик не совпадает с числом постов"""
+        rows = await db.fetch_all(DRIFT_QUERY)
+        return [dict(row) for row in rows]
+
+    async def rebuild(self) -> int:
+        """Пересчитывает счетчики из posts; возвращает число расходившихся пар (канал, статус)"""
+        drift = await self.find_drift()
+        for item in drift:
+            logger.warning(
+                "Channel counter drift: channel=%s status=%s counted=%s actual=%s",
+                item['channel_id'], item['status'], item['counted'], item['actual']
+            )
+        await db.execute("SELECT rebuild_channel_post_counters()")
+        increment('channel_counters_rebuilds')
+        logger.info("✅ Channel post counters rebuilt, %s drifted rows fixed", len(drift))
+        return len(drift)
+
+# Глобальный экземпляр сервиса
+channel_stats_service = ChannelStatsService()
@@ -6,6 +6,7 @@ from datetime import datetime
 import json
 
 from database import db
+from services.channel_stats import channel_stats_service
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +36,7 @@ class ExportService:
             """
             params.append(limit)
             
-            posts = await db.fetch_all(query, *params)
+            posts = await db.fetch_all(query, *params, readonly=True)
             
             # Конвертируем посты в словари и обрабатываем datetime
             posts_data = []
@@ -85,7 +86,7 @@ class ExportService:
             """
             params.append(limit)
             
-            posts = await db.fetch_all(query, *params)
+            posts = await db.fetch_all(query, *params, readonly=True)
             
             markdown = f"# Экспорт постов\n\n"
             markdown += f"**Дата экспорта:** {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
@@ -131,47 +132,22 @@ class ExportService:
     async def get_export_stats(self, channel_id: Optional[int] = None) -> Dict[str, Any]:
         """Получение статистики для экспорта"""
         try:
-            where_clause = ""
-            params = []
-            
-            if channel_id:
-                where_clause = "WHERE channel_id = $1"
-                params.append(channel_id)
-            
-            # Общая статистика
-            stats_query = f"""
-                SELECT 
-                    COUNT(*) as total_posts,
-                    COUNT(CASE WHEN status = 'published' THEN 1 END) as published_posts,
-                    COUNT(CASE WHEN status = 'scheduled' THEN 1 END) as scheduled_posts,
-                    COUNT(CASE WHEN status = 'draft' THEN 1 END) as draft_posts,
-                    COUNT(CASE WHEN status = 'deleted' THEN 1 END) as deleted_posts
-                FROM posts
-                {where_clause}
-            """
-            
-            stats = await db.fetch_one(stats_query, *params)
-            
-            # Статистика по каналам
-            channels_query = """
-                SELECT 
-                    c.title,
-                    COUNT(p.id) as posts_count
-                FROM channels c
-                LEFT JOIN posts p ON c.id = p.channel_id
-                GROUP BY c.id, c.title
-                ORDER BY posts_count DESC
-            """
-            
-            channels = await db.fetch_all(channels_query)
+            # Счетчики вместо COUNT по posts: O(каналов), а не O(постов)
+            stats = await channel_stats_service.get_totals(channel_id)
+            channels = await channel_stats_service.get_channel_stats()
+            channels.sort(key=lambda channel: channel['posts_count'], reverse=True)
             
             return {
-                "total_posts": stats['total_posts'],
-                "published_posts": stats['published_posts'],
-                "scheduled_posts": stats['scheduled_posts'],
-                "draft_posts": stats['draft_posts'],
-                "deleted_posts": stats['deleted_posts'],
-                "channels": [dict(channel) for channel in channels]
+                "total_posts": stats['posts_count'],
+                "published_posts": stats['published_count'],
+                "scheduled_posts": stats['scheduled_count'],
+                "draft_posts": stats['draft_count'],
+                "deleted_posts": stats['deleted_count'],
+                "failed_posts": stats['failed_count'],
+                "channels": [
+                    {"title": channel['title'], "posts_count": channel['posts_count']}
+                    for channel in channels
+                ]
             }
             
         except Exception as e:
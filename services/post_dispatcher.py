@@ -0,0 +1,231 @@
+"""
+@file: services/post_dispatcher.py
+@description: Событийный диспетчер отложенных публикаций (min-heap + LISTEN/NOTIFY)
+@dependencies: database.py, services/post_service.py, utils/metrics.py
+@created: 2026-10-17
+"""
+
+import asyncio
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from config import config
+from database import db
+from services.post_service import SCHEDULE_CHANNEL, post_service
+from utils.logging import get_logger
+from utils.metrics import get_histogram
+
+logger = get_logger(__name__)
+
+class PostDispatcher:
+    """Держит в памяти ближайшие scheduled_at и спит ровно до следующего"""
+
+    def __init__(self, horizon_minutes: int = 60, resync_seconds: int = 300,
+                 lookahead_seconds: int = 180):
+        self.horizon = timedelta(minutes=horizon_minutes)
+        self.resync_interval = timedelta(seconds=resync_seconds)
+        # За lookahead до публикации данные поста готовятся заранее
+        self.lookahead = timedelta(seconds=lookahead_seconds)
+        self._warmed: Set[int] = set()
+        # Куча (scheduled_at, post_id); устаревшие записи отбрасываются лениво
+        self._heap: List[Tuple[datetime, int]] = []
+        self._due_at: Dict[int, datetime] = {}
+        self._pending: Set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._publish: Optional[Callable[[], Awaitable[None]]] = None
+        self._last_resync: Optional[datetime] = None
+        self.dispatch_count = 0
+        self.notify_count = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, publish: Callable[[], Awaitable[None]]) -> None:
+        """Запускает диспетчер; publish вызывается, когда подошло время поста"""
+        if self.is_running:
+            logger.warning("Post dispatcher already running")
+            return
+
+        self._publish = publish
+        try:
+            await db.add_listener(SCHEDULE_CHANNEL, self._on_notify)
+        except Exception as e:
+            # Без LISTEN диспетчер продолжит работать на периодической сверке
+            logger.error("Failed to LISTEN on %s: %s", SCHEDULE_CHANNEL, e)
+
+        self._task = asyncio.create_task(self._run())
+        logger.info("✅ Post dispatcher started (horizon %s, resync %s)", self.horizon, self.resync_interval)
+
+    async def stop(self) -> None:
+        """Останавливает диспетчер"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await db.remove_listener(SCHEDULE_CHANNEL, self._on_notify)
+        except Exception as e:
+            logger.warning("Failed to UNLISTEN %s: %s", SCHEDULE_CHANNEL, e)
+        logger.info("Post dispatcher stopped")
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        """Обработчик NOTIFY: помечает пост для перечитывания и будит цикл"""
+        self.notify_count += 1
+        try:
+            self._pending.add(int(payload))
+        except (TypeError, ValueError):
+            logger.warning("Unexpected %s payload: %r", channel, payload)
+            self._last_resync = None
+        self._wakeup.set()
+
+    def _push(self, post_id: int, scheduled_at: datetime) -> None:
+        self._due_at[post_id] = scheduled_at
+        self._warmed.discard(post_id)
+        heapq.heappush(self._heap, (scheduled_at, post_id))
+
+    def _peek(self) -> Optional[datetime]:
+        """Ближайшее актуальное время публикации"""
+        while self._heap:
+            scheduled_at, post_id = self._heap[0]
+            if self._due_at.get(post_id) == scheduled_at:
+                return scheduled_at
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        """Извлекает все посты, время которых наступило"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            scheduled_at, post_id = heapq.heappop(self._heap)
+            if self._due_at.get(post_id) == scheduled_at:
+                del self._due_at[post_id]
+                self._warmed.discard(post_id)
+                due.append(post_id)
+        return due
+
+    async def _resync(self) -> None:
+        """Полностью перечитывает ближайшие посты из БД"""
+        query = """
+            SELECT id, COALESCE(next_attempt_at, scheduled_at) AS due_at
+            FROM posts
+            WHERE status = 'scheduled'
+            AND COALESCE(next_attempt_at, scheduled_at) <= NOW() + make_interval(secs => $1)
+            -- То же окно, что в PostService.claim_due_posts
+            AND (scheduled_at > NOW() - INTERVAL '1 hour' OR next_attempt_at IS NOT NULL)
+        """
+        rows = await db.fetch_all(query, self.horizon.total_seconds())
+        self._heap = []
+        self._due_at = {}
+        self._warmed = set()
+        for row in rows:
+            self._push(row['id'], row['due_at'])
+        self._pending.clear()
+        self._last_resync = datetime.now(timezone.utc)
+        logger.debug("📋 Dispatcher resync: %s upcoming posts", len(rows))
+
+    async def _refresh_pending(self) -> None:
+        """Перечитывает посты, о которых пришли уведомления"""
+        post_ids = list(self._pending)
+        self._pending.clear()
+        rows = await db.fetch_all(
+            """
+            SELECT id, status, COALESCE(next_attempt_at, scheduled_at) AS due_at
+            FROM posts WHERE id = ANY($1::bigint[])
+            """,
+            post_ids
+        )
+        found = {row['id']: row for row in rows}
+        limit = datetime.now(timezone.utc) + self.horizon
+        for post_id in post_ids:
+            row = found.get(post_id)
+            if row and row['status'] == 'scheduled' and row['due_at'] and row['due_at'] <= limit:
+                self._push(post_id, row['due_at'])
+            else:
+                self._due_at.pop(post_id, None)
+                self._warmed.discard(post_id)
+
+    async def _warm_upcoming(self, now: datetime) -> Optional[datetime]:
+        """Готовит посты, до публикации которых осталось меньше lookahead
+        
+        Возвращает момент, когда понадобится подготовить следующий пост.
+        """
+        warm_until = now + self.lookahead
+        to_warm = [
+            post_id for post_id, due_at in self._due_at.items()
+            if due_at <= warm_until and post_id not in self._warmed
+        ]
+        if to_warm:
+            try:
+                await post_service.warm_payloads(to_warm)
+            except Exception as e:
+                # Не критично: при публикации данные будут загружены из БД
+                logger.warning("Failed to warm post payloads %s: %s", to_warm, e)
+            self._warmed.update(to_warm)
+        
+        later = [due_at for post_id, due_at in self._due_at.items() if post_id not in self._warmed]
+        return min(later) - self.lookahead if later else None
+    
+    async def _run(self) -> None:
+        """Основной цикл диспетчера"""
+        while True:
+            try:
+                now = datetime.now(timezone.utc)
+                if self._last_resync is None or now - self._last_resync >= self.resync_interval:
+                    await self._resync()
+                elif self._pending:
+                    await self._refresh_pending()
+
+                now = datetime.now(timezone.utc)
+                if self._pop_due(now):
+                    self.dispatch_count += 1
+                    await self._publish()
+                    continue
+
+                next_warm = await self._warm_upcoming(now)
+                next_due = self._peek()
+                timeout = (self._last_resync + self.resync_interval - now).total_seconds()
+                if next_due is not None:
+                    timeout = min(timeout, (next_due - now).total_seconds())
+                if next_warm is not None:
+                    timeout = min(timeout, (next_warm - now).total_seconds())
+
+                self._wakeup.clear()
+                if self._pending:
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error in post dispatcher loop: %s", e)
+                # Не крутимся в цикле при недоступной БД
+                self._last_resync = None
+                await asyncio.sleep(5)
+
+    def get_stats(self) -> dict:
+        """Состояние диспетчера и задержка публикаций"""
+        next_due = self._peek()
+        return {
+            "running": self.is_running,
+            "upcoming_posts": len(self._due_at),
+            "next_due_at": next_due.isoformat() if next_due else None,
+            "dispatch_count": self.dispatch_count,
+            "notify_count": self.notify_count,
+            "payload_cache": post_service.get_payload_cache_stats(),
+            "publish_lag_seconds": get_histogram('publish_lag_seconds').snapshot()
+        }
+
+# Глобальный экземпляр диспетчера
+post_dispatcher = PostDispatcher(
+    horizon_minutes=config.DISPATCHER_HORIZON_MINUTES,
+    resync_seconds=config.DISPATCHER_RESYNC_SECONDS,
+    lookahead_seconds=config.PRERENDER_LOOKAHEAD_SECONDS
+)
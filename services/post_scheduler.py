@@ -2,12 +2,11 @@
 Сервис для планирования публикации отложенных постов
 """
 import logging
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
-from apscheduler.jobstores.memory import MemoryJobStore
-from apscheduler.executors.asyncio import AsyncIOExecutor
 
 from services.post_service import post_service
+from services.post_dispatcher import post_dispatcher
+from services.backlog_drainer import backlog_drainer
+from services.publish_engine import publish_engine
 from database import db
 
 logger = logging.getLogger(__name__)
@@ -16,11 +15,9 @@ class PostScheduler:
     """Планировщик для публикации отложенных постов"""
     
     def __init__(self):
-        self.scheduler = AsyncIOScheduler(
-            jobstores={'default': MemoryJobStore()},
-            executors={'default': AsyncIOExecutor()},
-            job_defaults={'coalesce': False, 'max_instances': 1}
-        )
+        self.dispatcher = post_dispatcher
+        self.drainer = backlog_drainer
+        self.engine = publish_engine
         self.bot = None
         self.is_running = False
     
@@ -40,18 +37,13 @@ class PostScheduler:
                 logger.error("Bot instance not set for post scheduler")
                 return
             
-            # Добавляем задачу проверки отложенных постов каждую минуту
-            self.scheduler.add_job(
-                self._check_and_publish_posts,
-                trigger=IntervalTrigger(minutes=1),
-                id='publish_scheduled_posts',
-                name='Publish Scheduled Posts',
-                replace_existing=True
-            )
-            
-            self.scheduler.start()
+            self.engine.start()
+            # Диспетчер спит до ближайшего scheduled_at и просыпается по NOTIFY
+            await self.dispatcher.start(self._check_and_publish_posts)
+            # Посты, просроченные за время простоя, публикуются в фоне
+            self.drainer.start()
             self.is_running = True
-            logger.info("✅ Post scheduler started - checking every minute")
+            logger.info("✅ Post scheduler started - event-driven dispatch")
             
         except Exception as e:
             logger.error(f"Failed to start post scheduler: {e}")
@@ -60,8 +52,9 @@ class PostScheduler:
     async def stop_scheduler(self):
         """Останавливает планировщик"""
         try:
-            if self.scheduler.running:
-                self.scheduler.shutdown()
+            await self.dispatcher.stop()
+            await self.drainer.stop()
+            await self.engine.stop()
             self.is_running = False
             logger.info("Post scheduler stopped")
         except Exception as e:
@@ -116,7 +109,10 @@ class PostScheduler:
                 "status_stats": status_stats,
                 "upcoming_posts": upcoming_count,
                 "scheduler_running": self.is_running,
-                "bot_available": self.bot is not None
+                "bot_available": self.bot is not None,
+                "dispatcher": self.dispatcher.get_stats(),
+                "catchup": self.drainer.get_stats(),
+                "engine": self.engine.get_stats()
             }
         except Exception as e:
             logger.error(f"Failed to get scheduler stats: {e}")
@@ -125,11 +121,15 @@ class PostScheduler:
     async def get_scheduler_status(self) -> dict:
         """Получает статус планировщика"""
         try:
-            jobs = self.scheduler.get_jobs()
+            dispatcher_stats = self.dispatcher.get_stats()
             return {
-                "running": self.scheduler.running,
+                "running": dispatcher_stats["running"],
                 "is_running": self.is_running,
-                "jobs_count": len(jobs),
+                "upcoming_posts": dispatcher_stats["upcoming_posts"],
+                "next_due_at": dispatcher_stats["next_due_at"],
+                "publish_lag_seconds": dispatcher_stats["publish_lag_seconds"],
+                "catchup": self.drainer.get_stats(),
+                "engine": self.engine.get_stats(),
                 "bot_available": self.bot is not None
             }
         except Exception as e:
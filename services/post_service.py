@@ -1,23 +1,151 @@
 # Service: posts
 
-from typing import List, Optional, Dict, Any
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+import asyncio
 from datetime import datetime, timezone
+import json
+import time
 from utils.timezone_utils import to_utc
 import logging
 
 from database import db
+from services.channel_registry import channel_registry
+from services.cache_bus import POSTS, SERIES, USER_POSTS, cache_bus
 from config import config
+from utils.cache import TTLCache
+from utils.metrics import get_histogram, increment
 
 logger = logging.getLogger(__name__)
 
+# Канал LISTEN/NOTIFY, в который сообщается об изменении расписания постов
+SCHEDULE_CHANNEL = 'post_schedule'
+
+def _affected_rows(status: str) -> int:
+    """Число строк из статуса команды asyncpg execute ('UPDATE 3' -> 3)"""
+    try:
+        return int(status.split()[-1])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+# Подготовленные к отправке данные постов, которые скоро публикуются:
+# entities, медиа и post_data собираются заранее, а не в момент отправки
+_payload_cache = TTLCache(
+    maxsize=config.PRERENDER_CACHE_SIZE,
+    ttl=config.PRERENDER_LOOKAHEAD_SECONDS + config.PUBLISH_LEASE_SECONDS,
+    name='post_payloads'
+)
+
+# Количество постов пользователя для «стр. N из M»: считается не чаще раза в минуту
+_post_count_cache = TTLCache(maxsize=1024, ttl=60, name='user_post_counts')
+
+# Горячие запросы: подготавливаются один раз на каждом подключении пула
+db.register_query('get_post', """
+    SELECT p.*, c.title as channel_title, s.title as series_title
+    FROM posts p
+    LEFT JOIN channels c ON p.channel_id = c.id
+    LEFT JOIN series s ON p.series_id = s.id
+    WHERE p.id = $1
+""")
+db.register_query('get_user_posts', """
+    SELECT p.*, c.title as channel_title, s.title as series_title, s.next_number
+    FROM posts p
+    LEFT JOIN channels c ON p.channel_id = c.id
+    LEFT JOIN series s ON p.series_id = s.id
+    WHERE p.user_id = $1
+    ORDER BY p.created_at DESC
+    LIMIT $2 OFFSET $3
+""")
+# Страницы «Мои посты» по ключу (created_at, id), новые сверху; индекс idx_posts_user_created.
+# Стоимость страницы не зависит от того, сколько постов у пользователя и какая это страница
+_USER_POSTS_PAGE = """
+    SELECT p.*, c.title as channel_title, s.title as series_title, s.next_number
+    FROM posts p
+    LEFT JOIN channels c ON p.channel_id = c.id
+    LEFT JOIN series s ON p.series_id = s.id
+    WHERE p.user_id = $1 {condition}
+    ORDER BY p.created_at {order}, p.id {order}
+    LIMIT ${limit}
+"""
+db.register_query('user_posts_first', _USER_POSTS_PAGE.format(condition='', order='DESC', limit=2))
+db.register_query('user_posts_after', _USER_POSTS_PAGE.format(
+    condition='AND (p.created_at, p.id) < ($2, $3)', order='DESC', limit=4))
+db.register_query('user_posts_before', _USER_POSTS_PAGE.format(
+    condition='AND (p.created_at, p.id) > ($2, $3)', order='ASC', limit=4))
+db.register_query('count_user_posts', "SELECT COUNT(*) FROM posts WHERE user_id = $1")
+# Использует индекс idx_posts_scheduled_status_time
+db.register_query('get_scheduled_posts', """
+    SELECT p.*, c.tg_channel_id, c.title as channel_title
+    FROM posts p
+    JOIN channels c ON p.channel_id = c.id
+    WHERE p.status = 'scheduled' 
+    AND p.scheduled_at <= NOW()
+    AND p.scheduled_at > NOW() - INTERVAL '1 hour'  -- Только посты за последний час
+    ORDER BY p.scheduled_at ASC
+    LIMIT 100  -- Ограничиваем количество постов за раз
+""")
+
+# Создание поста одним запросом: поиск канала, INSERT поста с уже посчитанным
+# tags_cache, привязка тегов через unnest и увеличение номера серии.
+# Если канал не найден, не вставляется ничего и запрос возвращает пустой результат
+CREATE_POST_QUERY = """
+    WITH channel AS (
+        SELECT id FROM channels WHERE tg_channel_id = $1
+    ),
+    post_tag_ids AS (
+        SELECT DISTINCT unnest($12::bigint[]) AS tag_id
+    ),
+    series_number AS (
+        UPDATE series SET next_number = next_number + 1
+        WHERE id = $10 AND EXISTS (SELECT 1 FROM channel)
+        RETURNING next_number
+    ),
+    new_post AS (
+        INSERT INTO posts (channel_id, user_id, title, body_md, entities, media_type, media_file_id,
+                           media_data, status, series_id, scheduled_at, tags_cache, created_at, updated_at)
+        SELECT channel.id, $2::bigint, $3::text, $4::text, $5::jsonb, $6::text, $7::text,
+               $8::jsonb, $9::post_status, $10::bigint, $11::timestamptz,
+               NULLIF(ARRAY(
+                   SELECT t.name FROM tags t
+                   WHERE t.id IN (SELECT tag_id FROM post_tag_ids)
+                   ORDER BY t.name ASC
+               ), '{}'),
+               NOW(), NOW()
+        FROM channel
+        RETURNING id, channel_id
+    ),
+    inserted_tags AS (
+        INSERT INTO post_tags (post_id, tag_id)
+        SELECT new_post.id, post_tag_ids.tag_id FROM new_post, post_tag_ids
+        ON CONFLICT (post_id, tag_id) DO NOTHING
+    )
+    SELECT id, channel_id, (SELECT next_number FROM series_number) AS series_number
+    FROM new_post
+"""
+
 class PostService:
     """Сервис для работы с постами"""
     
+    async def _notify_schedule_changed(self, post_id: int) -> None:
+        """Будит диспетчер публикаций после изменения расписания поста"""
+        try:
+            await db.notify(SCHEDULE_CHANNEL, str(post_id))
+        except Exception as e:
+            # Диспетчер все равно подхватит пост при периодической сверке
+            logger.warning("Failed to notify schedule change for post %s: %s", post_id, e)
+    
+    @staticmethod
+    def _media_summary(media_data) -> str:
+        """Краткое описание медиа для логов"""
+        if not media_data:
+            return 'Нет'
+        if isinstance(media_data, list):
+            return f"альбом из {len(media_data)}"
+        return media_data.get('type')
+    
     async def get_channel_id_by_tg_id(self, tg_channel_id: int) -> Optional[int]:
         """Получает ID канала по Telegram channel ID"""
         try:
-            query = "SELECT id FROM channels WHERE tg_channel_id = $1"
-            return await db.fetch_val(query, tg_channel_id)
+            return await channel_registry.get_id(tg_channel_id)
         except Exception as e:
             logger.error("Failed to get channel ID for tg_channel_id %s: %s", tg_channel_id, e)
             return None
@@ -25,7 +153,8 @@ class PostService:
     async def create_post(self, tg_channel_id: int, title: Optional[str], 
                          body_md: str, user_id: int, series_id: Optional[int] = None,
                          scheduled_at: Optional[datetime] = None, tag_ids: Optional[List[int]] = None,
-                         entities: Optional[List] = None, media_data: Optional[dict] = None) -> int:
+                         entities: Optional[List] = None,
+                         media_data: Optional[Union[dict, List[dict]]] = None) -> int:
         """Создает новый пост"""
         logger.info("=== НАЧАЛО СОЗДАНИЯ ПОСТА В БД ===")
         logger.info(f"📢 TG Channel ID: {tg_channel_id}")
@@ -36,17 +165,9 @@ class PostService:
         logger.info(f"⏰ Scheduled at: {scheduled_at}")
         logger.info(f"🏷️ Tag IDs: {tag_ids}")
         logger.info(f"🎨 Entities: {len(entities) if entities else 0}")
-        logger.info(f"📷 Медиа: {media_data['type'] if media_data else 'Нет'}")
+        logger.info(f"📷 Медиа: {self._media_summary(media_data)}")
         
         try:
-            # Получаем ID канала из базы
-            logger.info("🔍 Ищем ID канала в базе данных")
-            channel_id = await self.get_channel_id_by_tg_id(tg_channel_id)
-            if not channel_id:
-                logger.error(f"❌ Канал с tg_channel_id {tg_channel_id} не найден")
-                raise ValueError(f"Channel with tg_channel_id {tg_channel_id} not found")
-            logger.info(f"✅ Найден channel_id: {channel_id}")
-            
             # Определяем статус
             status = 'scheduled' if scheduled_at else 'draft'
             logger.info(f"📊 Статус поста: {status}")
@@ -73,8 +194,10 @@ class PostService:
             media_file_id = None
             media_data_json = None
             if media_data:
-                media_type = media_data.get('type')
-                media_file_id = media_data.get('file_id')
+                # Список медиа публикуется альбомом; в колонках — первый элемент
+                first_media = media_data[0] if isinstance(media_data, list) else media_data
+                media_type = 'album' if isinstance(media_data, list) else first_media.get('type')
+                media_file_id = first_media.get('file_id')
                 # Сохраняем все данные медиа как JSON
                 import json
                 media_data_json = json.dumps(media_data, ensure_ascii=False)
@@ -82,37 +205,31 @@ class PostService:
             else:
                 logger.info("📷 Медиа не указано")
             
-            logger.info("💾 Выполняем INSERT в таблицу posts")
-            query = """
-                INSERT INTO posts (channel_id, user_id, title, body_md, entities, media_type, media_file_id, media_data, status, series_id, scheduled_at, created_at, updated_at)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, NOW(), NOW())
-                RETURNING id
-            """
-            post_id = await db.fetch_val(query, channel_id, user_id, title, body_md, entities_json, media_type, media_file_id, media_data_json, status, series_id, scheduled_at_utc)
-            logger.info(f"✅ Пост сохранен в БД с ID: {post_id}")
-            
-            # Добавляем теги если есть
-            if tag_ids:
-                logger.info(f"🏷️ Добавляем {len(tag_ids)} тегов к посту")
-                from services.tags import tag_service
-                for tag_id in tag_ids:
-                    logger.info(f"🏷️ Добавляем тег ID: {tag_id}")
-                    await tag_service.add_tag_to_post(post_id, tag_id)
+            # Пост, теги, кеш тегов и номер серии — одна транзакция и один запрос:
+            # при сбое не остается поста без тегов или серии с пропущенным номером
+            logger.info("💾 Создаем пост в одной транзакции (пост, теги, серия)")
+            async with db.transaction() as tx:
+                row = await tx.fetch_one(
+                    CREATE_POST_QUERY, tg_channel_id, user_id, title, body_md, entities_json,
+                    media_type, media_file_id, media_data_json, status, series_id,
+                    scheduled_at_utc, list(tag_ids or [])
+                )
+                if not row:
+                    logger.error(f"❌ Канал с tg_channel_id {tg_channel_id} не найден")
+                    raise ValueError(f"Channel with tg_channel_id {tg_channel_id} not found")
+                post_id, channel_id = row['id'], row['channel_id']
                 
-                # Обновляем кеш тегов
-                logger.info("🔄 Обновляем кеш тегов")
-                await tag_service.update_post_tags_cache(post_id)
-            else:
-                logger.info("🏷️ Теги не указаны")
+                if scheduled_at_utc:
+                    # Диспетчер получит NOTIFY только после COMMIT
+                    await tx.notify(SCHEDULE_CHANNEL, str(post_id))
             
-            # Если есть серия, увеличиваем номер
-            if series_id:
-                logger.info(f"📚 Увеличиваем номер серии: {series_id}")
-                from services.series import series_service
-                await series_service.increment_series_number(series_id)
-            else:
-                logger.info("📚 Серия не указана")
+            logger.info(f"✅ Пост сохранен в БД с ID: {post_id} (channel_id {channel_id}, "
+                        f"номер серии {row['series_number']}, запросов к БД: {tx.round_trips})")
             
+            await cache_bus.publish(USER_POSTS, user_id)
+            if series_id:
+                # next_number серии изменился — он показывается на кнопке выбора серии
+                await cache_bus.publish(SERIES, channel_id)
             logger.info("✅ ПОСТ УСПЕШНО СОЗДАН")
             logger.info("Post created: %s for channel %s by user %s (series: %s, tags: %s)", 
                        post_id, channel_id, user_id, series_id, tag_ids)
@@ -133,14 +250,7 @@ class PostService:
     async def get_post(self, post_id: int) -> Optional[Dict[str, Any]]:
         """Получает пост по ID"""
         try:
-            query = """
-                SELECT p.*, c.title as channel_title, s.title as series_title
-                FROM posts p
-                LEFT JOIN channels c ON p.channel_id = c.id
-                LEFT JOIN series s ON p.series_id = s.id
-                WHERE p.id = $1
-            """
-            result = await db.fetch_one(query, post_id)
+            result = await db.fetch_one_named('get_post', post_id)
             if not result:
                 return None
             
@@ -170,21 +280,70 @@ class PostService:
     async def get_user_posts(self, user_id: int, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
         """Получает посты пользователя"""
         try:
-            query = """
-                SELECT p.*, c.title as channel_title, s.title as series_title, s.next_number
-                FROM posts p
-                LEFT JOIN channels c ON p.channel_id = c.id
-                LEFT JOIN series s ON p.series_id = s.id
-                WHERE p.user_id = $1
-                ORDER BY p.created_at DESC
-                LIMIT $2 OFFSET $3
-            """
-            results = await db.fetch_all(query, user_id, limit, offset)
+            results = await db.fetch_all_named('get_user_posts', user_id, limit, offset, readonly=True)
             return [dict(row) for row in results]
         except Exception as e:
             logger.error("Failed to get posts for user %s: %s", user_id, e)
             raise
     
+    async def list_user_posts(self, user_id: int, cursor: Optional[Tuple[datetime, int]] = None,
+                              backward: bool = False, limit: int = 10) -> Dict[str, Any]:
+        """Одна страница постов пользователя (новые сверху) по ключу (created_at, id)
+        
+        cursor — (created_at, id) граничного поста текущей страницы: без backward
+        возвращаются посты старше него, с backward — новее (предыдущая страница).
+        has_more — есть ли еще посты дальше в направлении листания.
+        """
+        try:
+            # Одна лишняя строка показывает, есть ли следующая страница
+            if cursor is None:
+                rows = await db.fetch_all_named('user_posts_first', user_id, limit + 1, readonly=True)
+            else:
+                name = 'user_posts_before' if backward else 'user_posts_after'
+                rows = await db.fetch_all_named(name, user_id, cursor[0], cursor[1], limit + 1, readonly=True)
+            
+            posts = [dict(row) for row in rows[:limit]]
+            if backward:
+                posts.reverse()
+            return {'posts': posts, 'has_more': len(rows) > limit}
+        except Exception as e:
+            logger.error("Failed to list posts for user %s: %s", user_id, e)
+            raise
+    
+    async def list_posts_filtered(self, filters: Dict[str, Any], user_id: Optional[int] = None,
+                                  channel_id: Optional[int] = None,
+                                  cursor: Optional[Tuple[Any, ...]] = None,
+                                  limit: int = 10) -> Dict[str, Any]:
+        """Страница постов с фильтрами PostFilters (дата, статус, канал, сортировка)
+        
+        Фильтры и сортировка выполняются в SQL; next_cursor — курсор следующей
+        страницы (None, если она последняя).
+        """
+        from utils.post_filters import PostFilters
+        
+        post_filters = PostFilters()
+        try:
+            query, params = post_filters.build_query(filters, user_id, channel_id, cursor, limit + 1)
+            rows = await db.fetch_all(query, *params, readonly=True)
+            posts = [dict(row) for row in rows[:limit]]
+            has_more = len(rows) > limit
+            return {
+                'posts': posts,
+                'has_more': has_more,
+                'next_cursor': post_filters.cursor_from_post(posts[-1], filters) if has_more else None
+            }
+        except Exception as e:
+            logger.error("Failed to list filtered posts (%s): %s", filters, e)
+            raise
+    
+    async def count_user_posts(self, user_id: int) -> int:
+        """Количество постов пользователя (кешируется на минуту)"""
+        count = _post_count_cache.get(user_id)
+        if count is None:
+            count = await db.fetch_val_named('count_user_posts', user_id, readonly=True) or 0
+            _post_count_cache.set(user_id, count)
+        return count
+    
     async def update_post(self, post_id: int, title: Optional[str] = None,
                          body_md: Optional[str] = None, status: Optional[str] = None,
                          scheduled_at: Optional[datetime] = None) -> bool:
@@ -227,15 +386,23 @@ class PostService:
             """
             
             result = await db.execute(query, *params)
+            await cache_bus.publish(POSTS, post_id)
             logger.info("Post %s updated", post_id)
+            
+            if status is not None or scheduled_at is not None:
+                await self._notify_schedule_changed(post_id)
             return True
         except Exception as e:
             logger.error("Failed to update post %s: %s", post_id, e)
             raise
     
     async def get_posts_by_channel(self, channel_id: int, status: Optional[str] = None,
-                                  limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-        """Получает посты канала"""
+                                  limit: int = 50,
+                                  after: Optional[Tuple[datetime, int]] = None) -> List[Dict[str, Any]]:
+        """Получает посты канала, новые сверху
+        
+        after — (created_at, id) последнего поста предыдущей страницы
+        """
         try:
             where_clause = "WHERE p.channel_id = $1"
             params = [channel_id]
@@ -246,16 +413,21 @@ class PostService:
                 where_clause += f" AND p.status = ${param_count}"
                 params.append(status)
             
+            if after:
+                where_clause += f" AND (p.created_at, p.id) < (${param_count + 1}, ${param_count + 2})"
+                params.extend(after)
+                param_count += 2
+            
             query = f"""
                 SELECT p.*, c.title as channel_title, s.title as series_title
                 FROM posts p
                 LEFT JOIN channels c ON p.channel_id = c.id
                 LEFT JOIN series s ON p.series_id = s.id
                 {where_clause}
-                ORDER BY p.created_at DESC
-                LIMIT ${param_count + 1} OFFSET ${param_count + 2}
+                ORDER BY p.created_at DESC, p.id DESC
+                LIMIT ${param_count + 1}
             """
-            params.extend([limit, offset])
+            params.append(limit)
             
             results = await db.fetch_all(query, *params)
             return [dict(row) for row in results]
@@ -267,72 +439,349 @@ class PostService:
         """Получает посты для публикации (оптимизированная версия)"""
         try:
             # Оптимизированный запрос с точным фильтром по времени
-            # Использует индекс idx_posts_scheduled_status_time
-            query = """
-                SELECT p.*, c.tg_channel_id, c.title as channel_title
-                FROM posts p
-                JOIN channels c ON p.channel_id = c.id
-                WHERE p.status = 'scheduled' 
-                AND p.scheduled_at <= NOW()
-                AND p.scheduled_at > NOW() - INTERVAL '1 hour'  -- Только посты за последний час
-                ORDER BY p.scheduled_at ASC
-                LIMIT 100  -- Ограничиваем количество постов за раз
-            """
-            results = await db.fetch_all(query)
+            results = await db.fetch_all_named('get_scheduled_posts')
             posts = [dict(row) for row in results]
             
             logger.info(f"🔍 Найдено {len(posts)} постов для публикации (оптимизированный запрос)")
             
             # Восстанавливаем entities и медиа-данные для каждого поста
             for post in posts:
-                # Восстанавливаем entities из JSON
-                if post.get('entities'):
-                    from utils.entities import entities_from_json
-                    post['entities'] = entities_from_json(post['entities'])
-                
-                # Восстанавливаем медиа-данные из JSON
-                if post.get('media_data'):
-                    import json
-                    try:
-                        post['media_data'] = json.loads(post['media_data'])
-                    except json.JSONDecodeError as e:
-                        logger.error(f"❌ Ошибка парсинга медиа-данных для поста {post['id']}: {e}")
-                        post['media_data'] = None
+                self._restore_post_fields(post)
             
             return posts
         except Exception as e:
             logger.error("Failed to get scheduled posts: %s", e)
             raise
     
-    async def publish_post(self, post_id: int, message_id: int) -> bool:
-        """Помечает пост как опубликованный"""
+    def _restore_post_fields(self, post: Dict[str, Any]) -> None:
+        """Восстанавливает entities и медиа-данные поста из JSON"""
+        # Восстанавливаем entities из JSON
+        if post.get('entities'):
+            from utils.entities import entities_from_json
+            post['entities'] = entities_from_json(post['entities'])
+        
+        # Восстанавливаем медиа-данные из JSON
+        if post.get('media_data'):
+            import json
+            try:
+                post['media_data'] = json.loads(post['media_data'])
+            except json.JSONDecodeError as e:
+                logger.error(f"❌ Ошибка парсинга медиа-данных для поста {post['id']}: {e}")
+                post['media_data'] = None
+    
+    def _build_payload(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        """Готовит данные для отправки поста (вызывается заранее, не в момент публикации)"""
+        self._restore_post_fields(post)
+        return {
+            'version': post['updated_at'],
+            'body_md': post['body_md'],
+            'chat_ids': [post['tg_channel_id']],
+            'post_data': {
+                'id': post['id'],
+                'body_md': post['body_md'],
+                'entities': post.get('entities'),
+                'media_data': post.get('media_data')
+            }
+        }
+    
+    async def _load_payloads(self, post_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Загружает посты одним запросом, готовит и кладет в кеш"""
+        query = """
+            SELECT p.*, c.tg_channel_id
+            FROM posts p
+            JOIN channels c ON p.channel_id = c.id
+            WHERE p.id = ANY($1::bigint[])
+        """
+        payloads = {}
+        for row in await db.fetch_all(query, post_ids):
+            payload = self._build_payload(dict(row))
+            _payload_cache.set(row['id'], payload)
+            payloads[row['id']] = payload
+        return payloads
+    
+    async def warm_payloads(self, post_ids: List[int]) -> int:
+        """Заранее готовит данные для отправки постов, которых еще нет в кеше"""
+        missing = [post_id for post_id in post_ids if post_id not in _payload_cache]
+        if not missing:
+            return 0
+        payloads = await self._load_payloads(missing)
+        increment('payload_cache_warmed', len(payloads))
+        logger.debug("🔥 Подготовлено %s постов к публикации", len(payloads))
+        return len(payloads)
+    
+    async def _attach_payloads(self, posts: List[Dict[str, Any]]) -> None:
+        """Добавляет к захваченным постам готовые данные для отправки
+        
+        Запись кеша используется, только если updated_at поста не изменился;
+        недостающие посты догружаются одним запросом.
+        """
+        payloads = {}
+        missing = []
+        for post in posts:
+            payload = _payload_cache.get(post['id'])
+            if payload is not None and payload['version'] == post['updated_at']:
+                payloads[post['id']] = payload
+            else:
+                missing.append(post['id'])
+        if missing:
+            payloads.update(await self._load_payloads(missing))
+        
+        for post in posts:
+            payload = payloads.get(post['id'])
+            if payload:
+                post['body_md'] = payload['body_md']
+                post['chat_ids'] = payload['chat_ids']
+                post['post_data'] = payload['post_data']
+    
+    def invalidate_payload(self, post_id: int) -> None:
+        """Сбрасывает подготовленные данные поста (после редактирования или отмены)"""
+        _payload_cache.invalidate(post_id)
+    
+    def get_payload_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кеша подготовленных постов"""
+        return _payload_cache.get_stats()
+    
+    async def claim_due_posts(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Захватывает пачку готовых к публикации постов для этой реплики
+        
+        Строки блокируются через FOR UPDATE SKIP LOCKED, поэтому параллельные
+        реплики получают непересекающиеся пачки. Захват действует до
+        claimed_until: если реплика упала, пост снова станет доступен.
+        """
         try:
-            logger.info(f"🔄 Обновляем статус поста {post_id} на 'published' с message_id {message_id}")
-            
             query = """
-                UPDATE posts 
-                SET status = 'published', 
-                    published_at = NOW(),
-                    message_id = $2,
-                    updated_at = NOW()
-                WHERE id = $1
+                WITH due AS (
+                    SELECT id
+                    FROM posts
+                    WHERE status = 'scheduled'
+                    AND COALESCE(next_attempt_at, scheduled_at) <= NOW()
+                    -- То же окно, что в get_scheduled_posts; запланированные повторы не отбрасываются
+                    AND (scheduled_at > NOW() - INTERVAL '1 hour' OR next_attempt_at IS NOT NULL)
+                    AND (claimed_until IS NULL OR claimed_until < NOW())
+                    ORDER BY COALESCE(next_attempt_at, scheduled_at) ASC
+                    LIMIT $2
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE posts p
+                SET claimed_by = $1,
+                    claimed_until = NOW() + make_interval(secs => $3)
+                FROM due, channels c
+                WHERE p.id = due.id AND c.id = p.channel_id
+                RETURNING p.id, p.scheduled_at, p.updated_at, p.publish_attempts,
+                          p.channel_message_ids, c.tg_channel_id, c.title as channel_title
             """
+            results = await db.fetch_all(
+                query,
+                config.INSTANCE_ID,
+                limit or config.PUBLISH_CLAIM_BATCH,
+                float(config.PUBLISH_LEASE_SECONDS)
+            )
+            # RETURNING не сохраняет порядок CTE
+            posts = sorted((dict(row) for row in results), key=lambda post: (post['scheduled_at'], post['id']))
+            await self._attach_payloads(posts)
             
-            result = await db.execute(query, post_id, message_id)
-            logger.info(f"✅ SQL UPDATE выполнен: {result}")
-            
-            # Проверяем, что пост действительно обновился
-            updated_post = await db.fetch_one("""
-                SELECT id, status, published_at, message_id 
-                FROM posts 
-                WHERE id = $1
-            """, post_id)
-            
-            if updated_post:
-                logger.info(f"✅ Подтверждение обновления: ID={updated_post['id']}, status={updated_post['status']}, published_at={updated_post['published_at']}, message_id={updated_post['message_id']}")
-            else:
-                logger.error(f"❌ Пост {post_id} не найден после обновления!")
-            
+            if posts:
+                logger.info(f"🔒 Захвачено {len(posts)} постов для публикации ({config.INSTANCE_ID})")
+            return posts
+        except Exception as e:
+            logger.error("Failed to claim due posts: %s", e)
+            raise
+    
+    async def claim_overdue_posts(self, after: Optional[Tuple[datetime, int]] = None,
+                                  limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Захватывает следующую страницу просроченных постов (догоняющая публикация)
+        
+        Keyset-пагинация по (scheduled_at, id): after — ключ последнего поста
+        предыдущей страницы. Берутся все просроченные посты моложе 24 часов
+        (старше них помечает failed _mark_failed_posts), включая вышедшие
+        из часового окна claim_due_posts. Посты в очереди повторов
+        (next_attempt_at) обрабатываются обычным путем.
+        """
+        after_scheduled_at, after_id = after or (datetime.min.replace(tzinfo=timezone.utc), 0)
+        try:
+            query = """
+                WITH page AS (
+                    SELECT id
+                    FROM posts
+                    WHERE status = 'scheduled'
+                    AND next_attempt_at IS NULL
+                    AND scheduled_at <= NOW()
+                    AND scheduled_at > NOW() - INTERVAL '24 hours'
+                    AND (scheduled_at, id) > ($2, $3)
+                    AND (claimed_until IS NULL OR claimed_until < NOW())
+                    ORDER BY scheduled_at, id
+                    LIMIT $4
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE posts p
+                SET claimed_by = $1,
+                    claimed_until = NOW() + make_interval(secs => $5)
+                FROM page, channels c
+                WHERE p.id = page.id AND c.id = p.channel_id
+                RETURNING p.id, p.scheduled_at, p.updated_at, p.publish_attempts,
+                          p.channel_message_ids, c.tg_channel_id, c.title as channel_title
+            """
+            results = await db.fetch_all(
+                query,
+                config.INSTANCE_ID,
+                after_scheduled_at,
+                after_id,
+                limit or config.CATCHUP_PAGE_SIZE,
+                float(config.PUBLISH_LEASE_SECONDS)
+            )
+            posts = sorted((dict(row) for row in results), key=lambda post: (post['scheduled_at'], post['id']))
+            await self._attach_payloads(posts)
+            return posts
+        except Exception as e:
+            logger.error("Failed to claim overdue posts: %s", e)
+            raise
+    
+    async def renew_claims(self, post_ids: List[int]) -> Set[int]:
+        """Продлевает аренду постов этой реплики; возвращает ID, которые все еще за ней"""
+        if not post_ids:
+            return set()
+        rows = await db.fetch_all(
+            """
+                UPDATE posts
+                SET claimed_until = NOW() + make_interval(secs => $3)
+                WHERE id = ANY($1::bigint[])
+                AND claimed_by = $2
+                AND status = 'scheduled'
+                RETURNING id
+            """,
+            post_ids,
+            config.INSTANCE_ID,
+            float(config.PUBLISH_LEASE_SECONDS)
+        )
+        return {row['id'] for row in rows}
+    
+    async def _renew_claims_loop(self, pending: Set[int], lost: Set[int]) -> None:
+        """Продлевает аренду еще не опубликованных постов каждую треть PUBLISH_LEASE_SECONDS
+        
+        Пачка одного канала под лимитом 20 сообщений в минуту может
+        публиковаться дольше аренды. Посты, аренду которых уже забрала
+        другая реплика, попадают в lost и не отправляются.
+        """
+        interval = config.PUBLISH_LEASE_SECONDS / 3
+        while pending:
+            await asyncio.sleep(interval)
+            post_ids = list(pending)
+            try:
+                held = await self.renew_claims(post_ids)
+            except Exception as e:
+                logger.warning("Failed to renew publish claims for %s posts: %s", len(post_ids), e)
+                continue
+            taken = set(post_ids) - held
+            if taken:
+                increment('publish_claims_lost', len(taken))
+                logger.warning("⚠️ Аренда постов %s перешла к другой реплике, они пропускаются", sorted(taken))
+                lost.update(taken)
+    
+    async def count_overdue_posts(self) -> int:
+        """Количество просроченных постов для догоняющей публикации"""
+        query = """
+            SELECT COUNT(*)
+            FROM posts
+            WHERE status = 'scheduled'
+            AND next_attempt_at IS NULL
+            AND scheduled_at <= NOW()
+            AND scheduled_at > NOW() - INTERVAL '24 hours'
+        """
+        return await db.fetch_val(query) or 0
+    
+    async def write_publish_results(self, outcomes: List[Dict[str, Any]], claimed: bool = True) -> int:
+        """Записывает итоги публикации пачки постов одним запросом
+        
+        Каждый элемент outcomes: post_id, message_id (None, если публикация
+        не удалась) и published_at. Для неудачных попыток дополнительно
+        error и retry_delay (секунды до повтора; None — попытки исчерпаны).
+        Опубликованные посты получают статус published, исчерпавшие
+        попытки — failed, остальные остаются scheduled до next_attempt_at.
+        claimed=True — посты захвачены этой репликой: итог не записывается,
+        если аренду уже забрала другая реплика. Возвращает число записанных постов.
+        """
+        if not outcomes:
+            return 0
+        
+        query = """
+            UPDATE posts p
+            SET status = CASE
+                    WHEN r.message_id IS NOT NULL THEN 'published'::post_status
+                    WHEN r.error IS NOT NULL AND r.retry_delay IS NULL THEN 'failed'::post_status
+                    ELSE p.status
+                END,
+                message_id = COALESCE(r.message_id, p.message_id),
+                -- Части альбома из неудачной попытки дополняют уже сохраненные ID
+                channel_message_ids = CASE
+                    WHEN r.channel_message_ids IS NULL THEN p.channel_message_ids
+                    ELSE COALESCE(p.channel_message_ids, '{}'::jsonb) || r.channel_message_ids
+                END,
+                published_at = COALESCE(r.published_at, p.published_at),
+                -- Считаются только неудачные попытки: от них зависит задержка повтора
+                publish_attempts = p.publish_attempts + CASE WHEN r.message_id IS NULL THEN 1 ELSE 0 END,
+                last_error = COALESCE(r.error, p.last_error),
+                next_attempt_at = CASE
+                    WHEN r.message_id IS NULL AND r.retry_delay IS NOT NULL
+                    THEN NOW() + make_interval(secs => r.retry_delay)
+                END,
+                claimed_by = NULL,
+                claimed_until = NULL,
+                updated_at = NOW()
+            FROM unnest($1::bigint[], $2::bigint[], $3::timestamptz[], $4::text[], $5::float8[], $6::jsonb[])
+                AS r(id, message_id, published_at, error, retry_delay, channel_message_ids)
+            WHERE p.id = r.id
+            AND ($7::text IS NULL OR p.claimed_by = $7)
+            RETURNING p.id
+        """
+        started = time.perf_counter()
+        rows = await db.fetch_all(
+            query,
+            [outcome['post_id'] for outcome in outcomes],
+            [outcome.get('message_id') for outcome in outcomes],
+            [outcome.get('published_at') if outcome.get('message_id') else None for outcome in outcomes],
+            [None if outcome.get('message_id') else outcome.get('error', 'unknown error') for outcome in outcomes],
+            [None if outcome.get('message_id') else outcome.get('retry_delay') for outcome in outcomes],
+            [
+                json.dumps(outcome['channel_message_ids']) if outcome.get('channel_message_ids') else None
+                for outcome in outcomes
+            ],
+            config.INSTANCE_ID if claimed else None
+        )
+        get_histogram('publish_writeback_seconds').observe(time.perf_counter() - started)
+        get_histogram('publish_writeback_batch_size').observe(len(outcomes))
+        for outcome in outcomes:
+            self.invalidate_payload(outcome['post_id'])
+        written = {row['id'] for row in rows}
+        logger.info("💾 Записаны итоги публикации %s постов", len(written))
+        skipped = [outcome['post_id'] for outcome in outcomes if outcome['post_id'] not in written]
+        if skipped:
+            increment('publish_writeback_skipped', len(skipped))
+            logger.warning("⚠️ Итоги постов %s не записаны: аренда перешла к другой реплике", skipped)
+        
+        # Диспетчер должен узнать новое время повторных попыток
+        retry_ids = [
+            outcome['post_id'] for outcome in outcomes
+            if outcome['post_id'] in written
+            and not outcome.get('message_id') and outcome.get('retry_delay') is not None
+        ]
+        if retry_ids:
+            try:
+                await db.execute(
+                    "SELECT pg_notify($1, id::text) FROM unnest($2::bigint[]) AS id",
+                    SCHEDULE_CHANNEL, retry_ids
+                )
+            except Exception as e:
+                logger.warning("Failed to notify retry schedule for posts %s: %s", retry_ids, e)
+        return len(written)
+    
+    async def publish_post(self, post_id: int, message_id: int) -> bool:
+        """Помечает пост как опубликованный"""
+        try:
+            await self.write_publish_results([{
+                'post_id': post_id,
+                'message_id': message_id,
+                'published_at': datetime.now(timezone.utc)
+            }], claimed=False)
             logger.info("Post %s published with message_id %s", post_id, message_id)
             return True
         except Exception as e:
@@ -344,54 +793,28 @@ class PostService:
         logger.info("=== НАЧАЛО ПУБЛИКАЦИИ ОТЛОЖЕННЫХ ПОСТОВ ===")
         
         try:
-            # Получаем посты для публикации
-            scheduled_posts = await self.get_scheduled_posts()
-            logger.info(f"📋 Найдено {len(scheduled_posts)} постов для публикации")
-            
-            if not scheduled_posts:
-                logger.info("📭 Нет постов для публикации")
-                return 0
-            
             published_count = 0
+            total_count = 0
             failed_posts = []
             
-            for post in scheduled_posts:
-                try:
-                    logger.info(f"📤 Публикуем пост ID {post['id']}: '{post['body_md'][:50]}...'")
-                    
-                    # Используем PostPublisher для публикации
-                    from services.publisher import get_publisher
-                    publisher = get_publisher()
-                    
-                    post_data = {
-                        'id': post['id'],
-                        'body_md': post['body_md'],
-                        'entities': post.get('entities'),  # Если есть entities
-                        'media_data': post.get('media_data')  # Если есть медиа
-                    }
-                    
-                    results = await publisher.publish_post(
-                        post_data, 
-                        [post['tg_channel_id']], 
-                        update_db=True
-                    )
-                    
-                    if results['success_count'] > 0:
-                        published_count += 1
-                        logger.info(f"✅ Пост {post['id']} успешно опубликован в канал {post['tg_channel_id']}")
-                    else:
-                        logger.error(f"❌ Не удалось опубликовать пост {post['id']}")
-                        failed_posts.append(post['id'])
-                    
-                except Exception as e:
-                    logger.error(f"❌ Ошибка публикации поста {post['id']}: {e}")
-                    failed_posts.append(post['id'])
-                    continue
+            # Захватываем пачки, пока есть готовые посты; другие реплики
+            # в это же время получают свои, непересекающиеся пачки
+            while True:
+                scheduled_posts = await self.claim_due_posts()
+                if not scheduled_posts:
+                    break
+                total_count += len(scheduled_posts)
+                batch_published, batch_failed = await self.publish_claimed_posts(scheduled_posts)
+                published_count += batch_published
+                failed_posts.extend(batch_failed)
+            
+            if not total_count:
+                logger.info("📭 Нет постов для публикации")
             
             # Помечаем неудачные посты (старше 24 часов)
             await self._mark_failed_posts()
             
-            logger.info(f"✅ ПУБЛИКАЦИЯ ЗАВЕРШЕНА: {published_count}/{len(scheduled_posts)} постов")
+            logger.info(f"✅ ПУБЛИКАЦИЯ ЗАВЕРШЕНА: {published_count}/{total_count} постов")
             if failed_posts:
                 logger.warning(f"⚠️ Не удалось опубликовать посты: {failed_posts}")
             
@@ -401,6 +824,144 @@ class PostService:
             logger.error(f"❌ Ошибка публикации отложенных постов: {e}")
             raise
     
+    async def publish_claimed_posts(
+        self,
+        posts: List[Dict[str, Any]],
+        throttle: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Tuple[int, List[int]]:
+        """Публикует захваченные посты и записывает итоги одним запросом
+        
+        Посты раздаются воркерам publish_engine по хешу канала: каналы
+        публикуются независимо, порядок внутри канала сохраняется.
+        throttle, если задан, вызывается перед каждой отправкой (ограничение
+        скорости при догоняющей публикации). Возвращает количество
+        опубликованных постов и ID неудачных.
+        """
+        from services.publisher import get_publisher
+        from services.publish_engine import publish_engine
+        publisher = get_publisher()
+        
+        # Аренда продлевается, пока в пачке есть неопубликованные посты
+        pending = {post['id'] for post in posts}
+        lost: Set[int] = set()
+        renewer = asyncio.create_task(self._renew_claims_loop(pending, lost))
+        
+        async def publish_one(post: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                if throttle and post['id'] not in lost:
+                    await throttle()
+                if post['id'] in lost:
+                    return {'post_id': post['id'], 'lost': True}
+                return await self._publish_claimed_post(publisher, post)
+            finally:
+                pending.discard(post['id'])
+        
+        try:
+            # Итоги пачки копятся и пишутся в БД одним запросом
+            outcomes = await publish_engine.run(posts, publish_one)
+        finally:
+            renewer.cancel()
+            try:
+                await renewer
+            except asyncio.CancelledError:
+                pass
+        outcomes = [outcome for outcome in outcomes if not outcome.get('lost')]
+        await self.write_publish_results(outcomes)
+        
+        failed_ids = [outcome['post_id'] for outcome in outcomes if not outcome.get('message_id')]
+        return len(outcomes) - len(failed_ids), failed_ids
+    
+    async def _publish_claimed_post(self, publisher, post: Dict[str, Any]) -> Dict[str, Any]:
+        """Публикует один захваченный пост и возвращает итог для write_publish_results
+        
+        Неудачный пост не ждет повтора здесь: попытка переносится на
+        next_attempt_at, и остальные посты продолжают публиковаться.
+        """
+        try:
+            logger.info(f"📤 Публикуем пост ID {post['id']}: '{post['body_md'][:50]}...'")
+            
+            # Обычно данные подготовлены заранее (_attach_payloads)
+            post_data = post.get('post_data') or {
+                'id': post['id'],
+                'body_md': post['body_md'],
+                'entities': post.get('entities'),  # Если есть entities
+                'media_data': post.get('media_data')  # Если есть медиа
+            }
+            
+            # Альбом, отправленный прошлой попыткой частично, продолжается с первой неотправленной части
+            sent_message_ids = post.get('channel_message_ids')
+            if isinstance(sent_message_ids, str):
+                sent_message_ids = json.loads(sent_message_ids)
+            if sent_message_ids:
+                post_data = {**post_data, 'sent_message_ids': sent_message_ids}
+            
+            results = await publisher.publish_post(
+                post_data, 
+                post.get('chat_ids') or [post['tg_channel_id']], 
+                update_db=False
+            )
+            
+            if results['success_count'] > 0:
+                self._record_publish_lag(post)
+                logger.info(f"✅ Пост {post['id']} успешно опубликован в канал {post['tg_channel_id']}")
+                return {
+                    'post_id': post['id'],
+                    'message_id': results['success'][0]['message_id'],
+                    'channel_message_ids': publisher.get_channel_message_ids(results),
+                    'published_at': datetime.now(timezone.utc)
+                }
+            
+            logger.error(f"❌ Не удалось опубликовать пост {post['id']}")
+            failure = results['failed'][0] if results.get('failed') else {}
+            outcome = self._failed_outcome(
+                publisher, post,
+                failure.get('error', 'Не удалось отправить сообщение'),
+                failure.get('retry_after'),
+                permanent=failure.get('permanent', False)
+            )
+            # Отправленные части альбома сохраняются, чтобы повтор их не дублировал
+            channel_message_ids = publisher.get_channel_message_ids(results)
+            if channel_message_ids:
+                outcome['channel_message_ids'] = channel_message_ids
+            return outcome
+        except Exception as e:
+            logger.error(f"❌ Ошибка публикации поста {post['id']}: {e}")
+            return self._failed_outcome(publisher, post, str(e), None)
+    
+    def _failed_outcome(self, publisher, post: Dict[str, Any], error: str,
+                        retry_after: Optional[float], permanent: bool = False) -> Dict[str, Any]:
+        """Итог неудачной попытки: повтор с задержкой или отказ
+        
+        permanent — ошибка, которую повтор не исправит (BadRequest, Forbidden):
+        пост сразу получает статус failed. Задержка повтора — только для
+        сетевых ошибок, 5xx и flood wait.
+        """
+        attempt = (post.get('publish_attempts') or 0) + 1
+        retry_delay = None
+        if permanent:
+            increment('publish_failed_permanently')
+            logger.error(f"❌ Пост {post['id']}: постоянная ошибка, повтора не будет: {error}")
+        elif attempt <= publisher.max_retries:
+            retry_delay = publisher.get_retry_delay(attempt, retry_after)
+            increment('publish_retries_scheduled')
+            logger.warning(f"🔁 Пост {post['id']}: попытка {attempt} не удалась, повтор через {retry_delay:.1f} сек")
+        else:
+            increment('publish_failed_permanently')
+            logger.error(f"❌ Пост {post['id']}: попытки исчерпаны ({attempt}), последняя ошибка: {error}")
+        return {
+            'post_id': post['id'],
+            'message_id': None,
+            'error': error[:1000],
+            'retry_delay': retry_delay
+        }
+    
+    def _record_publish_lag(self, post: Dict[str, Any]) -> None:
+        """Записывает задержку публикации (факт минус scheduled_at)"""
+        scheduled_at = post.get('scheduled_at')
+        if scheduled_at:
+            lag = (datetime.now(timezone.utc) - scheduled_at).total_seconds()
+            get_histogram('publish_lag_seconds').observe(max(lag, 0.0))
+    
     async def _mark_failed_posts(self):
         """Помечает посты как failed, если они не были опубликованы в течение 24 часов"""
         try:
@@ -418,8 +979,8 @@ class PostService:
                 )
             """
             result = await db.execute(query)
-            if result > 0:
-                logger.info(f"⚠️ Помечено {result} постов как failed (не удалось опубликовать)")
+            if _affected_rows(result) > 0:
+                logger.info(f"⚠️ Помечено {_affected_rows(result)} постов как failed (не удалось опубликовать)")
         except Exception as e:
             logger.error(f"❌ Ошибка обработки неудачных постов: {e}")
     
@@ -432,6 +993,7 @@ class PostService:
                 WHERE id = $1
             """
             await db.execute(query, post_id)
+            await cache_bus.publish(POSTS, post_id)
             logger.info("Post %s deleted", post_id)
             return True
         except Exception as e:
@@ -457,8 +1019,10 @@ class PostService:
                 WHERE id = $1 AND status = 'scheduled'
             """
             result = await db.execute(query, post_id)
-            if result > 0:
+            if _affected_rows(result) > 0:
+                await cache_bus.publish(POSTS, post_id)
                 logger.info(f"✅ Пост {post_id} отменен")
+                await self._notify_schedule_changed(post_id)
                 return True
             else:
                 logger.warning(f"⚠️ Пост {post_id} не найден или не был отложенным")
@@ -472,12 +1036,14 @@ class PostService:
         try:
             query = """
                 UPDATE posts 
-                SET status = 'scheduled', updated_at = NOW()
+                SET status = 'scheduled', publish_attempts = 0,
+                    next_attempt_at = NOW(), updated_at = NOW()
                 WHERE id = $1 AND status = 'failed'
             """
             result = await db.execute(query, post_id)
-            if result > 0:
+            if _affected_rows(result) > 0:
                 logger.info(f"🔄 Пост {post_id} помечен для повторной публикации")
+                await self._notify_schedule_changed(post_id)
                 return True
             else:
                 logger.warning(f"⚠️ Пост {post_id} не найден или не был неудачным")
@@ -494,12 +1060,15 @@ class PostService:
             
             query = """
                 UPDATE posts 
-                SET scheduled_at = $2, updated_at = NOW()
+                SET scheduled_at = $2, publish_attempts = 0,
+                    next_attempt_at = NULL, updated_at = NOW()
                 WHERE id = $1 AND status = 'scheduled'
             """
             result = await db.execute(query, post_id, utc_scheduled_at)
-            if result > 0:
+            if _affected_rows(result) > 0:
+                await cache_bus.publish(POSTS, post_id)
                 logger.info(f"⏰ Время публикации поста {post_id} обновлено на {utc_scheduled_at}")
+                await self._notify_schedule_changed(post_id)
                 return True
             else:
                 logger.warning(f"⚠️ Пост {post_id} не найден или не был отложенным")
@@ -510,3 +1079,5 @@ class PostService:
 
 # Глобальный экземпляр сервиса
 post_service = PostService()
+cache_bus.subscribe(POSTS, post_service.invalidate_payload, _payload_cache.clear)
+cache_bus.subscribe(USER_POSTS, _post_count_cache.invalidate, _post_count_cache.clear)
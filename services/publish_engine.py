@@ -0,0 +1,146 @@
+"""
+@file: services/publish_engine.py
+@description: Пул воркеров публикации с ограниченными очередями и шардированием по каналу
+@dependencies: utils/metrics.py
+@created: 2026-10-17
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from config import config
+from utils.logging import get_logger
+from utils.metrics import get_histogram, increment
+
+logger = get_logger(__name__)
+
+PostHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+class PublishEngine:
+    """Каждый канал закреплен за одним воркером (hash(tg_channel_id) % workers)
+
+    Медленный канал (большое видео, 429) задерживает только свой шард,
+    остальные каналы публикуются параллельно. Внутри канала посты идут
+    в порядке поступления. Очереди ограничены: при заполнении run() ждет
+    освобождения места (backpressure).
+    """
+
+    def __init__(self, workers: int = 8, queue_size: int = 100):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._busy_seconds: List[float] = []
+        self._started_at = 0.0
+        self._loop = None
+
+    @property
+    def is_running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def _is_running_here(self) -> bool:
+        """Воркеры запущены в текущем event loop"""
+        try:
+            return self.is_running and self._loop is asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+    def start(self) -> None:
+        """Запускает воркеры (вызывается внутри работающего event loop)"""
+        if self._is_running_here():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        self._busy_seconds = [0.0] * self.workers
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        self._started_at = time.monotonic()
+        logger.info("✅ Publish engine started: %s workers, queue size %s", self.workers, self.queue_size)
+
+    async def stop(self) -> None:
+        """Останавливает воркеры; посты в очередях не публикуются"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        # Ожидающие run() не должны зависнуть навсегда
+        for queue in self._queues:
+            while not queue.empty():
+                _, _, future, _ = queue.get_nowait()
+                if not future.done():
+                    future.cancel()
+        self._tasks = []
+        logger.info("Publish engine stopped")
+
+    def _shard(self, post: Dict[str, Any]) -> int:
+        return hash(post['tg_channel_id']) % self.workers
+
+    async def run(self, posts: List[Dict[str, Any]], handler: PostHandler) -> List[Dict[str, Any]]:
+        """Публикует посты через воркеры и возвращает итоги в исходном порядке"""
+        if not posts:
+            return []
+        if not self._is_running_here():
+            self.start()
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for post in posts:
+            future = loop.create_future()
+            queue = self._queues[self._shard(post)]
+            if queue.full():
+                increment('publish_queue_backpressure')
+            # put() ждет, пока воркер не освободит место в очереди
+            await queue.put((post, handler, future, time.monotonic()))
+            futures.append(future)
+
+        return list(await asyncio.gather(*futures))
+
+    async def _worker(self, index: int) -> None:
+        """Воркер шарда: публикует посты своей очереди по одному, по порядку"""
+        queue = self._queues[index]
+        wait_histogram = get_histogram('publish_queue_wait_seconds')
+        while True:
+            post, handler, future, enqueued_at = await queue.get()
+            started = time.monotonic()
+            wait_histogram.observe(started - enqueued_at)
+            try:
+                if not future.cancelled():
+                    future.set_result(await handler(post))
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                logger.error("Publish worker %s failed on post %s: %s", index, post.get('id'), e)
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._busy_seconds[index] += time.monotonic() - started
+                queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Глубина очередей и загрузка воркеров (доля времени в работе)"""
+        depths = [queue.qsize() for queue in self._queues]
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        utilisation = [
+            round(busy / elapsed, 4) if elapsed > 0 else 0.0
+            for busy in self._busy_seconds
+        ]
+        return {
+            'running': self.is_running,
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'queue_depth': sum(depths),
+            'queue_depths': depths,
+            'worker_utilisation': utilisation,
+            'queue_wait_seconds': get_histogram('publish_queue_wait_seconds').snapshot()
+        }
+
+# Глобальный экземпляр
+publish_engine = PublishEngine(
+    workers=config.PUBLISH_WORKERS,
+    queue_size=config.PUBLISH_QUEUE_SIZE
+)
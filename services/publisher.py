@@ -1,24 +1,98 @@
 # Service: Post Publisher
 # Централизованный сервис для публикации постов в Telegram каналы
 
-from typing import List, Optional, Dict, Any
+import asyncio
+import random
+from typing import List, Optional, Dict, Any, Union
 from aiogram import Bot
-from aiogram.types import Message, MessageEntity, InlineKeyboardMarkup
+from aiogram.types import (
+    Message, MessageEntity, InlineKeyboardMarkup,
+    InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo
+)
 from aiogram.enums import ParseMode
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramEntityTooLarge, TelegramForbiddenError, TelegramMigrateToChat,
+    TelegramNetworkError, TelegramNotFound, TelegramRetryAfter, TelegramServerError
+)
 
+from config import config
 from utils.logging import get_logger
+from utils.rate_limiter import TelegramRateLimiter
 from database import db
 
 logger = get_logger(__name__)
 
+# Временные ошибки: отправку имеет смысл повторить позже
+RETRYABLE_ERRORS = (TelegramRetryAfter, TelegramNetworkError, TelegramServerError)
+
+# Типы медиа, которые можно отправить альбомом (sendMediaGroup)
+MEDIA_GROUP_TYPES = {
+    'photo': InputMediaPhoto,
+    'video': InputMediaVideo,
+    'document': InputMediaDocument,
+    'audio': InputMediaAudio
+}
+# Элементов в одном альбоме по Bot API: от 2 до 10
+MEDIA_GROUP_LIMIT = 10
+MEDIA_GROUP_MIN = 2
+# Документы и аудио группируются только с элементами своего типа, фото и видео — друг с другом
+MEDIA_GROUP_KINDS = {'photo': 'visual', 'video': 'visual', 'document': 'document', 'audio': 'audio'}
+
+class MediaGroupError(Exception):
+    """Альбом нельзя отправить: неподдерживаемый или смешанный состав медиа"""
+
+class MediaGroupPartialError(Exception):
+    """Альбом отправлен не целиком: часть запросов sendMediaGroup прошла
+    
+    message_ids — ID элементов, отправленных этой попыткой, cause — ошибка
+    следующего запроса.
+    """
+    
+    def __init__(self, message_ids: List[int], cause: BaseException):
+        super().__init__(str(cause))
+        self.message_ids = message_ids
+        self.cause = cause
+        self.retry_after = getattr(cause, 'retry_after', None)
+
+# Постоянные ошибки: канал не найден, бот не админ, неверный file_id, файл слишком большой,
+# недопустимый состав альбома. Повтор не поможет, пост сразу получает статус failed
+PERMANENT_ERRORS = (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNotFound,
+    TelegramMigrateToChat, TelegramEntityTooLarge, MediaGroupError
+)
+# Ошибки, которые пробрасываются до publish_post для классификации
+TELEGRAM_SEND_ERRORS = RETRYABLE_ERRORS + PERMANENT_ERRORS + (MediaGroupPartialError,)
+
+def is_permanent_error(error: BaseException) -> bool:
+    """Ошибку отправки не имеет смысла повторять
+    
+    TelegramEntityTooLarge наследует TelegramNetworkError, поэтому
+    проверяется раньше временных ошибок.
+    """
+    if isinstance(error, MediaGroupPartialError):
+        error = error.cause
+    return isinstance(error, PERMANENT_ERRORS)
+
+def split_media_group(count: int) -> List[int]:
+    """Размеры частей альбома из count элементов: не больше MEDIA_GROUP_LIMIT,
+    не меньше MEDIA_GROUP_MIN, почти равные (11 → 6 + 5, а не 10 + 1)"""
+    parts = -(-count // MEDIA_GROUP_LIMIT)
+    base, extra = divmod(count, parts)
+    return [base + 1] * extra + [base] * (parts - extra)
+
 class PostPublisher:
     """Централизованный сервис для публикации постов"""
     
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.max_retries = 3
-        self.retry_delay = 1.0
+        self.max_retries = config.PUBLISH_MAX_RETRIES
+        self.retry_delay = config.PUBLISH_RETRY_DELAY
+        self.max_retry_delay = config.PUBLISH_RETRY_MAX_DELAY
+        self.max_concurrency = config.PUBLISH_CONCURRENCY
+        self.rate_limiter = TelegramRateLimiter(
+            global_rate=config.TELEGRAM_GLOBAL_RATE,
+            group_chat_per_minute=config.TELEGRAM_CHAT_PER_MINUTE
+        )
     
     async def publish_text(
         self, 
@@ -47,6 +121,8 @@ class PostPublisher:
             logger.info(f"🎨 Entities: {len(entities) if entities else 0}")
             logger.info(f"🔧 Parse mode: {parse_mode}")
             
+            await self.rate_limiter.acquire(chat_id)
+            
             # Определяем лучший способ отправки
             if entities:
                 # Используем entities для точного форматирования
@@ -74,6 +150,9 @@ class PostPublisher:
             
             return message
             
+        except TelegramRetryAfter as e:
+            self.rate_limiter.on_retry_after(chat_id, e.retry_after)
+            return None
         except Exception as e:
             logger.error(f"❌ Ошибка публикации текста в канал {chat_id}: {e}")
             return None
@@ -103,6 +182,7 @@ class PostPublisher:
         """
         try:
             logger.info(f"📤 Публикуем {media_type} в канал {chat_id}")
+            await self.rate_limiter.acquire(chat_id)
             
             # Выбираем метод отправки в зависимости от типа медиа
             if media_type == "photo":
@@ -136,6 +216,9 @@ class PostPublisher:
             logger.info(f"✅ Медиа успешно отправлено: ID {message.message_id}")
             return message
             
+        except TelegramRetryAfter as e:
+            self.rate_limiter.on_retry_after(chat_id, e.retry_after)
+            return None
         except Exception as e:
             logger.error(f"❌ Ошибка публикации медиа в канал {chat_id}: {e}")
             return None
@@ -161,6 +244,7 @@ class PostPublisher:
         """
         try:
             logger.info(f"📋 Копируем сообщение {message_id} из чата {from_chat_id} в {chat_id}")
+            await self.rate_limiter.acquire(chat_id)
             
             message = await self.bot.copy_message(
                 chat_id=chat_id,
@@ -172,6 +256,9 @@ class PostPublisher:
             logger.info(f"✅ Сообщение успешно скопировано: ID {message.message_id}")
             return message
             
+        except TelegramRetryAfter as e:
+            self.rate_limiter.on_retry_after(chat_id, e.retry_after)
+            return None
         except Exception as e:
             logger.error(f"❌ Ошибка копирования сообщения: {e}")
             return None
@@ -228,6 +315,7 @@ class PostPublisher:
             logger.info(f"🔒 Анонимный: {is_anonymous}")
             logger.info(f"📝 Тип: {type}")
             
+            await self.rate_limiter.acquire(chat_id)
             message = await self.bot.send_poll(
                 chat_id=chat_id,
                 question=question,
@@ -251,6 +339,9 @@ class PostPublisher:
             logger.info(f"✅ Опрос опубликован: ID {message.message_id}")
             return message
             
+        except TelegramRetryAfter as e:
+            self.rate_limiter.on_retry_after(chat_id, e.retry_after)
+            return None
         except Exception as e:
             logger.error(f"❌ Ошибка публикации опроса: {e}")
             return None
@@ -282,34 +373,56 @@ class PostPublisher:
             'failed_count': 0
         }
         
-        for channel_id in channel_ids:
-            try:
-                # Пытаемся опубликовать в канал
-                message = await self._publish_to_channel(post_data, channel_id)
-                
-                if message:
-                    results['success'].append({
-                        'channel_id': channel_id,
-                        'message_id': message.message_id,
-                        'message': message
-                    })
-                    results['success_count'] += 1
-                    logger.info(f"✅ Пост опубликован в канал {channel_id}")
-                else:
-                    results['failed'].append({
-                        'channel_id': channel_id,
-                        'error': 'Не удалось отправить сообщение'
-                    })
-                    results['failed_count'] += 1
-                    logger.error(f"❌ Не удалось опубликовать в канал {channel_id}")
-                
-            except Exception as e:
+        # Публикуем во все каналы параллельно, не больше max_concurrency запросов сразу
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def publish_one(channel_id: int) -> Union[Message, List[Message], None]:
+            async with semaphore:
+                return await self._publish_with_rate_limit(post_data, channel_id)
+        
+        outcomes = await asyncio.gather(
+            *(publish_one(channel_id) for channel_id in channel_ids),
+            return_exceptions=True
+        )
+        
+        # Собираем результаты в исходном порядке каналов
+        for channel_id, outcome in zip(channel_ids, outcomes):
+            if isinstance(outcome, BaseException):
+                results['failed'].append({
+                    'channel_id': channel_id,
+                    'error': str(outcome),
+                    'retry_after': getattr(outcome, 'retry_after', None),
+                    'permanent': is_permanent_error(outcome),
+                    # Уже отправленные части альбома: следующая попытка продолжит с первой неотправленной
+                    'message_ids': (
+                        self._sent_album_ids(post_data, channel_id) + outcome.message_ids
+                        if isinstance(outcome, MediaGroupPartialError) else []
+                    )
+                })
+                results['failed_count'] += 1
+                logger.error(f"❌ Ошибка публикации в канал {channel_id}: {outcome}")
+            elif outcome or (isinstance(outcome, list) and self._sent_album_ids(post_data, channel_id)):
+                # Альбом возвращает список сообщений: храним ID всех элементов
+                messages = outcome if isinstance(outcome, list) else [outcome]
+                message_ids = [message.message_id for message in messages]
+                if isinstance(outcome, list):
+                    # Продолженный альбом: части из прошлых попыток идут первыми
+                    message_ids = self._sent_album_ids(post_data, channel_id) + message_ids
+                results['success'].append({
+                    'channel_id': channel_id,
+                    'message_id': message_ids[0],
+                    'message_ids': message_ids,
+                    'message': messages[0] if messages else None
+                })
+                results['success_count'] += 1
+                logger.info(f"✅ Пост опубликован в канал {channel_id}")
+            else:
                 results['failed'].append({
                     'channel_id': channel_id,
-                    'error': str(e)
+                    'error': 'Не удалось отправить сообщение'
                 })
                 results['failed_count'] += 1
-                logger.error(f"❌ Ошибка публикации в канал {channel_id}: {e}")
+                logger.error(f"❌ Не удалось опубликовать в канал {channel_id}")
         
         # Обновляем БД если нужно
         if update_db and results['success_count'] > 0:
@@ -318,7 +431,8 @@ class PostPublisher:
                 first_success = results['success'][0]
                 await self._update_post_in_db(
                     post_data['id'], 
-                    first_success['message_id']
+                    first_success['message_id'],
+                    self.get_channel_message_ids(results)
                 )
                 logger.info(f"✅ БД обновлена для поста {post_data['id']}")
             except Exception as e:
@@ -327,13 +441,74 @@ class PostPublisher:
         logger.info(f"📊 Результат публикации: {results['success_count']}/{results['total_channels']} успешно")
         return results
     
-    async def _publish_to_channel(self, post_data: Dict[str, Any], channel_id: int) -> Optional[Message]:
-        """Публикует пост в конкретный канал"""
+    @staticmethod
+    def get_channel_message_ids(results: Dict[str, Any]) -> Dict[str, List[int]]:
+        """ID сообщений по каналам из результата publish_post (для хранения в БД)
+        
+        Включает части альбомов, отправленные до ошибки в неудачных каналах.
+        """
+        channel_message_ids = {
+            str(item['channel_id']): item['message_ids']
+            for item in results['failed'] if item.get('message_ids')
+        }
+        channel_message_ids.update(
+            (str(item['channel_id']), item['message_ids']) for item in results['success']
+        )
+        return channel_message_ids
+    
+    @staticmethod
+    def _sent_album_ids(post_data: Dict[str, Any], channel_id: int) -> List[int]:
+        """ID частей альбома, отправленных в канал прошлыми попытками (post_data['sent_message_ids'])"""
+        return list((post_data.get('sent_message_ids') or {}).get(str(channel_id), []))
+    
+    async def _publish_with_rate_limit(
+        self, post_data: Dict[str, Any], channel_id: int
+    ) -> Union[Message, List[Message], None]:
+        """Публикует пост в канал с учетом лимитов Telegram
+        
+        При ответе RetryAfter канал ставится на паузу в лимитере, а ошибка
+        пробрасывается: повтор планирует вызывающий код (get_retry_delay),
+        чтобы ожидание не задерживало остальные посты пачки.
+        """
+        await self.rate_limiter.acquire(channel_id)
+        try:
+            return await self._publish_to_channel(post_data, channel_id)
+        except TelegramRetryAfter as e:
+            self.rate_limiter.on_retry_after(channel_id, e.retry_after)
+            raise
+    
+    def get_retry_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Задержка перед повторной попыткой номер attempt (с 1)
+        
+        Экспоненциальная задержка retry_delay * 2^(attempt-1), не больше
+        max_retry_delay, со случайным разбросом в половину значения, чтобы
+        повторы разных постов не совпадали. Не меньше retry_after от Telegram.
+        """
+        delay = min(self.retry_delay * 2 ** max(attempt - 1, 0), self.max_retry_delay)
+        delay = random.uniform(delay / 2, delay)
+        if retry_after:
+            delay = max(delay, float(retry_after))
+        return delay
+    
+    async def _publish_to_channel(
+        self, post_data: Dict[str, Any], channel_id: int
+    ) -> Union[Message, List[Message], None]:
+        """Публикует пост в конкретный канал (альбом возвращает список сообщений)"""
         try:
             text = post_data.get('body_md', '')
             entities = post_data.get('entities')
             media_data = post_data.get('media_data')
             
+            # Список медиа отправляется альбомом, один элемент — как обычное медиа
+            if isinstance(media_data, list):
+                if len(media_data) > 1:
+                    logger.info(f"🖼️ Отправляем альбом из {len(media_data)} медиа")
+                    return await self._send_media_group(
+                        channel_id, media_data, text, entities,
+                        already_sent=len(self._sent_album_ids(post_data, channel_id))
+                    )
+                media_data = media_data[0] if media_data else None
+            
             # Если есть медиа, отправляем медиа с подписью
             if media_data:
                 logger.info(f"📷 Отправляем медиа: {media_data['type']}")
@@ -351,10 +526,83 @@ class PostPublisher:
             # Иначе пытаемся определить форматирование
             return await self._send_with_auto_formatting(channel_id, text)
             
+        except TELEGRAM_SEND_ERRORS:
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка публикации в канал {channel_id}: {e}")
             return None
     
+    async def _send_media_group(
+        self,
+        chat_id: int,
+        media_items: List[Dict[str, Any]],
+        caption: str = "",
+        caption_entities: Optional[List] = None,
+        already_sent: int = 0
+    ) -> Optional[List[Message]]:
+        """Отправляет альбом через sendMediaGroup; подпись и entities — у первого элемента
+        
+        Альбомы больше MEDIA_GROUP_LIMIT элементов делятся на почти равные
+        части (split_media_group), каждая следующая — через лимитер.
+        already_sent — элементов, отправленных прошлыми попытками: целиком
+        отправленные части пропускаются. Ошибка после первой части
+        пробрасывается как MediaGroupPartialError с ID отправленных элементов.
+        Возвращает только сообщения этой попытки.
+        """
+        kinds = set()
+        for item in media_items:
+            kind = MEDIA_GROUP_KINDS.get(item.get('type'))
+            if not kind or not item.get('file_id'):
+                raise MediaGroupError(f"Медиа {item.get('type')} нельзя отправить в альбоме")
+            kinds.add(kind)
+        if len(kinds) > 1:
+            raise MediaGroupError("Документы и аудио нельзя смешивать в альбоме с другими типами медиа")
+        
+        try:
+            caption_entities_list = None
+            if caption_entities:
+                if isinstance(caption_entities[0], MessageEntity):
+                    caption_entities_list = caption_entities
+                else:
+                    from utils.entities import entities_from_dict
+                    caption_entities_list = entities_from_dict(caption_entities)
+            
+            media = [MEDIA_GROUP_TYPES[item['type']](media=item['file_id']) for item in media_items]
+            if caption:
+                media[0] = media[0].model_copy(update={
+                    'caption': caption,
+                    'caption_entities': caption_entities_list
+                })
+        except Exception as e:
+            logger.error(f"❌ Ошибка подготовки альбома: {e}")
+            return None
+        
+        messages = []
+        sent_ids: List[int] = []
+        start = 0
+        for size in split_media_group(len(media)):
+            end = start + size
+            if end <= already_sent:
+                # Часть отправлена прошлой попыткой
+                start = end
+                continue
+            try:
+                if messages or start:
+                    await self.rate_limiter.acquire(chat_id)
+                chunk = await self.bot.send_media_group(chat_id=chat_id, media=media[start:end])
+            except Exception as e:
+                if not messages and not already_sent:
+                    if isinstance(e, TELEGRAM_SEND_ERRORS):
+                        raise
+                    logger.error(f"❌ Ошибка отправки альбома: {e}")
+                    return None
+                logger.error(f"❌ Альбом в {chat_id} отправлен частично ({start} из {len(media)}): {e}")
+                raise MediaGroupPartialError(list(sent_ids), e) from e
+            messages.extend(chunk)
+            sent_ids.extend(message.message_id for message in chunk)
+            start = end
+        return messages
+    
     async def _send_media_with_caption(
         self, 
         chat_id: int, 
@@ -371,11 +619,14 @@ class PostPublisher:
                 logger.error("❌ Неполные данные медиа")
                 return None
             
-            # Преобразуем entities для caption
+            # Преобразуем entities для caption (подготовленные посты уже содержат MessageEntity)
             caption_entities_list = None
             if caption_entities:
-                from utils.entities import entities_from_dict
-                caption_entities_list = entities_from_dict(caption_entities)
+                if isinstance(caption_entities[0], MessageEntity):
+                    caption_entities_list = caption_entities
+                else:
+                    from utils.entities import entities_from_dict
+                    caption_entities_list = entities_from_dict(caption_entities)
             
             # Отправляем медиа в зависимости от типа
             if media_type == "photo":
@@ -422,6 +673,8 @@ class PostPublisher:
                 logger.error(f"❌ Неподдерживаемый тип медиа: {media_type}")
                 return None
                 
+        except TELEGRAM_SEND_ERRORS:
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка отправки медиа {media_type}: {e}")
             return None
@@ -441,6 +694,8 @@ class PostPublisher:
                 entities=entities,
                 reply_markup=reply_markup
             )
+        except TELEGRAM_SEND_ERRORS:
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка отправки с entities: {e}")
             return None
@@ -460,6 +715,8 @@ class PostPublisher:
                 parse_mode=parse_mode,
                 reply_markup=reply_markup
             )
+        except TELEGRAM_SEND_ERRORS:
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка отправки с parse_mode {parse_mode}: {e}")
             return None
@@ -498,6 +755,8 @@ class PostPublisher:
                 )
             else:
                 raise
+        except TELEGRAM_SEND_ERRORS:
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка автоформатирования: {e}")
             return None
@@ -507,23 +766,57 @@ class PostPublisher:
         markdown_indicators = ['*', '_', '`', '[', ']', '(', ')']
         return any(indicator in text for indicator in markdown_indicators)
     
-    async def _update_post_in_db(self, post_id: int, message_id: int):
+    async def _update_post_in_db(self, post_id: int, message_id: int,
+                                 channel_message_ids: Optional[Dict[str, List[int]]] = None):
         """Обновляет пост в БД после публикации"""
         try:
+            import json
             query = """
                 UPDATE posts 
                 SET status = 'published', 
                     published_at = NOW(),
                     message_id = $2,
+                    channel_message_ids = COALESCE($3::jsonb, channel_message_ids),
+                    claimed_by = NULL,
+                    claimed_until = NULL,
                     updated_at = NOW()
                 WHERE id = $1
             """
-            await db.execute(query, post_id, message_id)
+            await db.execute(
+                query, post_id, message_id,
+                json.dumps(channel_message_ids) if channel_message_ids else None
+            )
             logger.info(f"✅ Пост {post_id} обновлен в БД (message_id: {message_id})")
         except Exception as e:
             logger.error(f"❌ Ошибка обновления поста {post_id} в БД: {e}")
             raise
     
+    async def delete_post_messages(self, post: Dict[str, Any], fallback_channel_id: int) -> bool:
+        """Удаляет все сообщения поста (включая элементы альбомов) из всех каналов
+        
+        Если ID сообщений по каналам не сохранены (посты до появления
+        channel_message_ids), удаляется post['message_id'] из fallback_channel_id.
+        """
+        channel_message_ids = post.get('channel_message_ids')
+        if isinstance(channel_message_ids, str):
+            import json
+            channel_message_ids = json.loads(channel_message_ids)
+        if not channel_message_ids:
+            channel_message_ids = {str(fallback_channel_id): [post['message_id']]}
+        
+        deleted = True
+        for channel_id, message_ids in channel_message_ids.items():
+            if len(message_ids) > 1:
+                try:
+                    await self.bot.delete_messages(chat_id=int(channel_id), message_ids=message_ids)
+                    logger.info(f"✅ Сообщения {message_ids} удалены из канала {channel_id}")
+                except Exception as e:
+                    logger.error(f"❌ Ошибка удаления сообщений {message_ids} из канала {channel_id}: {e}")
+                    deleted = False
+            else:
+                deleted = await self.delete_message_from_channel(int(channel_id), message_ids[0]) and deleted
+        return deleted
+    
     async def delete_message_from_channel(self, channel_id: int, message_id: int) -> bool:
         """Удаляет сообщение из канала"""
         try:
@@ -4,9 +4,15 @@ from typing import List, Optional, Dict, Any
 import logging
 
 from database import db
+from services.cache_bus import SERIES, cache_bus
+from utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Серии канала для клавиатуры выбора серии. Сбрасываются при create/update/delete
+# серии и при увеличении next_number (номер показывается на кнопке)
+_channel_series_cache = TTLCache(maxsize=256, ttl=300, name='channel_series')
+
 class SeriesService:
     """Сервис для работы с сериями"""
     
@@ -22,6 +28,7 @@ class SeriesService:
                 RETURNING id
             """
             series_id = await db.fetch_val(query, channel_id, code, title)
+            await cache_bus.publish(SERIES, channel_id)
             logger.info("Series created/updated: %s (%s) for channel %s", code, title, channel_id)
             return series_id
         except Exception as e:
@@ -31,13 +38,18 @@ class SeriesService:
     async def get_series_by_channel(self, channel_id: int) -> List[Dict[str, Any]]:
         """Получает серии канала"""
         try:
-            query = """
-                SELECT * FROM series 
-                WHERE channel_id = $1
-                ORDER BY title ASC
-            """
-            results = await db.fetch_all(query, channel_id)
-            return [dict(row) for row in results]
+            series = _channel_series_cache.get(channel_id)
+            if series is None:
+                query = """
+                    SELECT * FROM series 
+                    WHERE channel_id = $1
+                    ORDER BY title ASC
+                """
+                results = await db.fetch_all(query, channel_id)
+                series = [dict(row) for row in results]
+                _channel_series_cache.set(channel_id, series)
+            
+            return [dict(item) for item in series]
         except Exception as e:
             logger.error("Failed to get series for channel %s: %s", channel_id, e)
             raise
@@ -79,9 +91,11 @@ class SeriesService:
                 UPDATE series 
                 SET {', '.join(updates)}
                 WHERE id = ${param_count}
+                RETURNING channel_id
             """
             
-            await db.execute(query, *params)
+            channel_id = await db.fetch_val(query, *params)
+            await cache_bus.publish(SERIES, channel_id)
             logger.info("Series %s updated", series_id)
             return True
         except Exception as e:
@@ -91,14 +105,24 @@ class SeriesService:
     async def delete_series(self, series_id: int) -> bool:
         """Удаляет серию"""
         try:
-            query = "DELETE FROM series WHERE id = $1"
-            await db.execute(query, series_id)
+            query = "DELETE FROM series WHERE id = $1 RETURNING channel_id"
+            channel_id = await db.fetch_val(query, series_id)
+            await cache_bus.publish(SERIES, channel_id)
             logger.info("Series %s deleted", series_id)
             return True
         except Exception as e:
             logger.error("Failed to delete series %s: %s", series_id, e)
             raise
     
+    def invalidate_channel(self, channel_id: Optional[int]) -> None:
+        """Сбрасывает кеш серий канала"""
+        if channel_id is not None:
+            _channel_series_cache.invalidate(channel_id)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кеша серий по каналам"""
+        return _channel_series_cache.get_stats()
+    
     async def get_next_number(self, series_id: int) -> int:
         """Получает следующий номер в серии"""
         try:
@@ -116,9 +140,11 @@ class SeriesService:
                 UPDATE series 
                 SET next_number = next_number + 1
                 WHERE id = $1
-                RETURNING next_number
+                RETURNING next_number, channel_id
             """
-            new_number = await db.fetch_val(query, series_id)
+            row = await db.fetch_one(query, series_id)
+            new_number = row['next_number'] if row else None
+            await cache_bus.publish(SERIES, row['channel_id'] if row else None)
             logger.info("Series %s number incremented to %s", series_id, new_number)
             return new_number or 1
         except Exception as e:
@@ -159,3 +185,4 @@ class SeriesService:
 
 # Глобальный экземпляр сервиса
 series_service = SeriesService()
+cache_bus.subscribe(SERIES, series_service.invalidate_channel, _channel_series_cache.clear)
@@ -4,9 +4,15 @@ from typing import List, Optional, Dict, Any
 import logging
 
 from database import db
+from services.cache_bus import TAGS, cache_bus
+from utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Теги канала для клавиатур выбора: читаются на каждое нажатие кнопки,
+# меняются редко. Сбрасываются при create/update/delete тега
+_channel_tags_cache = TTLCache(maxsize=256, ttl=300, name='channel_tags')
+
 class TagService:
     """Сервис для работы с тегами"""
     
@@ -22,6 +28,7 @@ class TagService:
                 RETURNING id
             """
             tag_id = await db.fetch_val(query, channel_id, name, kind)
+            await cache_bus.publish(TAGS, channel_id)
             logger.info("Tag created/updated: %s (%s) for channel %s", name, kind, channel_id)
             return tag_id
         except Exception as e:
@@ -31,20 +38,18 @@ class TagService:
     async def get_tags_by_channel(self, channel_id: int, kind: Optional[str] = None) -> List[Dict[str, Any]]:
         """Получает теги канала"""
         try:
-            where_clause = "WHERE channel_id = $1"
-            params = [channel_id]
-            
-            if kind:
-                where_clause += " AND kind = $2"
-                params.append(kind)
+            tags = _channel_tags_cache.get(channel_id)
+            if tags is None:
+                query = """
+                    SELECT * FROM tags 
+                    WHERE channel_id = $1
+                    ORDER BY name ASC
+                """
+                results = await db.fetch_all(query, channel_id)
+                tags = [dict(row) for row in results]
+                _channel_tags_cache.set(channel_id, tags)
             
-            query = f"""
-                SELECT * FROM tags 
-                {where_clause}
-                ORDER BY name ASC
-            """
-            results = await db.fetch_all(query, *params)
-            return [dict(row) for row in results]
+            return [dict(tag) for tag in tags if not kind or tag['kind'] == kind]
         except Exception as e:
             logger.error("Failed to get tags for channel %s: %s", channel_id, e)
             raise
@@ -86,9 +91,11 @@ class TagService:
                 UPDATE tags 
                 SET {', '.join(updates)}
                 WHERE id = ${param_count}
+                RETURNING channel_id
             """
             
-            await db.execute(query, *params)
+            channel_id = await db.fetch_val(query, *params)
+            await cache_bus.publish(TAGS, channel_id)
             logger.info("Tag %s updated", tag_id)
             return True
         except Exception as e:
@@ -98,14 +105,24 @@ class TagService:
     async def delete_tag(self, tag_id: int) -> bool:
         """Удаляет тег"""
         try:
-            query = "DELETE FROM tags WHERE id = $1"
-            await db.execute(query, tag_id)
+            query = "DELETE FROM tags WHERE id = $1 RETURNING channel_id"
+            channel_id = await db.fetch_val(query, tag_id)
+            await cache_bus.publish(TAGS, channel_id)
             logger.info("Tag %s deleted", tag_id)
             return True
         except Exception as e:
             logger.error("Failed to delete tag %s: %s", tag_id, e)
             raise
     
+    def invalidate_channel(self, channel_id: Optional[int]) -> None:
+        """Сбрасывает кеш тегов канала"""
+        if channel_id is not None:
+            _channel_tags_cache.invalidate(channel_id)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кеша тегов по каналам"""
+        return _channel_tags_cache.get_stats()
+    
     async def add_tag_to_post(self, post_id: int, tag_id: int) -> bool:
         """Добавляет тег к посту"""
         try:
@@ -198,3 +215,4 @@ class TagService:
 
 # Глобальный экземпляр сервиса
 tag_service = TagService()
+cache_bus.subscribe(TAGS, tag_service.invalidate_channel, _channel_tags_cache.clear)
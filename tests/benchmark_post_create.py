@@ -0,0 +1,129 @@
+# Benchmark: создание поста
+# Число запросов к БД (round trips) на один пост: прежний пошаговый путь
+# против PostService.create_post в одной транзакции
+#
+# Запуск:
+#   python -m tests.benchmark_post_create
+#   python -m tests.benchmark_post_create --tags 5 --rtt 0.002   # сетевая задержка до БД, сек
+#
+# Вместо PostgreSQL используется пул, который считает запросы на каждом
+# подключении и ждет rtt секунд на каждый; BEGIN и COMMIT — тоже отдельные запросы.
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from database import db
+from services.post_service import PostService, SCHEDULE_CHANNEL
+from services.series import series_service
+from services.tags import tag_service
+
+class CountingConnection:
+    """Подключение, которое считает запросы и отвечает правдоподобными значениями"""
+
+    def __init__(self, counter: SimpleNamespace, rtt: float):
+        self.counter = counter
+        self.rtt = rtt
+
+    async def _round_trip(self):
+        self.counter.round_trips += 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+
+    def get_server_pid(self):
+        return 1
+
+    async def prepare(self, query):
+        await self._round_trip()
+        return SimpleNamespace(fetchval=self.fetchval, fetchrow=self.fetchrow, fetch=self.fetch)
+
+    async def execute(self, query, *args):
+        await self._round_trip()
+        return 'OK'
+
+    async def fetchval(self, query=None, *args):
+        await self._round_trip()
+        return 1
+
+    async def fetchrow(self, query=None, *args):
+        await self._round_trip()
+        return {'id': 1, 'channel_id': 1, 'series_number': 2}
+
+    async def fetch(self, query=None, *args):
+        await self._round_trip()
+        return [{'name': 'tag'}]
+
+    @asynccontextmanager
+    async def transaction(self):
+        await self._round_trip()  # BEGIN
+        yield
+        await self._round_trip()  # COMMIT
+
+class CountingPool:
+    def __init__(self, conn: CountingConnection):
+        self.conn = conn
+
+    def get_max_size(self):
+        return 10
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+async def legacy_create_post(service: PostService, tg_channel_id: int, body_md: str,
+                             user_id: int, series_id: int, tag_ids: list) -> int:
+    """Прежний путь создания поста: отдельный запрос на каждый шаг, без транзакции"""
+    channel_id = await db.fetch_val("SELECT id FROM channels WHERE tg_channel_id = $1", tg_channel_id)
+    post_id = await db.fetch_val(
+        "INSERT INTO posts (channel_id, user_id, body_md, status, series_id, scheduled_at) "
+        "VALUES ($1, $2, $3, 'scheduled', $4, NOW()) RETURNING id",
+        channel_id, user_id, body_md, series_id
+    )
+    for tag_id in tag_ids:
+        await tag_service.add_tag_to_post(post_id, tag_id)
+    await tag_service.update_post_tags_cache(post_id)
+    await series_service.increment_series_number(series_id)
+    await db.notify(SCHEDULE_CHANNEL, str(post_id))
+    return post_id
+
+async def measure(name: str, create, posts: int, counter: SimpleNamespace) -> None:
+    counter.round_trips = 0
+    started = time.perf_counter()
+    for _ in range(posts):
+        await create()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name:<12} {counter.round_trips / posts:>5.1f} round trips/post  "
+        f"{elapsed / posts * 1000:>7.2f} ms/post"
+    )
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='Бенчмарк создания поста: запросы к БД на пост')
+    parser.add_argument('--posts', type=int, default=200, help='постов на сценарий')
+    parser.add_argument('--tags', type=int, default=3, help='тегов у поста')
+    parser.add_argument('--rtt', type=float, default=0.001, help='задержка одного запроса к БД, сек')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    counter = SimpleNamespace(round_trips=0)
+    db.pool = CountingPool(CountingConnection(counter, args.rtt))
+    service = PostService()
+    tag_ids = list(range(1, args.tags + 1))
+    scheduled_at = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    print(f"posts={args.posts} tags={args.tags} rtt={args.rtt * 1000:.1f}ms")
+    await measure('before', lambda: legacy_create_post(
+        service, -1001, 'Пост', 1, series_id=1, tag_ids=tag_ids
+    ), args.posts, counter)
+    await measure('after', lambda: service.create_post(
+        -1001, None, 'Пост', 1, series_id=1, scheduled_at=scheduled_at, tag_ids=tag_ids
+    ), args.posts, counter)
+    db.pool = None
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+# Benchmark: PostPublisher / PostService
+# Пропускная способность публикации через локальный fake Bot API
+#
+# Запуск:
+#   python -m tests.benchmark_publisher
+#   python -m tests.benchmark_publisher --posts 500 --latency 0.05 --flood-every 50
+#
+# publish_scheduled_posts работает с БД только через claim_due_posts и
+# write_publish_results; в бенчмарке они заменены списком в памяти, поэтому
+# измеряется путь публикации (пул воркеров, лимитер, publisher, HTTP), а не Postgres.
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from services.post_service import PostService
+from services.publisher import PostPublisher, init_publisher
+from services.publish_engine import publish_engine
+from tests.fake_telegram_api import FakeTelegramAPI
+from utils.metrics import Histogram
+from utils.rate_limiter import TelegramRateLimiter
+
+CHANNEL_COUNTS = (1, 10, 100)
+
+def _make_limiter(telegram_limits: bool) -> TelegramRateLimiter:
+    if telegram_limits:
+        return TelegramRateLimiter()
+    # Без лимитов измеряется собственная скорость кода, а не ограничения Telegram
+    return TelegramRateLimiter(global_rate=1e9, group_chat_per_minute=1e12, group_burst=1e9)
+
+def _report(name: str, channels: int, posts: int, elapsed: float, latency: Histogram) -> None:
+    snapshot = latency.snapshot()
+    print(
+        f"{name:<24} channels={channels:<4} posts={posts:<5} "
+        f"{posts / elapsed:>9.1f} posts/s  "
+        f"p50={snapshot['p50'] * 1000:>7.1f}ms  "
+        f"p95={snapshot['p95'] * 1000:>7.1f}ms  "
+        f"p99={snapshot['p99'] * 1000:>7.1f}ms"
+    )
+
+async def bench_publish_post(publisher: PostPublisher, channels: int, posts: int) -> None:
+    """publish_post: каждый пост рассылается во все channels каналов"""
+    channel_ids = [-1000000000000 - index for index in range(channels)]
+    latency = Histogram('publish_post', window=posts)
+    started = time.perf_counter()
+    for post_id in range(posts):
+        post_started = time.perf_counter()
+        await publisher.publish_post({'id': post_id, 'body_md': f'Пост {post_id}'}, channel_ids, update_db=False)
+        latency.observe(time.perf_counter() - post_started)
+    _report('publish_post', channels, posts, time.perf_counter() - started, latency)
+
+async def bench_publish_scheduled(channels: int, posts: int) -> None:
+    """publish_scheduled_posts: posts постов, распределенных по channels каналам"""
+    now = datetime.now(timezone.utc)
+    due = [
+        {
+            'id': post_id,
+            'body_md': f'Пост {post_id}',
+            'tg_channel_id': -1000000000000 - post_id % channels,
+            'scheduled_at': now,
+            'publish_attempts': 0
+        }
+        for post_id in range(posts)
+    ]
+    written: List[Dict[str, Any]] = []
+    service = PostService()
+
+    async def claim_due_posts(limit=None):
+        batch = due[:limit or 100]
+        del due[:len(batch)]
+        return batch
+
+    async def write_publish_results(outcomes):
+        written.extend(outcomes)
+        return len(outcomes)
+
+    async def mark_failed_posts():
+        return None
+
+    service.claim_due_posts = claim_due_posts
+    service.write_publish_results = write_publish_results
+    service._mark_failed_posts = mark_failed_posts
+
+    latency = Histogram('publish_scheduled_posts', window=posts)
+    publish_one = service._publish_claimed_post
+
+    async def timed_publish(publisher, post):
+        post_started = time.perf_counter()
+        try:
+            return await publish_one(publisher, post)
+        finally:
+            latency.observe(time.perf_counter() - post_started)
+
+    service._publish_claimed_post = timed_publish
+    started = time.perf_counter()
+    await service.publish_scheduled_posts(bot=None)
+    _report('publish_scheduled_posts', channels, posts, time.perf_counter() - started, latency)
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='Бенчмарк публикации через fake Bot API')
+    parser.add_argument('--posts', type=int, default=200, help='постов на сценарий')
+    parser.add_argument('--latency', type=float, default=0.01, help='задержка ответа API, сек')
+    parser.add_argument('--jitter', type=float, default=0.005, help='случайная добавка к задержке, сек')
+    parser.add_argument('--flood-every', type=int, default=0, help='каждый N-й запрос получает 429')
+    parser.add_argument('--telegram-limits', action='store_true', help='включить реальные лимиты Telegram')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    api = FakeTelegramAPI(latency=args.latency, jitter=args.jitter, flood_every=args.flood_every)
+    await api.start()
+    bot = api.make_bot()
+    publisher = init_publisher(bot)
+    try:
+        for channels in CHANNEL_COUNTS:
+            publisher.rate_limiter = _make_limiter(args.telegram_limits)
+            await bench_publish_post(publisher, channels, max(1, args.posts // channels))
+        for channels in CHANNEL_COUNTS:
+            publisher.rate_limiter = _make_limiter(args.telegram_limits)
+            await bench_publish_scheduled(channels, args.posts)
+        print(f"API calls: {dict(api.calls)}, 429 injected: {api.floods}")
+    finally:
+        await publish_engine.stop()
+        await bot.session.close()
+        await api.stop()
+
+if __name__ == '__main__':
+    asyncio.run(main())
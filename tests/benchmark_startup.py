@@ -0,0 +1,50 @@
+# Benchmark: startup
+# Время импорта database, число загруженных модулей и пик памяти
+#
+# Запуск:
+#   python -m tests.benchmark_startup
+#   python -m tests.benchmark_startup --connect   # плюс создание пула (нужна БД из .env)
+
+import argparse
+import asyncio
+import subprocess
+import sys
+
+PROBE = """
+import sys, time, tracemalloc
+tracemalloc.start()
+started = time.perf_counter()
+import database
+elapsed = time.perf_counter() - started
+connect = 0.0
+if {connect}:
+    import asyncio
+    started = time.perf_counter()
+    asyncio.run(database.db.connect())
+    connect = time.perf_counter() - started
+print(elapsed, connect, len(sys.modules), 'sqlalchemy' in sys.modules, tracemalloc.get_traced_memory()[1])
+"""
+
+def run_probe(connect: bool) -> tuple:
+    """Запускает замер в отдельном процессе, чтобы импорты не кешировались"""
+    output = subprocess.check_output([sys.executable, '-c', PROBE.format(connect=connect)], text=True)
+    elapsed, connect_time, modules, sqlalchemy_loaded, peak = output.split()[-5:]
+    return float(elapsed), float(connect_time), int(modules), sqlalchemy_loaded == 'True', int(peak)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Замер стоимости запуска')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--connect', action='store_true', help='замерить и database.db.connect()')
+    args = parser.parse_args()
+
+    results = [run_probe(args.connect) for _ in range(args.runs)]
+    imports = sorted(result[0] for result in results)
+    connects = sorted(result[1] for result in results)
+    _, _, modules, sqlalchemy_loaded, peak = results[-1]
+    print(f"import database: median {imports[len(imports) // 2] * 1000:.1f} ms over {args.runs} runs")
+    if args.connect:
+        print(f"db.connect(): median {connects[len(connects) // 2] * 1000:.1f} ms")
+    print(f"modules loaded: {modules}, sqlalchemy loaded: {sqlalchemy_loaded}, peak memory: {peak / 1e6:.1f} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Fake Telegram Bot API
+# Локальный aiohttp-сервер вместо api.telegram.org для интеграционных тестов и бенчмарков
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+FAKE_BOT_TOKEN = '123456:FAKE-TOKEN-FOR-TESTS'
+
+class FakeTelegramAPI:
+    """Минимальная реализация Bot API: sendMessage, sendPhoto, copyMessage,
+    deleteMessage(s), sendMediaGroup
+
+    latency/jitter — задержка ответа в секундах; flood_every — каждый N-й
+    запрос получает 429 с retry_after (в теле и в заголовке Retry-After).
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 flood_every: int = 0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.floods = 0
+        self.sent: List[Dict[str, Any]] = []
+        self.deleted: List[Dict[str, Any]] = []
+        self._request_count = 0
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url: Optional[str] = None
+
+        self._handlers = {
+            'sendmessage': self._send_message,
+            'sendphoto': self._send_message,
+            'sendvideo': self._send_message,
+            'senddocument': self._send_message,
+            'copymessage': self._copy_message,
+            'deletemessage': self._delete_messages,
+            'deletemessages': self._delete_messages,
+            'sendmediagroup': self._send_media_group
+        }
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Запускает сервер и возвращает его базовый URL"""
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._dispatch)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{bound_host}:{bound_port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        """Останавливает сервер"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def make_bot(self, token: str = FAKE_BOT_TOKEN) -> Bot:
+        """Bot, который ходит в этот сервер вместо api.telegram.org"""
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.base_url))
+        return Bot(token=token, session=session)
+
+    async def _dispatch(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        self.calls[method] += 1
+        self._request_count += 1
+
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.flood_every and self._request_count % self.flood_every == 0:
+            self.floods += 1
+            return web.json_response(
+                {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after}
+                },
+                status=429,
+                headers={'Retry-After': str(self.retry_after)}
+            )
+
+        handler = self._handlers.get(method)
+        if handler is None:
+            return web.json_response(
+                {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'},
+                status=404
+            )
+        params = dict(await request.post())
+        return web.json_response({'ok': True, 'result': handler(params)})
+
+    def _message(self, chat_id: Any, **fields) -> Dict[str, Any]:
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'channel', 'title': 'Fake channel'},
+            **fields
+        }
+        self.sent.append(message)
+        return message
+
+    def _send_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        fields = {}
+        if 'text' in params:
+            fields['text'] = params['text']
+        if 'caption' in params:
+            fields['caption'] = params['caption']
+        return self._message(params['chat_id'], **fields)
+
+    def _copy_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {'message_id': self._message(params['chat_id'])['message_id']}
+
+    def _send_media_group(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        media = json.loads(params['media'])
+        return [
+            self._message(params['chat_id'], caption=item['caption']) if item.get('caption')
+            else self._message(params['chat_id'])
+            for item in media
+        ]
+
+    def _delete_messages(self, params: Dict[str, Any]) -> bool:
+        self.deleted.append(params)
+        return True
@@ -0,0 +1,66 @@
+# Fake YandexGPT API
+# Локальный aiohttp-сервер вместо llm.api.cloud.yandex.net для тестов AIService
+
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aiohttp import web
+
+class FakeYandexGPTAPI:
+    """Минимальная реализация foundationModels/v1/completion
+
+    Отвечает текстом f"{reply_prefix}{текст запроса}"; latency — задержка ответа
+    в секундах, fail_every — каждый N-й запрос получает 500. Считает
+    одновременно выполняемые запросы и TCP-соединения клиентов (peers).
+    """
+
+    def __init__(self, latency: float = 0.0, fail_every: int = 0, reply_prefix: str = 'Ответ: '):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.reply_prefix = reply_prefix
+        self.requests: List[Dict[str, Any]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.peers: Set[Tuple[str, int]] = set()
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url: Optional[str] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Запускает сервер и возвращает URL метода completion"""
+        app = web.Application()
+        app.router.add_post('/foundationModels/v1/completion', self._completion)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{bound_host}:{bound_port}/foundationModels/v1/completion"
+        return self.base_url
+
+    async def stop(self) -> None:
+        """Останавливает сервер"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _completion(self, request: web.Request) -> web.Response:
+        # У каждого TCP-соединения клиента свой порт
+        self.peers.add(request.transport.get_extra_info('peername'))
+        payload = await request.json()
+        self.requests.append(payload)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.fail_every and len(self.requests) % self.fail_every == 0:
+                return web.json_response({'error': {'message': 'Internal error'}}, status=500)
+            text = payload['messages'][0]['text']
+            return web.json_response({
+                'result': {
+                    'alternatives': [{'message': {'role': 'assistant', 'text': f"{self.reply_prefix}{text}"}, 'status': 'ALTERNATIVE_STATUS_FINAL'}],
+                    'modelVersion': 'fake'
+                }
+            })
+        finally:
+            self.in_flight -= 1
@@ -1,3 +1,125 @@
 # Tests: ai
+# Тесты кеша ответов AIService
 
-# TODO: add tests for AI integration
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from services.ai_cache import AIResponseCache, make_cache_key
+from services.ai_service import AIService
+from utils.metrics import get_counter, get_histogram
+
+def _completion(text: str) -> dict:
+    return {'result': {'alternatives': [{'message': {'text': text}}]}}
+
+def _service(cache: AIResponseCache) -> AIService:
+    service = AIService()
+    service.api_key, service.folder_id = 'key', 'folder'
+    service.cache = cache
+    return service
+
+class TestAIResponseCache:
+    """Повторные AI-запросы отвечают из кеша"""
+    
+    @pytest.mark.asyncio
+    async def test_repeated_call_hits_cache(self):
+        """Та же кнопка на том же черновике не ходит в API повторно"""
+        service = _service(AIResponseCache())
+        
+        with patch.object(service, '_make_request', AsyncMock(return_value=_completion('Лучше'))) as request:
+            first = await service.improve_text('Текст  поста\r\n')
+            second = await service.improve_text('Текст поста')
+        
+        assert first == second == 'Лучше'
+        assert request.await_count == 1
+        assert service.get_cache_stats()['memory_hits'] == 1
+    
+    def test_key_depends_on_operation_params_and_model(self):
+        """Параметры и модель входят в ключ, пробелы — нет"""
+        base = make_cache_key('change_style', 'Текст', {'style': 'formal'}, 'gpt://a/yandexgpt-lite')
+        
+        assert base == make_cache_key('change_style', ' Текст ', {'style': 'formal'}, 'gpt://a/yandexgpt-lite')
+        assert base != make_cache_key('change_style', 'Текст', {'style': 'casual'}, 'gpt://a/yandexgpt-lite')
+        assert base != make_cache_key('improve_text', 'Текст', {'style': 'formal'}, 'gpt://a/yandexgpt-lite')
+        assert base != make_cache_key('change_style', 'Текст', {'style': 'formal'}, 'gpt://a/yandexgpt')
+    
+    @pytest.mark.asyncio
+    async def test_db_tier_and_failures_not_cached(self):
+        """Ответ из БД поднимается в память; ошибка API не кешируется"""
+        service = _service(AIResponseCache(use_db=True))
+        
+        with patch('services.ai_cache.db.fetch_val', AsyncMock(side_effect=['Аннотация', None])), \
+             patch('services.ai_cache.db.execute', AsyncMock()) as execute, \
+             patch.object(service, '_make_request', AsyncMock(return_value=None)) as request:
+            assert await service.generate_annotation('Пост') == 'Аннотация'
+            assert await service.generate_annotation('Пост') == 'Аннотация'
+            assert await service.generate_annotation('Другой пост') == 'Аннотация недоступна'
+        
+        stats = service.get_cache_stats()
+        assert (stats['db_hits'], stats['memory_hits'], stats['misses']) == (1, 1, 1)
+        assert request.await_count == 1
+        execute.assert_not_awaited()
+
+@asynccontextmanager
+async def _fake_api(max_concurrency: int = 2):
+    """Сервис с общей сессией, направленный на локальный fake YandexGPT API"""
+    from tests.fake_yandexgpt_api import FakeYandexGPTAPI
+    api = FakeYandexGPTAPI(latency=0.05)
+    await api.start()
+    service = _service(AIResponseCache())
+    service.base_url = api.base_url
+    service.max_concurrency = max_concurrency
+    service._semaphore = asyncio.Semaphore(max_concurrency)
+    await service.start()
+    try:
+        yield api, service
+    finally:
+        await service.close()
+        await api.stop()
+
+class TestAIHTTPClient:
+    """Запросы к локальному fake YandexGPT API (настоящий HTTP вместо Mock)"""
+    
+    @pytest.mark.asyncio
+    async def test_session_reused_and_concurrency_limited(self):
+        """Соединения переиспользуются, одновременно не больше max_concurrency"""
+        async with _fake_api() as (api, service):
+            results = await asyncio.gather(*(service._make_request(f"Запрос {i}") for i in range(6)))
+            await service._make_request("Еще один")
+        
+        assert [r['result']['alternatives'][0]['message']['text'] for r in results] == \
+            [f"Ответ: Запрос {i}" for i in range(6)]
+        assert len(api.requests) == 7
+        assert api.max_in_flight == 2
+        assert len(api.peers) <= 2
+    
+    @pytest.mark.asyncio
+    async def test_identical_in_flight_requests_coalesced(self):
+        """Одинаковые запросы во время выполнения первого уходят в API один раз"""
+        coalesced = get_counter('ai_requests_coalesced')
+        
+        async with _fake_api() as (api, service):
+            results = await asyncio.gather(*(service.improve_text('Один текст') for _ in range(5)))
+        
+        assert len(set(results)) == 1
+        assert len(api.requests) == 1
+        assert get_counter('ai_requests_coalesced') - coalesced == 4
+        assert service._inflight == {}
+    
+    @pytest.mark.asyncio
+    async def test_errors_counted_and_not_cached(self):
+        """500 от API считается ошибкой, повторный вызов снова идет в API"""
+        errors = get_counter('ai_request_errors')
+        latency_count = get_histogram('ai_request_seconds').count
+        
+        async with _fake_api() as (api, service):
+            api.fail_every = 1
+            assert await service.generate_annotation('Пост') == 'Аннотация недоступна'
+            api.fail_every = 0
+            assert await service.generate_annotation('Пост') != 'Аннотация недоступна'
+        
+        assert get_counter('ai_request_errors') - errors == 1
+        assert get_histogram('ai_request_seconds').count - latency_count == 2
+        assert len(api.requests) == 2
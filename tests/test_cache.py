@@ -0,0 +1,212 @@
+# Tests: TTLCache, ChannelRegistry
+# Тесты LRU-кеша с TTL и реестра каналов
+
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from services.channel_registry import ChannelRegistry
+from utils.cache import TTLCache
+
+class TestTTLCache:
+    """Тесты вытеснения, истечения и статистики"""
+    
+    def test_lru_eviction(self):
+        """При переполнении вытесняется давно не использованная запись"""
+        cache = TTLCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert cache.evictions == 1
+    
+    def test_ttl_expiry(self, monkeypatch):
+        """Запись старше ttl считается отсутствующей"""
+        now = [1000.0]
+        monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+        cache = TTLCache(ttl=10)
+        cache.set('a', 1)
+        
+        now[0] += 11
+        
+        assert cache.get('a') is None
+        assert len(cache) == 0
+    
+    def test_hit_rate(self):
+        """hit_rate считает попадания среди всех обращений"""
+        cache = TTLCache()
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('b')
+        
+        assert cache.get_stats()['hits'] == 1
+        assert cache.get_stats()['misses'] == 1
+        assert cache.hit_rate == 0.5
+
+class TestChannelRegistry:
+    """Реестр каналов: одна загрузка, дальше — из памяти"""
+    
+    @pytest.mark.asyncio
+    async def test_loads_once_and_counts_hits(self):
+        """Повторные обращения не ходят в БД"""
+        registry = ChannelRegistry()
+        rows = [
+            {'id': 1, 'tg_channel_id': -1001, 'title': 'Б'},
+            {'id': 2, 'tg_channel_id': -1002, 'title': 'А'}
+        ]
+        
+        with patch('services.channel_registry.db.fetch_all', AsyncMock(return_value=rows)) as fetch_all:
+            assert await registry.get_id(-1001) == 1
+            assert await registry.get_tg_id(2) == -1002
+            channels = await registry.list_channels()
+        
+        assert fetch_all.await_count == 1
+        assert [channel['id'] for channel in channels] == [2, 1]
+        assert registry.get_stats()['hits'] == 3
+    
+    @pytest.mark.asyncio
+    async def test_add_channel_is_write_through(self):
+        """Добавленный канал сразу виден без перечитывания"""
+        registry = ChannelRegistry()
+        added = {'id': 3, 'tg_channel_id': -1003, 'title': 'В', 'created': True}
+        
+        with patch('services.channel_registry.db.fetch_all', AsyncMock(return_value=[])), \
+             patch('services.channel_registry.db.fetch_one', AsyncMock(return_value=added)) as fetch_one:
+            channel, created = await registry.add_channel(-1003, 'В')
+            assert await registry.get_id(-1003) == 3
+        
+        assert created is True
+        assert channel['title'] == 'В'
+        assert fetch_one.await_count == 1
+        assert registry.misses == 0
+    
+    @pytest.mark.asyncio
+    async def test_unknown_channel_is_looked_up(self):
+        """Канал, добавленный другой репликой, находится одним запросом"""
+        registry = ChannelRegistry()
+        row = {'id': 4, 'tg_channel_id': -1004, 'title': 'Г'}
+        
+        with patch('services.channel_registry.db.fetch_all', AsyncMock(return_value=[])), \
+             patch('services.channel_registry.db.fetch_one', AsyncMock(return_value=row)) as fetch_one:
+            assert await registry.get_id(-1004) == 4
+            assert await registry.get_id(-1004) == 4
+        
+        assert fetch_one.await_count == 1
+        assert registry.misses == 1
+
+class TestTagCache:
+    """Кеш тегов канала и клавиатура выбора тегов"""
+    
+    @pytest.mark.asyncio
+    async def test_tags_cached_until_update(self):
+        """Повторное чтение — из кеша; update_tag сбрасывает кеш канала"""
+        from services.tags import tag_service, _channel_tags_cache
+        _channel_tags_cache.clear()
+        rows = [{'id': 1, 'channel_id': 7, 'name': 'новости', 'kind': 'regular'}]
+        
+        with patch('services.tags.db.fetch_all', AsyncMock(return_value=rows)) as fetch_all, \
+             patch('services.tags.db.fetch_val', AsyncMock(return_value=7)):
+            await tag_service.get_tags_by_channel(7)
+            tags = await tag_service.get_tags_by_channel(7, kind='regular')
+            await tag_service.update_tag(1, name='анонсы')
+            await tag_service.get_tags_by_channel(7)
+        
+        assert tags == rows
+        assert fetch_all.await_count == 2
+    
+    def test_toggle_reuses_button_data(self):
+        """Переключение тега берет тексты кнопок из кеша, но клавиатуры не разделяют объекты"""
+        from utils.keyboards import get_tags_keyboard, _tag_buttons
+        tags = [{'id': 1, 'name': 'новости'}, {'id': 2, 'name': 'анонсы'}]
+        
+        first = get_tags_keyboard(tags)
+        hits_before = _tag_buttons.cache_info().hits
+        toggled = get_tags_keyboard(tags, [2])
+        
+        assert [row[0].text for row in toggled.inline_keyboard] == ['⚪ новости', '✅ анонсы', '✅ Готово']
+        assert _tag_buttons.cache_info().hits == hits_before + 1
+        first.inline_keyboard[-1].append(first.inline_keyboard[0][0])
+        first.inline_keyboard[0][0].text = 'изменено'
+        assert toggled.inline_keyboard[-1] == [toggled.inline_keyboard[-1][0]]
+        assert toggled.inline_keyboard[0][0].text == '⚪ новости'
+    
+    def test_series_keyboard_not_shared(self):
+        """Изменение выданной клавиатуры серий не попадает в следующую"""
+        from utils.keyboards import get_series_keyboard
+        series = [{'id': 3, 'title': 'Обзор', 'next_number': 4}]
+        
+        first = get_series_keyboard(series)
+        first.inline_keyboard.append([])
+        first.inline_keyboard[0][0].text = 'изменено'
+        second = get_series_keyboard(series)
+        
+        assert second is not first
+        assert [row[0].text for row in second.inline_keyboard] == ['📚 Обзор (#4)', '➕ Новая серия', '⏭️ Пропустить']
+
+class TestCacheInvalidationBus:
+    """Сброс кешей между репликами через NOTIFY"""
+    
+    @pytest.mark.asyncio
+    async def test_publish_evicts_locally_and_notifies(self):
+        """publish сбрасывает ключ у себя и отправляет сообщение"""
+        import json
+        from services.cache_bus import CacheInvalidationBus, INVALIDATION_CHANNEL
+        bus = CacheInvalidationBus()
+        cache = TTLCache(name='tags')
+        cache.set(7, ['новости'])
+        bus.subscribe('tags', cache.invalidate, cache.clear)
+        
+        with patch('services.cache_bus.db.notify', AsyncMock()) as notify:
+            await bus.publish('tags', 7)
+        
+        assert 7 not in cache
+        channel, payload = notify.await_args.args
+        assert channel == INVALIDATION_CHANNEL
+        assert json.loads(payload)['keys'] == [7]
+    
+    def test_remote_message_evicts_and_full_flush(self):
+        """Сообщение другой реплики сбрасывает ключи, 'all' — все кеши; свои сообщения пропускаются"""
+        import json
+        from services.cache_bus import CacheInvalidationBus
+        bus = CacheInvalidationBus()
+        tags, posts = TTLCache(), TTLCache()
+        tags.set(1, 'a')
+        tags.set(2, 'b')
+        posts.set(10, 'post')
+        bus.subscribe('tags', tags.invalidate, tags.clear)
+        bus.subscribe('posts', posts.invalidate, posts.clear)
+        
+        def message(kind, keys, origin='other'):
+            return json.dumps({'kind': kind, 'keys': keys, 'origin': origin, 'sent_at': time.time()})
+        
+        bus._on_notify(None, 1, 'cache_invalidation', message('tags', [2], origin=bus.origin))
+        assert 2 in tags
+        bus._on_notify(None, 1, 'cache_invalidation', message('tags', [2]))
+        assert 2 not in tags and 1 in tags
+        bus._on_notify(None, 1, 'cache_invalidation', message('all', None))
+        assert len(tags) == 0 and len(posts) == 0
+        assert bus.received == 3
+    
+    @pytest.mark.asyncio
+    async def test_subscription_survives_db_down_at_start(self):
+        """БД недоступна при start(): подписка шины восстанавливается при переподключении"""
+        from database import Database
+        from services.cache_bus import CacheInvalidationBus, INVALIDATION_CHANNEL
+        database = Database()
+        bus = CacheInvalidationBus(check_interval=3600)
+        conn = AsyncMock()
+        conn.is_closed = lambda: False
+        
+        with patch('services.cache_bus.db', database), \
+             patch('database.asyncpg.connect', AsyncMock(side_effect=[OSError('connection refused'), conn])):
+            await bus.start()
+            assert not database.is_listening
+            reconnected = await database.ensure_listening()
+            await bus.stop()
+        
+        assert reconnected
+        conn.add_listener.assert_awaited_once_with(INVALIDATION_CHANNEL, bus._on_notify)
@@ -0,0 +1,359 @@
+# Tests: Database
+# Тесты реестра именованных запросов, пула, реплики, схемы и учета времени запросов
+
+import asyncio
+
+import asyncpg
+import pytest
+from unittest.mock import AsyncMock, Mock
+from contextlib import asynccontextmanager
+
+from database import Database
+
+class CheckoutConnection:
+    """Подключение пула: как в asyncpg, PreparedStatement живет только в пределах выдачи"""
+    
+    def __init__(self):
+        self.checkout = 0
+        self.queries = []
+    
+    def get_server_pid(self):
+        return 1
+    
+    async def prepare(self, query):
+        checkout = self.checkout
+        
+        async def fetchval(*args):
+            if checkout != self.checkout:
+                raise asyncpg.exceptions.InterfaceError('statement belongs to a released connection')
+            return 42
+        
+        statement = Mock()
+        statement.fetchval = fetchval
+        return statement
+    
+    async def fetchval(self, query, *args):
+        self.queries.append(query)
+        return 42
+
+def make_db(conn) -> Database:
+    database = Database()
+    
+    @asynccontextmanager
+    async def get_connection():
+        yield conn
+    
+    database.get_connection = get_connection
+    return database
+
+class SameConnectionPool:
+    """Пул, который при каждой выдаче отдает одно и то же подключение"""
+    
+    def __init__(self, conn: CheckoutConnection):
+        self.conn = conn
+    
+    def get_max_size(self):
+        return 1
+    
+    @asynccontextmanager
+    async def acquire(self):
+        self.conn.checkout += 1
+        try:
+            yield self.conn
+        finally:
+            # После возврата в пул объекты выдачи становятся недействительными
+            self.conn.checkout += 1
+
+class TestNamedQueries:
+    """Выполнение зарегистрированного SQL и статистика по имени запроса"""
+    
+    @pytest.mark.asyncio
+    async def test_same_pooled_connection_reused(self):
+        conn = CheckoutConnection()
+        database = Database()
+        database.pool = SameConnectionPool(conn)
+        database.register_query('answer', 'SELECT 42')
+        
+        first = await database.fetch_val_named('answer')
+        second = await database.fetch_val_named('answer')
+        
+        assert (first, second) == (42, 42)
+        assert conn.queries == ['SELECT 42', 'SELECT 42']
+        stats = database.get_query_stats()
+        assert stats[0]['name'] == 'answer'
+        assert stats[0]['calls'] == 2
+    
+    @pytest.mark.asyncio
+    async def test_unregistered_query_rejected(self):
+        database = Database()
+        database.pool = SameConnectionPool(CheckoutConnection())
+        
+        with pytest.raises(KeyError):
+            await database.fetch_val_named('missing')
+    
+    def test_conflicting_registration_rejected(self):
+        database = Database()
+        database.register_query('q', 'SELECT 1')
+        
+        with pytest.raises(ValueError):
+            database.register_query('q', 'SELECT 2')
+
+class FakePool:
+    """Пул на одно подключение"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+    
+    def get_max_size(self):
+        return self.max_size
+    
+    def get_size(self):
+        return self.max_size
+    
+    def get_idle_size(self):
+        return 0
+    
+    @asynccontextmanager
+    async def acquire(self):
+        yield Mock()
+
+class TestPoolInstrumentation:
+    """Учет ожидания и занятости подключений"""
+    
+    @pytest.mark.asyncio
+    async def test_acquire_wait_and_saturation(self):
+        from utils.metrics import get_counter
+        
+        database = Database()
+        database.pool = FakePool(max_size=1)
+        saturation_before = get_counter('db_pool_saturation')
+        
+        async with database.get_connection():
+            assert database.get_pool_stats()['in_use'] == 1
+            async with database.get_connection():
+                pass
+        
+        stats = database.get_pool_stats()
+        assert stats['in_use'] == 0
+        assert stats['saturation_events'] == saturation_before + 1
+        assert stats['acquire_seconds']['count'] >= 2
+    
+    @pytest.mark.asyncio
+    async def test_metrics_command_shows_pool_snapshot(self):
+        """/metrics выводит gauge занятости пула и гистограмму ожидания подключения"""
+        from handlers.admin import _format_metrics, _split_message
+        from utils.metrics import get_metrics_snapshot
+        
+        database = Database()
+        database.pool = FakePool(max_size=2)
+        async with database.get_connection():
+            pass
+        text = _format_metrics(get_metrics_snapshot())
+        
+        assert '`db_pool_in_use`' in text
+        assert '`db_pool_acquire_seconds`' in text
+        parts = _split_message("\n".join(["x" * 100] * 100), limit=1000)
+        assert all(len(part) <= 1000 for part in parts)
+        assert "\n".join(parts).count("x") == 10000
+
+class SchemaConnection:
+    """Подключение с таблицами schema_version / schema_migrations в памяти"""
+    
+    def __init__(self, fingerprint=None, applied=None):
+        self.fingerprint = fingerprint
+        self.applied = dict(applied or {})
+        self.executed = []
+    
+    async def fetchval(self, query, *args):
+        return self.fingerprint
+    
+    async def fetch(self, query, *args):
+        return [{'name': name, 'checksum': checksum} for name, checksum in self.applied.items()]
+    
+    async def execute(self, query, *args):
+        if query.startswith('INSERT INTO schema_migrations'):
+            self.applied[args[0]] = args[1]
+        elif 'INSERT INTO schema_version' in query:
+            self.fingerprint = args[0]
+        else:
+            self.executed.append(query)
+    
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+def make_schema_db(tmp_path, conn: SchemaConnection) -> Database:
+    (tmp_path / 'migrations').mkdir()
+    (tmp_path / 'schema.sql').write_text('-- schema', encoding='utf-8')
+    (tmp_path / 'migrations' / 'b.sql').write_text('-- b', encoding='utf-8')
+    (tmp_path / 'migrations' / 'a.sql').write_text('-- a', encoding='utf-8')
+    database = make_db(conn)
+    database.schema_path = tmp_path / 'schema.sql'
+    database.migrations_dir = tmp_path / 'migrations'
+    return database
+
+class TestSchemaBootstrap:
+    """Схема применяется только при изменении отпечатка"""
+    
+    @pytest.mark.asyncio
+    async def test_pending_migrations_applied_once_in_order(self, tmp_path):
+        conn = SchemaConnection()
+        database = make_schema_db(tmp_path, conn)
+        
+        applied = await database.init_schema()
+        
+        assert applied == 2
+        assert conn.executed[1] == '-- schema'
+        assert conn.executed[2:4] == ['-- a', '-- b']
+        assert 'pg_advisory_lock' in conn.executed[0]
+        assert 'pg_advisory_unlock' in conn.executed[-1]
+        assert set(conn.applied) == {'a.sql', 'b.sql'}
+        assert conn.fingerprint is not None
+    
+    @pytest.mark.asyncio
+    async def test_current_fingerprint_executes_nothing(self, tmp_path):
+        conn = SchemaConnection()
+        database = make_schema_db(tmp_path, conn)
+        await database.init_schema()
+        conn.executed.clear()
+        
+        assert await database.init_schema() == 0
+        assert conn.executed == []
+    
+    @pytest.mark.asyncio
+    async def test_only_new_migration_applied(self, tmp_path):
+        conn = SchemaConnection()
+        database = make_schema_db(tmp_path, conn)
+        await database.init_schema()
+        (tmp_path / 'migrations' / 'c.sql').write_text('-- c', encoding='utf-8')
+        conn.executed.clear()
+        
+        assert await database.init_schema() == 1
+        assert '-- c' in conn.executed
+        assert '-- a' not in conn.executed
+
+class ReplicaConnection:
+    """Подключение реплики с заданным отставанием"""
+    
+    def __init__(self, lag: float = 0, fail: bool = False):
+        self.lag = lag
+        self.fail = fail
+        self.queries = []
+    
+    async def fetchval(self, query, *args):
+        if 'pg_last_wal_replay_lsn' in query:
+            return self.lag
+        if self.fail:
+            raise ConnectionResetError('replica went away')
+        self.queries.append(query)
+        return 'replica'
+
+class ReplicaPool:
+    def __init__(self, conn: ReplicaConnection):
+        self.conn = conn
+    
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+def make_replica_db(replica: ReplicaConnection) -> Database:
+    primary = Mock()
+    primary.fetchval = AsyncMock(return_value='primary')
+    database = make_db(primary)
+    database.replica_pool = ReplicaPool(replica)
+    return database
+
+class TestReplicaRouting:
+    """readonly-запросы идут на реплику, при отставании или ошибке — на основную БД"""
+    
+    @pytest.mark.asyncio
+    async def test_readonly_query_uses_replica(self):
+        database = make_replica_db(ReplicaConnection(lag=0))
+        
+        assert await database.fetch_val('SELECT 1', readonly=True) == 'replica'
+        assert await database.fetch_val('SELECT 1') == 'primary'
+    
+    @pytest.mark.asyncio
+    async def test_lagging_replica_falls_back_to_primary(self):
+        database = make_replica_db(ReplicaConnection(lag=3600))
+        
+        assert await database.fetch_val('SELECT 1', readonly=True) == 'primary'
+        assert database.get_replica_stats()['lag_seconds'] == 3600
+    
+    @pytest.mark.asyncio
+    async def test_replica_error_retried_on_primary(self):
+        database = make_replica_db(ReplicaConnection(fail=True))
+        
+        assert await database.fetch_val('SELECT 1', readonly=True) == 'primary'
+        assert database.get_replica_stats()['available'] is False
+
+class TimedConnection:
+    """Подключение, которое выполняет запрос за delay секунд"""
+    
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.explained = []
+    
+    async def fetchval(self, query, *args):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return 1
+    
+    async def fetch(self, query, *args):
+        self.explained.append(query)
+        return [('Seq Scan on posts',)]
+    
+    def transaction(self, readonly=False):
+        transaction = Mock()
+        transaction.start = AsyncMock()
+        transaction.rollback = AsyncMock()
+        return transaction
+
+class TestQueryTiming:
+    """Время каждого запроса, лог медленных и захват EXPLAIN"""
+    
+    @pytest.mark.asyncio
+    async def test_plain_query_timed_with_caller(self):
+        database = make_db(TimedConnection())
+        
+        await database.fetch_val("SELECT count(*) FROM posts WHERE user_id = $1", 5)
+        
+        stats = database.get_query_stats()
+        assert stats[0]['name'].startswith('select posts#')
+        assert stats[0]['caller'] == 'test_database.TestQueryTiming.test_plain_query_timed_with_caller'
+        assert stats[0]['calls'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_slow_query_logged_without_params_and_explained(self, monkeypatch, caplog):
+        from config import config
+        
+        conn = TimedConnection(delay=0.02)
+        database = make_db(conn)
+        database.pool = FakePool(max_size=1)
+        database.pool.acquire = make_db(conn).get_connection
+        monkeypatch.setattr(config, 'DB_SLOW_QUERY_MS', 10)
+        monkeypatch.setattr(config, 'DB_EXPLAIN_SLOW_QUERIES', True)
+        
+        await database.fetch_val("SELECT * FROM posts WHERE body_md = $1", 'секретный текст')
+        await asyncio.gather(*database._explain_tasks)
+        
+        assert 'Slow query' in caplog.text
+        assert 'секретный текст' not in caplog.text
+        assert "str(15)" in caplog.text
+        assert conn.explained[0].startswith('EXPLAIN (ANALYZE, BUFFERS) SELECT')
+        assert database.get_slow_query_plans()[0]['plan'] == 'Seq Scan on posts'
+    
+    @pytest.mark.asyncio
+    async def test_writes_are_not_explained(self, monkeypatch):
+        from config import config
+        
+        conn = TimedConnection(delay=0.02)
+        database = make_db(conn)
+        database.pool = FakePool(max_size=1)
+        monkeypatch.setattr(config, 'DB_SLOW_QUERY_MS', 10)
+        monkeypatch.setattr(config, 'DB_EXPLAIN_SLOW_QUERIES', True)
+        
+        await database.fetch_val("UPDATE posts SET status = $1 RETURNING id", 'published')
+        
+        assert database._explain_tasks == set()
+        assert database.get_slow_query_plans() == []
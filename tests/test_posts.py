@@ -1,3 +1,520 @@
 # Tests: posts
 
-# TODO: add tests for posts service
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from services.post_service import PostService
+
+def _claimed_post(post_id: int) -> dict:
+    return {
+        'id': post_id,
+        'body_md': f'Пост {post_id}',
+        'tg_channel_id': -100123,
+        'scheduled_at': datetime.now(timezone.utc)
+    }
+
+class TestPublishScheduledPosts:
+    """Публикация захваченных пачек отложенных постов"""
+
+    @pytest.mark.asyncio
+    async def test_publishes_claimed_batches_until_empty(self):
+        service = PostService()
+        service.claim_due_posts = AsyncMock(side_effect=[[_claimed_post(1), _claimed_post(2)], [_claimed_post(3)], []])
+        service.write_publish_results = AsyncMock()
+        service._mark_failed_posts = AsyncMock()
+        publisher = Mock()
+        publisher.publish_post = AsyncMock(return_value={'success_count': 1, 'success': [{'message_id': 10}]})
+        publisher.get_channel_message_ids = Mock(return_value={})
+
+        with patch('services.publisher.get_publisher', return_value=publisher):
+            published = await service.publish_scheduled_posts(bot=None)
+
+        assert published == 3
+        assert service.claim_due_posts.await_count == 3
+        # Одна запись итогов на пачку, а не UPDATE на каждый пост
+        assert service.write_publish_results.await_count == 2
+        first_batch = service.write_publish_results.await_args_list[0].args[0]
+        assert [outcome['post_id'] for outcome in first_batch] == [1, 2]
+        assert all(outcome['message_id'] for outcome in first_batch)
+
+    @pytest.mark.asyncio
+    async def test_failed_posts_are_rescheduled(self):
+        service = PostService()
+        service.claim_due_posts = AsyncMock(side_effect=[[_claimed_post(1), _claimed_post(2)], []])
+        service.write_publish_results = AsyncMock()
+        service._mark_failed_posts = AsyncMock()
+        publisher = Mock()
+        publisher.max_retries = 3
+        publisher.get_retry_delay = Mock(return_value=5.0)
+        publisher.get_channel_message_ids = Mock(return_value={})
+        publisher.publish_post = AsyncMock(side_effect=[
+            {'success_count': 1, 'success': [{'message_id': 10}]},
+            {'success_count': 0, 'success': [], 'failed': [{'error': 'Flood', 'retry_after': 5}]}
+        ])
+
+        with patch('services.publisher.get_publisher', return_value=publisher):
+            published = await service.publish_scheduled_posts(bot=None)
+
+        assert published == 1
+        outcomes = service.write_publish_results.await_args.args[0]
+        assert [(o['post_id'], o['message_id']) for o in outcomes] == [(1, 10), (2, None)]
+        assert outcomes[1]['retry_delay'] is not None
+
+    @pytest.mark.asyncio
+    async def test_retry_delay_and_give_up(self):
+        service = PostService()
+        publisher = Mock()
+        publisher.max_retries = 3
+        publisher.get_retry_delay = Mock(return_value=4.0)
+
+        retry = service._failed_outcome(publisher, {'id': 1, 'publish_attempts': 1}, 'Flood', 4)
+        give_up = service._failed_outcome(publisher, {'id': 2, 'publish_attempts': 3}, 'Bad Request', None)
+
+        assert retry['retry_delay'] == 4.0
+        publisher.get_retry_delay.assert_called_once_with(2, 4)
+        assert give_up['retry_delay'] is None
+        assert give_up['error'] == 'Bad Request'
+    
+    @pytest.mark.asyncio
+    async def test_partial_album_ids_saved_and_resumed(self):
+        """Отправленные части альбома сохраняются с неудачной попыткой и передаются повтору"""
+        service = PostService()
+        publisher = Mock()
+        publisher.max_retries = 3
+        publisher.get_retry_delay = Mock(return_value=5.0)
+        publisher.get_channel_message_ids = Mock(return_value={'-100123': [1, 2, 3, 4, 5, 6]})
+        publisher.publish_post = AsyncMock(return_value={
+            'success_count': 0, 'success': [],
+            'failed': [{'channel_id': -100123, 'error': 'timeout', 'message_ids': [1, 2, 3, 4, 5, 6]}]
+        })
+        post = {**_claimed_post(1), 'channel_message_ids': '{"-100123": [1, 2, 3]}'}
+        
+        outcome = await service._publish_claimed_post(publisher, post)
+        
+        assert outcome['channel_message_ids'] == {'-100123': [1, 2, 3, 4, 5, 6]}
+        assert outcome['retry_delay'] == 5.0
+        post_data = publisher.publish_post.await_args.args[0]
+        assert post_data['sent_message_ids'] == {'-100123': [1, 2, 3]}
+    
+    def test_permanent_error_fails_without_retry(self):
+        """Постоянная ошибка сразу переводит пост в failed, даже если попытки остались"""
+        service = PostService()
+        publisher = Mock()
+        publisher.max_retries = 3
+        publisher.get_retry_delay = Mock(return_value=4.0)
+        
+        outcome = service._failed_outcome(
+            publisher, {'id': 1, 'publish_attempts': 0}, 'Bad Request: chat not found', None, permanent=True
+        )
+        
+        assert outcome['retry_delay'] is None
+        publisher.get_retry_delay.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_lease_renewed_and_lost_posts_skipped(self):
+        """Долгая пачка продлевает аренду; посты, забранные другой репликой, не отправляются"""
+        service = PostService()
+        service.write_publish_results = AsyncMock()
+        service.renew_claims = AsyncMock(return_value=set())
+        publisher = Mock()
+        publisher.get_channel_message_ids = Mock(return_value={})
+        
+        async def slow_publish(post_data, chat_ids, update_db=False):
+            await asyncio.sleep(0.05)
+            return {'success_count': 1, 'success': [{'message_id': post_data['id'] * 10}]}
+        publisher.publish_post = slow_publish
+        
+        with patch('services.publisher.get_publisher', return_value=publisher), \
+             patch('services.post_service.config.PUBLISH_LEASE_SECONDS', 0.03):
+            published, failed = await service.publish_claimed_posts([_claimed_post(1), _claimed_post(2)])
+        
+        assert (published, failed) == (1, [])
+        # Продлевается и отправляемый сейчас пост, и ожидающий очереди
+        assert sorted(service.renew_claims.await_args_list[0].args[0]) == [1, 2]
+        outcomes = service.write_publish_results.await_args.args[0]
+        assert [outcome['post_id'] for outcome in outcomes] == [1]
+    
+    @pytest.mark.asyncio
+    async def test_writeback_only_for_own_claims(self):
+        """Итог пишется только пока пост захвачен этой репликой"""
+        service = PostService()
+        outcomes = [
+            {'post_id': 1, 'message_id': 10, 'published_at': datetime.now(timezone.utc)},
+            {'post_id': 2, 'message_id': None, 'error': 'Flood', 'retry_delay': 5.0}
+        ]
+        
+        with patch('services.post_service.db.fetch_all', AsyncMock(return_value=[{'id': 1}])) as fetch_all, \
+             patch('services.post_service.db.execute', AsyncMock()) as execute, \
+             patch('services.post_service.config.INSTANCE_ID', 'bot-1'):
+            written = await service.write_publish_results(outcomes)
+            await service.write_publish_results(outcomes[:1], claimed=False)
+        
+        assert written == 1
+        assert 'p.claimed_by = $7' in fetch_all.await_args_list[0].args[0]
+        assert 'CASE WHEN r.message_id IS NULL THEN 1 ELSE 0 END' in fetch_all.await_args_list[0].args[0]
+        assert fetch_all.await_args_list[0].args[-1] == 'bot-1'
+        assert fetch_all.await_args_list[1].args[-1] is None
+        # Повтор поста 2 записала другая реплика — диспетчер не уведомляется
+        execute.assert_not_awaited()
+
+class TestScheduleChanges:
+    """Отмена и перенос поста уведомляют диспетчер по числу измененных строк"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('method, args', [
+        ('cancel_scheduled_post', (5,)),
+        ('retry_failed_post', (5,)),
+        ('update_scheduled_time', (5, datetime(2030, 1, 1, tzinfo=timezone.utc)))
+    ])
+    async def test_notify_only_when_row_changed(self, method, args):
+        service = PostService()
+        service._notify_schedule_changed = AsyncMock()
+
+        with patch('services.post_service.db.execute', AsyncMock(side_effect=['UPDATE 1', 'UPDATE 0'])), \
+             patch('services.post_service.cache_bus.publish', AsyncMock()):
+            changed = await getattr(service, method)(*args)
+            unchanged = await getattr(service, method)(*args)
+
+        assert (changed, unchanged) == (True, False)
+        service._notify_schedule_changed.assert_awaited_once_with(5)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('method, args', [
+        ('cancel_scheduled_post', (5,)),
+        ('update_scheduled_time', (5, datetime(2030, 1, 1, tzinfo=timezone.utc)))
+    ])
+    async def test_payload_invalidated_only_when_row_changed(self, method, args):
+        from services.cache_bus import POSTS
+        service = PostService()
+        service._notify_schedule_changed = AsyncMock()
+
+        with patch('services.post_service.db.execute', AsyncMock(side_effect=['UPDATE 1', 'UPDATE 0'])), \
+             patch('services.post_service.cache_bus.publish', AsyncMock()) as publish:
+            await getattr(service, method)(*args)
+            await getattr(service, method)(*args)
+
+        publish.assert_awaited_once_with(POSTS, 5)
+
+    @pytest.mark.asyncio
+    async def test_mark_failed_posts_parses_status(self, caplog):
+        caplog.set_level('INFO', logger='services.post_service')
+        service = PostService()
+
+        with patch('services.post_service.db.execute', AsyncMock(return_value='UPDATE 3')):
+            await service._mark_failed_posts()
+
+        assert 'Помечено 3 постов' in caplog.text
+        assert 'Ошибка обработки' not in caplog.text
+
+class FakeUnitOfWork:
+    def __init__(self, row):
+        self.row = row
+        self.queries = []
+        self.notified = []
+        self.round_trips = 0
+
+    async def fetch_one(self, query, *args):
+        self.queries.append((query, args))
+        return self.row
+
+    async def notify(self, channel, payload=''):
+        self.notified.append(payload)
+
+def _fake_transaction(uow):
+    @asynccontextmanager
+    async def transaction():
+        yield uow
+    return transaction
+
+class TestCreatePost:
+    """Создание поста одним запросом в транзакции"""
+
+    @pytest.mark.asyncio
+    async def test_single_statement_with_tags_and_series(self):
+        uow = FakeUnitOfWork({'id': 7, 'channel_id': 3, 'series_number': 5})
+        service = PostService()
+
+        with patch('services.post_service.db.transaction', _fake_transaction(uow)):
+            post_id = await service.create_post(
+                -100123, 'T', 'Текст', 1, series_id=2,
+                scheduled_at=datetime(2030, 1, 1, tzinfo=timezone.utc), tag_ids=[4, 5]
+            )
+
+        assert post_id == 7
+        assert len(uow.queries) == 1
+        query, args = uow.queries[0]
+        assert 'unnest($12::bigint[])' in query
+        assert args[-1] == [4, 5]
+        assert uow.notified == ['7']
+
+    @pytest.mark.asyncio
+    async def test_unknown_channel_raises(self):
+        uow = FakeUnitOfWork(None)
+        service = PostService()
+
+        with patch('services.post_service.db.transaction', _fake_transaction(uow)):
+            with pytest.raises(ValueError):
+                await service.create_post(-1, None, 'Текст', 1)
+
+        assert uow.notified == []
+
+class TestUserPostsListing:
+    """Листание «Мои посты» по ключу (created_at, id)"""
+
+    @pytest.mark.asyncio
+    async def test_one_page_and_has_more(self):
+        rows = [{'id': i, 'created_at': datetime(2026, 1, i, tzinfo=timezone.utc)} for i in range(11, 0, -1)]
+        service = PostService()
+
+        with patch('services.post_service.db.fetch_all_named', AsyncMock(return_value=rows)) as fetch:
+            page = await service.list_user_posts(1, limit=10)
+
+        assert [post['id'] for post in page['posts']] == list(range(11, 1, -1))
+        assert page['has_more'] is True
+        assert fetch.await_args.args[:3] == ('user_posts_first', 1, 11)
+
+    @pytest.mark.asyncio
+    async def test_backward_page_in_display_order(self):
+        cursor = (datetime(2026, 1, 5, tzinfo=timezone.utc), 5)
+        rows = [{'id': 6}, {'id': 7}]
+        service = PostService()
+
+        with patch('services.post_service.db.fetch_all_named', AsyncMock(return_value=rows)) as fetch:
+            page = await service.list_user_posts(1, cursor, backward=True, limit=10)
+
+        assert [post['id'] for post in page['posts']] == [7, 6]
+        assert page['has_more'] is False
+        assert fetch.await_args.args[0] == 'user_posts_before'
+
+    def test_cursor_round_trip_fits_callback_data(self):
+        from utils.pagination import decode_cursor, encode_cursor, get_pagination_manager
+
+        key = (datetime(2026, 10, 17, 12, 30, 1, 123456, tzinfo=timezone.utc), 9_000_000_123)
+        assert decode_cursor(encode_cursor(*key)) == key
+
+        page_info = get_pagination_manager().get_cursor_page_info(
+            total_items=50_000, current_page=4999, items_on_page=10,
+            has_previous=True, has_next=True, callback_prefix='posts',
+            first_key=key, last_key=key
+        )
+        assert page_info['total_pages'] == 5000
+        assert len(page_info['next_callback'].encode()) <= 64
+        assert page_info['prev_callback'].startswith('posts_prev_4998_')
+
+class TestPostFiltersSQL:
+    """Фильтры PostFilters компилируются в параметризованный SQL"""
+
+    def test_filters_and_cursor_in_query(self):
+        from utils.post_filters import PostFilters
+
+        now = datetime(2026, 10, 17, 12, 0, tzinfo=timezone.utc)
+        cursor = (datetime(2026, 10, 16, tzinfo=timezone.utc), 42)
+        query, params = PostFilters().build_query(
+            {'date': 'week', 'status': 'published', 'sort': 'date_desc'},
+            user_id=1, cursor=cursor, limit=11, now=now
+        )
+
+        assert 'p.user_id = $1' in query
+        assert 'p.status = $2' in query
+        assert 'p.created_at >= $3' in query
+        assert '(p.created_at, p.id) < ($4, $5)' in query
+        assert ' OR ' not in query
+        assert 'ORDER BY p.created_at DESC, p.id DESC' in query
+        assert 'LIMIT $6' in query
+        assert params == [1, 'published', datetime(2026, 10, 10, 12, 0, tzinfo=timezone.utc), *cursor, 11]
+
+    def test_ascending_sort_uses_row_comparison(self):
+        from utils.post_filters import PostFilters
+
+        cursor = (datetime(2026, 10, 16, tzinfo=timezone.utc), 42)
+        query, params = PostFilters().build_query({'sort': 'date_asc'}, channel_id=5, cursor=cursor)
+
+        assert '(p.created_at, p.id) > ($2, $3)' in query
+        assert 'ORDER BY p.created_at ASC, p.id ASC' in query
+        assert params[:3] == [5, *cursor]
+
+    def test_mixed_direction_sort(self):
+        from utils.post_filters import PostFilters
+
+        filters = {'date': 'all', 'status': 'all', 'sort': 'status'}
+        post = {'status': 'draft', 'created_at': datetime(2026, 1, 1, tzinfo=timezone.utc), 'id': 3}
+        post_filters = PostFilters()
+        query, params = post_filters.build_query(filters, channel_id=5, cursor=post_filters.cursor_from_post(post, filters))
+
+        assert '(p.status > $2 OR (p.status = $2 AND (p.created_at < $3 OR (p.created_at = $3 AND p.id < $4))))' in query
+        assert 'ORDER BY p.status ASC, p.created_at DESC, p.id DESC' in query
+        assert params[:4] == [5, 'draft', post['created_at'], 3]
+
+    def test_today_window_uses_bot_timezone(self):
+        from utils.post_filters import PostFilters
+        from utils.timezone_utils import TIMEZONE
+
+        start = PostFilters().date_window_start('today', datetime(2026, 10, 17, 22, 30, tzinfo=timezone.utc))
+
+        assert start.tzinfo is not None
+        assert start.astimezone(TIMEZONE).hour == 0
+        assert start <= datetime(2026, 10, 17, 22, 30, tzinfo=timezone.utc)
+
+class TestBacklogDrainer:
+    """Догоняющая публикация просроченных постов"""
+
+    @pytest.mark.asyncio
+    async def test_pages_through_backlog_by_keyset(self):
+        from services.backlog_drainer import BacklogDrainer
+
+        first_page = [_claimed_post(1), _claimed_post(2)]
+        second_page = [_claimed_post(3)]
+        drainer = BacklogDrainer(max_rate=1000, page_size=2)
+
+        with patch('services.backlog_drainer.post_service') as service:
+            service.count_overdue_posts = AsyncMock(return_value=3)
+            service.claim_overdue_posts = AsyncMock(side_effect=[first_page, second_page, []])
+            service.publish_claimed_posts = AsyncMock(side_effect=[(2, []), (0, [3])])
+
+            published = await drainer.drain()
+
+        assert published == 2
+        # Каждая следующая страница начинается после ключа последнего поста
+        cursors = [call.args[0] for call in service.claim_overdue_posts.await_args_list]
+        assert cursors == [None, (first_page[-1]['scheduled_at'], 2), (second_page[-1]['scheduled_at'], 3)]
+        stats = drainer.get_stats()
+        assert (stats['total'], stats['processed'], stats['published'], stats['failed']) == (3, 3, 2, 1)
+
+class TestPayloadCache:
+    """Заранее подготовленные данные постов"""
+
+    @pytest.mark.asyncio
+    async def test_claimed_posts_use_warm_payloads(self):
+        updated_at = datetime.now(timezone.utc)
+        row = {'id': 42, 'body_md': 'текст', 'entities': None, 'media_data': None,
+               'tg_channel_id': -100123, 'updated_at': updated_at}
+        service = PostService()
+
+        with patch('services.post_service.db') as db:
+            db.fetch_all = AsyncMock(return_value=[row])
+            await service.warm_payloads([42])
+            claimed = [{'id': 42, 'updated_at': updated_at, 'tg_channel_id': -100123}]
+            await service._attach_payloads(claimed)
+
+        # Второй раз БД не нужна: пост уже подготовлен
+        assert db.fetch_all.await_count == 1
+        assert claimed[0]['post_data']['body_md'] == 'текст'
+        assert claimed[0]['chat_ids'] == [-100123]
+        service.invalidate_payload(42)
+
+    @pytest.mark.asyncio
+    async def test_stale_payload_is_reloaded(self):
+        old = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        new = datetime(2026, 1, 2, tzinfo=timezone.utc)
+        service = PostService()
+
+        with patch('services.post_service.db') as db:
+            db.fetch_all = AsyncMock(side_effect=[
+                [{'id': 7, 'body_md': 'старый', 'tg_channel_id': -1, 'updated_at': old}],
+                [{'id': 7, 'body_md': 'новый', 'tg_channel_id': -1, 'updated_at': new}]
+            ])
+            await service.warm_payloads([7])
+            claimed = [{'id': 7, 'updated_at': new, 'tg_channel_id': -1}]
+            await service._attach_payloads(claimed)
+
+        assert claimed[0]['body_md'] == 'новый'
+        service.invalidate_payload(7)
+
+class TestPublishEngine:
+    """Пул воркеров с шардированием по каналу"""
+
+    @pytest.mark.asyncio
+    async def test_slow_channel_does_not_block_others(self):
+        import asyncio
+        from services.publish_engine import PublishEngine
+
+        engine = PublishEngine(workers=2, queue_size=10)
+        slow_started = asyncio.Event()
+        release_slow = asyncio.Event()
+        order = []
+
+        async def handler(post):
+            if post['tg_channel_id'] == 0:
+                slow_started.set()
+                await release_slow.wait()
+            order.append(post['id'])
+            return {'post_id': post['id'], 'message_id': post['id']}
+
+        posts = [
+            {'id': 1, 'tg_channel_id': 0},
+            {'id': 2, 'tg_channel_id': 0},
+            {'id': 3, 'tg_channel_id': 1},
+            {'id': 4, 'tg_channel_id': 1}
+        ]
+        run = asyncio.create_task(engine.run(posts, handler))
+        await slow_started.wait()
+        await asyncio.sleep(0.01)
+        # Канал 1 опубликован, пока канал 0 ждет
+        assert order == [3, 4]
+        release_slow.set()
+        outcomes = await run
+        await engine.stop()
+
+        assert [o['post_id'] for o in outcomes] == [1, 2, 3, 4]
+        # Порядок внутри канала сохраняется
+        assert order == [3, 4, 1, 2]
+        assert engine.get_stats()['workers'] == 2
+
+class TestChannelCounters:
+    """Статистика каналов из channel_post_counters вместо COUNT по posts"""
+
+    @pytest.mark.asyncio
+    async def test_export_stats_read_counters(self):
+        from services.export import export_service
+
+        totals = {
+            'posts_count': 12, 'published_count': 7, 'scheduled_count': 2, 'draft_count': 1,
+            'deleted_count': 1, 'failed_count': 1, 'media_posts_count': 3, 'scheduled_posts_count': 4
+        }
+        channels = [{'title': 'A', 'posts_count': 2}, {'title': 'B', 'posts_count': 10}]
+
+        with patch('services.channel_stats.db.fetch_one', AsyncMock(return_value=totals)) as fetch_one, \
+             patch('services.channel_stats.db.fetch_all', AsyncMock(return_value=channels)) as fetch_all:
+            stats = await export_service.get_export_stats()
+
+        assert stats['total_posts'] == 12
+        assert stats['failed_posts'] == 1
+        assert [channel['title'] for channel in stats['channels']] == ['B', 'A']
+        for query in (fetch_one.await_args.args[0], fetch_all.await_args.args[0]):
+            assert 'channel_post_counters' in query
+            assert 'GROUP BY' not in query
+        assert fetch_one.await_args.kwargs['readonly'] is True
+
+    @pytest.mark.asyncio
+    async def test_rebuild_reports_drift(self):
+        from services.channel_stats import channel_stats_service
+
+        drift = [{'channel_id': 1, 'status': 'published', 'counted': 4, 'actual': 5}]
+        with patch('services.channel_stats.db.fetch_all', AsyncMock(return_value=drift)), \
+             patch('services.channel_stats.db.execute', AsyncMock()) as execute:
+            fixed = await channel_stats_service.rebuild()
+
+        assert fixed == 1
+        execute.assert_awaited_once_with("SELECT rebuild_channel_post_counters()")
+
+    def test_counters_use_ordered_statement_triggers(self):
+        """Счетчики ведут statement-level триггеры с упорядоченным применением, построчного нет"""
+        from pathlib import Path
+
+        deploy = Path(__file__).resolve().parent.parent / 'deploy'
+        migrations = sorted(path.name for path in (deploy / 'migrations').glob('*.sql'))
+        # Миграция выполняется после первой версии счетчиков и удаляет ее построчный триггер
+        assert migrations.index('add_channel_post_counters_statement_trigger.sql') > \
+            migrations.index('add_channel_post_counters.sql')
+
+        for path in (deploy / 'schema.sql', deploy / 'migrations' / 'add_channel_post_counters_statement_trigger.sql'):
+            sql = path.read_text(encoding='utf-8')
+            assert 'for each row execute function channel_post_counters' not in sql
+            assert sql.count('for each statement execute function channel_post_counters_stmt_trg()') == 3
+            assert 'order by r.channel_id, r.status' in sql
+            assert 'order by e.channel_id, e.day' in sql
+            assert 'drop trigger if exists posts_channel_counters on posts;' in sql
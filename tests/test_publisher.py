@@ -1,12 +1,16 @@
 # Tests: PostPublisher
 # Тесты для централизованного сервиса публикации постов
 
+import asyncio
 import pytest
 from unittest.mock import Mock, AsyncMock
 from aiogram.types import Message, MessageEntity
 from aiogram.enums import MessageEntityType
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMediaGroup, SendMessage
 
-from services.publisher import PostPublisher
+from services.publisher import PostPublisher, split_media_group
+from utils.rate_limiter import TokenBucket, TelegramRateLimiter
 
 @pytest.fixture
 def mock_bot():
@@ -185,6 +189,284 @@ class TestPostPublisher:
         assert publisher._has_markdown_formatting("plain text") == False
         assert publisher._has_markdown_formatting("") == False
 
+class TestPublishPostFanOut:
+    """Тесты параллельной публикации поста в несколько каналов"""
+    
+    @pytest.mark.asyncio
+    async def test_publish_post_partial_failure(self, publisher):
+        """Результат сохраняет форму и порядок каналов при частичных ошибках"""
+        # Arrange
+        channel_ids = [-1001, -1002, -1003]
+        
+        async def fake_publish(post_data, channel_id):
+            if channel_id == -1002:
+                raise RuntimeError("boom")
+            if channel_id == -1003:
+                return None
+            message = Mock()
+            message.message_id = 77
+            return message
+        
+        publisher._publish_to_channel = fake_publish
+        
+        # Act
+        results = await publisher.publish_post({'id': 1, 'body_md': 'text'}, channel_ids, update_db=False)
+        
+        # Assert
+        assert results['total_channels'] == 3
+        assert results['success_count'] == 1
+        assert results['failed_count'] == 2
+        assert results['success'][0]['channel_id'] == -1001
+        assert results['success'][0]['message_id'] == 77
+        assert [item['channel_id'] for item in results['failed']] == [-1002, -1003]
+        assert results['failed'][0]['error'] == 'boom'
+    
+    @pytest.mark.asyncio
+    async def test_publish_post_runs_channels_concurrently(self, publisher):
+        """Каналы публикуются параллельно, но не больше max_concurrency сразу"""
+        # Arrange
+        publisher.max_concurrency = 2
+        in_flight = 0
+        peak = 0
+        
+        async def fake_publish(post_data, channel_id):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            message = Mock()
+            message.message_id = abs(channel_id)
+            return message
+        
+        publisher._publish_to_channel = fake_publish
+        
+        # Act
+        results = await publisher.publish_post({'id': 1, 'body_md': 'text'}, [-1, -2, -3, -4, -5], update_db=False)
+        
+        # Assert
+        assert results['success_count'] == 5
+        assert peak == 2
+    
+    @pytest.mark.asyncio
+    async def test_publish_post_honours_retry_after(self, publisher):
+        """RetryAfter ставит канал на паузу и не ждет повтора внутри публикации"""
+        # Arrange
+        publisher.rate_limiter = TelegramRateLimiter(group_chat_per_minute=6000)
+        publisher._publish_to_channel = AsyncMock(side_effect=TelegramRetryAfter(
+            method=SendMessage(chat_id=-1, text='x'), message='Flood', retry_after=7
+        ))
+        
+        # Act
+        results = await publisher.publish_post({'id': 1, 'body_md': 'text'}, [-1], update_db=False)
+        
+        # Assert
+        assert results['success_count'] == 0
+        assert results['failed'][0]['retry_after'] == 7
+        assert publisher._publish_to_channel.call_count == 1
+        assert publisher.rate_limiter.retry_after_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_publish_post_marks_permanent_errors(self, publisher, mock_bot):
+        """BadRequest (канал не найден) — постоянная ошибка, RetryAfter — временная"""
+        # Arrange
+        publisher.rate_limiter = TelegramRateLimiter(group_chat_per_minute=6000)
+        mock_bot.send_message.side_effect = [
+            TelegramBadRequest(method=SendMessage(chat_id=-1, text='x'), message='Bad Request: chat not found'),
+            TelegramRetryAfter(method=SendMessage(chat_id=-2, text='x'), message='Flood', retry_after=3)
+        ]
+        publisher.max_concurrency = 1
+        
+        # Act
+        results = await publisher.publish_post({'id': 1, 'body_md': 'text'}, [-1, -2], update_db=False)
+        
+        # Assert
+        assert [item['permanent'] for item in results['failed']] == [True, False]
+        assert 'chat not found' in results['failed'][0]['error']
+    
+    def test_retry_delay_grows_with_jitter(self, publisher):
+        """Задержка удваивается с каждой попыткой и не превышает потолок"""
+        publisher.retry_delay = 2.0
+        publisher.max_retry_delay = 10.0
+        
+        assert 1.0 <= publisher.get_retry_delay(1) <= 2.0
+        assert 4.0 <= publisher.get_retry_delay(3) <= 8.0
+        assert 5.0 <= publisher.get_retry_delay(10) <= 10.0
+    
+    def test_retry_delay_respects_retry_after(self, publisher):
+        """retry_after от Telegram — нижняя граница задержки"""
+        publisher.retry_delay = 1.0
+        
+        assert publisher.get_retry_delay(1, retry_after=30) == 30.0
+
+class TestMediaGroup:
+    """Тесты публикации альбомов"""
+    
+    @pytest.mark.asyncio
+    async def test_album_sent_as_single_media_group(self, publisher, mock_bot):
+        """Список медиа отправляется одним sendMediaGroup с подписью у первого элемента"""
+        # Arrange
+        messages = [Mock(message_id=10), Mock(message_id=11), Mock(message_id=12)]
+        mock_bot.send_media_group = AsyncMock(return_value=messages)
+        post_data = {
+            'id': 1,
+            'body_md': 'Подпись',
+            'media_data': [
+                {'type': 'photo', 'file_id': 'a'},
+                {'type': 'photo', 'file_id': 'b'},
+                {'type': 'video', 'file_id': 'c'}
+            ]
+        }
+        
+        # Act
+        results = await publisher.publish_post(post_data, [-100], update_db=False)
+        
+        # Assert
+        mock_bot.send_media_group.assert_called_once()
+        media = mock_bot.send_media_group.call_args.kwargs['media']
+        assert [item.media for item in media] == ['a', 'b', 'c']
+        assert media[0].caption == 'Подпись'
+        assert media[1].caption is None
+        assert results['success'][0]['message_id'] == 10
+        assert publisher.get_channel_message_ids(results) == {'-100': [10, 11, 12]}
+    
+    def test_split_media_group_balanced(self):
+        """Части альбома почти равные и не меньше двух элементов"""
+        assert split_media_group(2) == [2]
+        assert split_media_group(10) == [10]
+        assert split_media_group(11) == [6, 5]
+        assert split_media_group(21) == [7, 7, 7]
+    
+    @pytest.mark.asyncio
+    async def test_partial_album_resumes_from_unsent_chunk(self, publisher, mock_bot):
+        """Ошибка второй части сохраняет ID первой; повтор отправляет только вторую"""
+        # Arrange
+        publisher.rate_limiter = TelegramRateLimiter(group_chat_per_minute=6000)
+        first_chunk = [Mock(message_id=i) for i in range(1, 7)]
+        second_chunk = [Mock(message_id=i) for i in range(7, 12)]
+        mock_bot.send_media_group = AsyncMock(side_effect=[
+            first_chunk,
+            TelegramNetworkError(method=SendMediaGroup(chat_id=-100, media=[]), message='timeout'),
+            second_chunk
+        ])
+        post_data = {
+            'id': 1,
+            'body_md': 'Подпись',
+            'media_data': [{'type': 'photo', 'file_id': str(i)} for i in range(11)]
+        }
+        
+        # Act
+        failed = await publisher.publish_post(post_data, [-100], update_db=False)
+        sent = publisher.get_channel_message_ids(failed)
+        resumed = await publisher.publish_post({**post_data, 'sent_message_ids': sent}, [-100], update_db=False)
+        
+        # Assert
+        assert failed['success_count'] == 0
+        assert failed['failed'][0]['permanent'] is False
+        assert sent == {'-100': [1, 2, 3, 4, 5, 6]}
+        sizes = [len(call.kwargs['media']) for call in mock_bot.send_media_group.call_args_list]
+        assert sizes == [6, 5, 5]
+        assert publisher.get_channel_message_ids(resumed) == {'-100': list(range(1, 12))}
+        assert resumed['success'][0]['message_id'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_mixed_document_album_rejected(self, publisher, mock_bot):
+        """Документ вместе с фото не отправляется и считается постоянной ошибкой"""
+        # Arrange
+        mock_bot.send_media_group = AsyncMock()
+        post_data = {
+            'id': 1,
+            'body_md': '',
+            'media_data': [{'type': 'photo', 'file_id': 'a'}, {'type': 'document', 'file_id': 'b'}]
+        }
+        
+        # Act
+        results = await publisher.publish_post(post_data, [-100], update_db=False)
+        
+        # Assert
+        mock_bot.send_media_group.assert_not_called()
+        assert results['failed'][0]['permanent'] is True
+    
+    @pytest.mark.asyncio
+    async def test_delete_post_messages_removes_album(self, publisher, mock_bot):
+        """Удаление поста удаляет все элементы альбома"""
+        # Arrange
+        mock_bot.delete_messages = AsyncMock()
+        post = {'message_id': 10, 'channel_message_ids': '{"-100": [10, 11, 12]}'}
+        
+        # Act
+        deleted = await publisher.delete_post_messages(post, -100)
+        
+        # Assert
+        assert deleted
+        mock_bot.delete_messages.assert_called_once_with(chat_id=-100, message_ids=[10, 11, 12])
+
+class TestFakeTelegramAPI:
+    """Публикация через локальный fake Bot API (настоящий HTTP вместо Mock)"""
+    
+    @pytest.mark.asyncio
+    async def test_publish_post_end_to_end(self):
+        """Текст и альбом доходят до сервера, 429 превращается в retry_after"""
+        # Arrange
+        from tests.fake_telegram_api import FakeTelegramAPI
+        api = FakeTelegramAPI(flood_every=3, retry_after=2)
+        await api.start()
+        bot = api.make_bot()
+        publisher = PostPublisher(bot)
+        publisher.rate_limiter = TelegramRateLimiter(group_chat_per_minute=6000)
+        
+        try:
+            # Act
+            text_results = await publisher.publish_post({'id': 1, 'body_md': 'Текст'}, [-1, -2, -3], update_db=False)
+            album_results = await publisher.publish_post({
+                'id': 2,
+                'body_md': 'Альбом',
+                'media_data': [{'type': 'photo', 'file_id': 'a'}, {'type': 'photo', 'file_id': 'b'}]
+            }, [-4], update_db=False)
+        finally:
+            await bot.session.close()
+            await api.stop()
+        
+        # Assert
+        assert text_results['success_count'] == 2
+        assert text_results['failed'][0]['retry_after'] == 2
+        assert album_results['success'][0]['message_ids'] == [3, 4]
+        assert api.calls['sendmediagroup'] == 1
+
+class TestRateLimiter:
+    """Тесты token bucket лимитера"""
+    
+    def test_token_bucket_waits_when_empty(self):
+        """После исчерпания токенов нужно ждать 1/rate секунд"""
+        bucket = TokenBucket(rate=2, capacity=1)
+        now = bucket.updated
+        
+        assert bucket.wait_time(now) == 0
+        bucket.consume(now)
+        assert bucket.wait_time(now) == pytest.approx(0.5)
+        assert bucket.wait_time(now + 0.5) == 0
+    
+    def test_token_bucket_block(self):
+        """RetryAfter блокирует bucket на указанное время"""
+        bucket = TokenBucket(rate=100, capacity=10)
+        now = bucket.updated
+        
+        bucket.block(now, 3)
+        
+        assert bucket.wait_time(now) == pytest.approx(3)
+    
+    @pytest.mark.asyncio
+    async def test_per_chat_limit_is_independent(self):
+        """Лимит одного чата не задерживает другой"""
+        limiter = TelegramRateLimiter(global_rate=100, group_chat_per_minute=600, group_burst=1)
+        
+        assert await limiter.acquire(-1) == 0
+        assert await limiter.acquire(-2) == 0
+        limiter.on_retry_after(-1, 30)
+        assert await limiter.acquire(-2) > 0  # тот же чат ждет пополнения (10 в секунду)
+        
+        assert limiter.get_stats()['retry_after_count'] == 1
+
 class TestEntitiesUtils:
     """Тесты для утилит работы с entities"""
     
@@ -0,0 +1,85 @@
+"""
+@file: utils/cache.py
+@description: Ограниченный по размеру in-memory кеш (LRU) с TTL и статистикой попаданий
+@dependencies: -
+@created: 2026-10-17
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+class TTLCache:
+    """LRU-кеш на maxsize записей; записи старше ttl секунд считаются отсутствующими"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, name: str = 'cache'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        # key -> (expires_at или None, value); порядок — от давно использованных к свежим
+        self._data: 'OrderedDict[Hashable, Tuple[Optional[float], Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Значение по ключу или default; учитывается в hit/miss"""
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING:
+            expires_at, value = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Кладет значение; при переполнении вытесняет давно не использованные"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Удаляет запись, возвращает True если она была"""
+        return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self) -> None:
+        """Очищает кеш (статистика сохраняется)"""
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Есть ли живая запись (без учета в статистике)"""
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return False
+        expires_at = entry[0]
+        return expires_at is None or expires_at > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        """Доля попаданий среди всех обращений"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика кеша"""
+        return {
+            'name': self.name,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hit_rate, 4)
+        }
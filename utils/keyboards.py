@@ -1,7 +1,8 @@
 # Utils: keyboards
 
+from functools import lru_cache
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
-from typing import List
+from typing import List, Tuple
 
 def get_main_menu_keyboard() -> ReplyKeyboardMarkup:
     """Админ-панель бота"""
@@ -33,36 +34,52 @@ def get_post_advanced_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+# Кешируются только неизменяемые (text, callback_data): aiogram-модели кнопок
+# и клавиатур изменяемы, поэтому объекты собираются заново на каждый вызов
+
+@lru_cache(maxsize=256)
+def _tag_buttons(tags: Tuple[Tuple[int, str], ...]) -> Tuple[Tuple[Tuple[str, str], Tuple[str, str]], ...]:
+    """Данные кнопок тегов в обоих состояниях (не выбран, выбран) — один раз на набор тегов"""
+    return tuple(
+        (
+            (f"⚪ {tag_name}", f"toggle_tag_{tag_id}"),
+            (f"✅ {tag_name}", f"toggle_tag_{tag_id}")
+        )
+        for tag_id, tag_name in tags
+    )
+
 def get_tags_keyboard(tags: List[dict], selected_tags: List[int] = None) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора тегов"""
-    if selected_tags is None:
-        selected_tags = []
+    """Клавиатура для выбора тегов
     
-    keyboard = []
-    for tag in tags:
-        tag_id = tag['id']
-        tag_name = tag['name']
-        is_selected = tag_id in selected_tags
-        emoji = "✅" if is_selected else "⚪"
-        keyboard.append([InlineKeyboardButton(
-            text=f"{emoji} {tag_name}", 
-            callback_data=f"toggle_tag_{tag_id}"
-        )])
+    При переключении тега меняется только выбор состояния кнопки,
+    тексты и callback_data берутся из кеша по набору тегов.
+    """
+    selected = set(selected_tags or ())
+    key = tuple((tag['id'], tag['name']) for tag in tags)
     
+    keyboard = []
+    for (tag_id, _), states in zip(key, _tag_buttons(key)):
+        text, callback_data = states[tag_id in selected]
+        keyboard.append([InlineKeyboardButton(text=text, callback_data=callback_data)])
     keyboard.append([InlineKeyboardButton(text="✅ Готово", callback_data="tags_done")])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+@lru_cache(maxsize=256)
+def _series_buttons(series: Tuple[Tuple[int, str, int], ...]) -> Tuple[Tuple[str, str], ...]:
+    """Данные кнопок выбора серии — один раз на набор серий и их номеров"""
+    buttons = tuple(
+        (f"📚 {title} (#{next_number})", f"select_series_{series_id}")
+        for series_id, title, next_number in series
+    )
+    return buttons + (("➕ Новая серия", "create_series"), ("⏭️ Пропустить", "skip_series"))
+
 def get_series_keyboard(series: List[dict]) -> InlineKeyboardMarkup:
     """Клавиатура для выбора серии"""
-    keyboard = []
-    for s in series:
-        keyboard.append([InlineKeyboardButton(
-            text=f"📚 {s['title']} (#{s['next_number']})", 
-            callback_data=f"select_series_{s['id']}"
-        )])
-    
-    keyboard.append([InlineKeyboardButton(text="➕ Новая серия", callback_data="create_series")])
-    keyboard.append([InlineKeyboardButton(text="⏭️ Пропустить", callback_data="skip_series")])
+    key = tuple((s['id'], s['title'], s['next_number']) for s in series)
+    keyboard = [
+        [InlineKeyboardButton(text=text, callback_data=callback_data)]
+        for text, callback_data in _series_buttons(key)
+    ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 def get_schedule_keyboard() -> InlineKeyboardMarkup:
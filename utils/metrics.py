@@ -0,0 +1,98 @@
+"""
+@file: utils/metrics.py
+@description: Простые in-process метрики: гистограммы значений и счетчики
+@dependencies: -
+@created: 2026-10-17
+"""
+
+import math
+from collections import deque
+from typing import Any, Callable, Deque, Dict
+
+class Histogram:
+    """Гистограмма значений с окном последних замеров для перцентилей"""
+
+    def __init__(self, name: str, window: int = 1000):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        """Добавляет замер"""
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self._samples.append(value)
+
+    @property
+    def mean(self) -> float:
+        """Среднее значение по всем замерам"""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Перцентиль по окну последних замеров (nearest-rank)"""
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        rank = max(1, math.ceil(p / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    def reset(self) -> None:
+        """Сбрасывает накопленные значения"""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Сводка по гистограмме"""
+        return {
+            'count': self.count,
+            'total': round(self.total, 6),
+            'mean': round(self.mean, 6),
+            'max': round(self.max, 6),
+            'p50': round(self.percentile(50), 6),
+            'p95': round(self.percentile(95), 6),
+            'p99': round(self.percentile(99), 6)
+        }
+
+# Реестр метрик процесса
+_histograms: Dict[str, Histogram] = {}
+_counters: Dict[str, int] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+
+def get_histogram(name: str) -> Histogram:
+    """Получает (или создает) гистограмму по имени"""
+    histogram = _histograms.get(name)
+    if histogram is None:
+        histogram = _histograms[name] = Histogram(name)
+    return histogram
+
+def increment(name: str, value: int = 1) -> None:
+    """Увеличивает счетчик"""
+    _counters[name] = _counters.get(name, 0) + value
+
+def get_counter(name: str) -> int:
+    """Текущее значение счетчика"""
+    return _counters.get(name, 0)
+
+def register_gauge(name: str, read: Callable[[], float]) -> None:
+    """Регистрирует gauge: текущее значение читается функцией read при снимке"""
+    _gauges[name] = read
+
+def get_metrics_snapshot() -> Dict[str, Any]:
+    """Снимок всех метрик процесса"""
+    gauges = {}
+    for name, read in sorted(_gauges.items()):
+        try:
+            gauges[name] = read()
+        except Exception:
+            gauges[name] = None
+    return {
+        'histograms': {name: h.snapshot() for name, h in sorted(_histograms.items())},
+        'counters': dict(sorted(_counters.items())),
+        'gauges': gauges
+    }
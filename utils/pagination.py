@@ -4,12 +4,42 @@
 @created: 2025-09-13
 """
 
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional, Tuple
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """Ключ (created_at, id) для callback_data: микросекунды и id в base36
+    
+    Telegram ограничивает callback_data 64 байтами; курсор занимает ~15 символов.
+    """
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    delta = created_at - _EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f"{_to_base36(micros)}.{_to_base36(item_id)}"
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Обратное к encode_cursor; ValueError при неверном формате"""
+    micros, item_id = cursor.split('.')
+    return _EPOCH + timedelta(microseconds=int(micros, 36)), int(item_id, 36)
+
+def _to_base36(value: int) -> str:
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    if value < 0:
+        return '-' + _to_base36(-value)
+    result = ''
+    while True:
+        value, remainder = divmod(value, 36)
+        result = digits[remainder] + result
+        if not value:
+            return result
+
 class PaginationManager:
     """Менеджер пагинации для больших списков"""
     
@@ -36,6 +66,36 @@ class PaginationManager:
             'items_on_page': end_index - start_index
         }
     
+    def get_cursor_page_info(self, total_items: int, current_page: int, items_on_page: int,
+                             has_previous: bool, has_next: bool, callback_prefix: str,
+                             first_key: Optional[Tuple[datetime, int]] = None,
+                             last_key: Optional[Tuple[datetime, int]] = None) -> Dict[str, Any]:
+        """Информация о странице при листании по ключу (keyset)
+        
+        Кнопки несут курсор граничного элемента страницы:
+        {prefix}_next_{стр.}_{курсор последнего} и {prefix}_prev_{стр.}_{курсор первого}.
+        total_items может быть приблизительным (кешированный счетчик), поэтому
+        наличие соседних страниц передается явно.
+        """
+        total_pages = max(1, (total_items + self.items_per_page - 1) // self.items_per_page, current_page)
+        if has_next:
+            total_pages = max(total_pages, current_page + 1)
+        start_index = (current_page - 1) * self.items_per_page
+        return {
+            'current_page': current_page,
+            'total_pages': total_pages,
+            'total_items': total_items,
+            'start_index': start_index,
+            'end_index': start_index + items_on_page,
+            'has_previous': has_previous,
+            'has_next': has_next,
+            'items_on_page': items_on_page,
+            'prev_callback': f"{callback_prefix}_prev_{current_page - 1}_{encode_cursor(*first_key)}"
+                if has_previous and first_key else None,
+            'next_callback': f"{callback_prefix}_next_{current_page + 1}_{encode_cursor(*last_key)}"
+                if has_next and last_key else None
+        }
+    
     def get_page_items(self, items: List[Any], current_page: int = 1) -> Tuple[List[Any], Dict[str, Any]]:
         """Получает элементы для текущей страницы"""
         page_info = self.get_page_info(len(items), current_page)
@@ -57,7 +117,7 @@ class PaginationManager:
         if page_info['has_previous']:
             nav_buttons.append(InlineKeyboardButton(
                 text="⬅️", 
-                callback_data=f"{callback_prefix}_page_{page_info['current_page'] - 1}"
+                callback_data=page_info.get('prev_callback') or f"{callback_prefix}_page_{page_info['current_page'] - 1}"
             ))
         
         # Информация о странице
@@ -69,7 +129,7 @@ class PaginationManager:
         if page_info['has_next']:
             nav_buttons.append(InlineKeyboardButton(
                 text="➡️", 
-                callback_data=f"{callback_prefix}_page_{page_info['current_page'] + 1}"
+                callback_data=page_info.get('next_callback') or f"{callback_prefix}_page_{page_info['current_page'] + 1}"
             ))
         
         if nav_buttons:
@@ -115,7 +175,7 @@ class PaginationManager:
         if page_info['has_previous']:
             nav_buttons.append(InlineKeyboardButton(
                 text="⬅️", 
-                callback_data=f"{callback_prefix}_page_{page_info['current_page'] - 1}"
+                callback_data=page_info.get('prev_callback') or f"{callback_prefix}_page_{page_info['current_page'] - 1}"
             ))
         
         nav_buttons.append(InlineKeyboardButton(
@@ -126,7 +186,7 @@ class PaginationManager:
         if page_info['has_next']:
             nav_buttons.append(InlineKeyboardButton(
                 text="➡️", 
-                callback_data=f"{callback_prefix}_page_{page_info['current_page'] + 1}"
+                callback_data=page_info.get('next_callback') or f"{callback_prefix}_page_{page_info['current_page'] + 1}"
             ))
         
         if nav_buttons:
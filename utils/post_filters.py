@@ -1,12 +1,36 @@
 """
 @file: utils/post_filters.py
 @description: Компонент для фильтрации и сортировки постов
-@dependencies: aiogram, datetime
+@dependencies: aiogram, datetime, utils/timezone_utils.py
 @created: 2025-09-13
 """
 
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.timezone_utils import TIMEZONE, get_now
+
+# Ключи сортировки: (колонка posts, по убыванию). Последний ключ — id, чтобы
+# порядок был однозначным и по нему можно было листать курсором.
+# Колонки в posts нет у просмотров: 'views' сортируется как 'date_desc'
+SORT_KEYS = {
+    'date_desc': (('created_at', True), ('id', True)),
+    'date_asc': (('created_at', False), ('id', False)),
+    'status': (('status', False), ('created_at', True), ('id', True)),
+    'channel': (('channel_id', False), ('created_at', True), ('id', True)),
+    'views': (('created_at', True), ('id', True)),
+}
+
+FILTERED_POSTS_QUERY = """
+    SELECT p.*, c.title as channel_title, s.title as series_title
+    FROM posts p
+    LEFT JOIN channels c ON p.channel_id = c.id
+    LEFT JOIN series s ON p.series_id = s.id
+    WHERE {where}
+    ORDER BY {order}
+    LIMIT ${limit}
+"""
 
 class PostFilters:
     def __init__(self):
@@ -84,25 +108,107 @@ class PostFilters:
         
         return InlineKeyboardMarkup(inline_keyboard=buttons)
     
+    def date_window_start(self, date_filter: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+        """Начало окна фильтра по дате (с таймзоной); None — без ограничения
+        
+        'today' — с полуночи в таймзоне бота (config.TIMEZONE)
+        """
+        now = now or get_now()
+        if date_filter == 'today':
+            local_now = now.astimezone(TIMEZONE)
+            return TIMEZONE.localize(local_now.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None))
+        if date_filter == 'week':
+            return now - timedelta(days=7)
+        if date_filter == 'month':
+            return now - timedelta(days=30)
+        return None
+    
+    def sort_keys(self, filters: dict) -> Sequence[Tuple[str, bool]]:
+        """Ключи сортировки для фильтров (по умолчанию — новые сверху)"""
+        return SORT_KEYS.get(filters.get('sort') or 'date_desc', SORT_KEYS['date_desc'])
+    
+    def build_query(self, filters: dict, user_id: Optional[int] = None,
+                    channel_id: Optional[int] = None, cursor: Optional[Sequence[Any]] = None,
+                    limit: int = 10, now: Optional[datetime] = None) -> Tuple[str, List[Any]]:
+        """Компилирует фильтры в параметризованный SQL
+        
+        Окно по дате, статус, канал (filters['channel'] или channel_id) и
+        пользователь — условия WHERE; сортировка — ORDER BY с id в конце.
+        cursor — значения ключей сортировки последнего поста предыдущей
+        страницы (см. cursor_from_post): страница читается по индексам
+        (user_id | channel_id, status, created_at, id), без OFFSET.
+        """
+        conditions: List[str] = []
+        params: List[Any] = []
+        
+        def param(value: Any) -> str:
+            params.append(value)
+            return f"${len(params)}"
+        
+        if user_id is not None:
+            conditions.append(f"p.user_id = {param(user_id)}")
+        channel_id = filters.get('channel') or channel_id
+        if channel_id is not None:
+            conditions.append(f"p.channel_id = {param(int(channel_id))}")
+        if filters.get('status') not in (None, 'all'):
+            conditions.append(f"p.status = {param(filters['status'])}")
+        window_start = self.date_window_start(filters.get('date'), now)
+        if window_start is not None:
+            conditions.append(f"p.created_at >= {param(window_start)}")
+        
+        keys = self.sort_keys(filters)
+        if cursor is not None:
+            conditions.append(self._keyset_condition(keys, [param(value) for value in cursor]))
+        
+        order = ', '.join(f"p.{column} {'DESC' if descending else 'ASC'}" for column, descending in keys)
+        query = FILTERED_POSTS_QUERY.format(
+            where=' AND '.join(conditions) or 'TRUE',
+            order=order,
+            limit=len(params) + 1
+        )
+        params.append(limit)
+        return query, params
+    
+    @staticmethod
+    def _keyset_condition(keys: Sequence[Tuple[str, bool]], placeholders: List[str]) -> str:
+        """Условие «после курсора»
+        
+        Ключи в одном направлении — сравнение кортежей (a, b) < ($1, $2):
+        по нему PostgreSQL начинает упорядоченный обход индекса сразу с курсора.
+        Разные направления кортежем не выразить — раскрываем через OR:
+        a > $1 OR (a = $1 AND (b < $2 OR (b = $2 AND ...)))
+        """
+        directions = {descending for _, descending in keys}
+        if len(directions) == 1:
+            columns = ', '.join(f"p.{column}" for column, _ in keys)
+            return f"({columns}) {'<' if directions.pop() else '>'} ({', '.join(placeholders)})"
+        column, descending = keys[-1]
+        condition = f"p.{column} {'<' if descending else '>'} {placeholders[-1]}"
+        for (column, descending), placeholder in zip(reversed(keys[:-1]), reversed(placeholders[:-1])):
+            condition = (
+                f"(p.{column} {'<' if descending else '>'} {placeholder} "
+                f"OR (p.{column} = {placeholder} AND {condition}))"
+            )
+        return f"({condition})"
+    
+    def cursor_from_post(self, post: Dict[str, Any], filters: dict) -> Tuple[Any, ...]:
+        """Значения ключей сортировки поста — курсор для следующей страницы"""
+        return tuple(post[column] for column, _ in self.sort_keys(filters))
+    
     def apply_filters(self, posts: list, filters: dict) -> list:
-        """Применяет фильтры к списку постов"""
+        """Применяет фильтры к уже загруженному списку постов
+        
+        Для списков из БД используйте build_query / PostService.list_posts_filtered
+        """
         filtered_posts = posts.copy()
         
-        # Фильтр по дате
-        if filters.get('date') != 'all':
-            now = datetime.now()
-            if filters['date'] == 'today':
-                start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                filtered_posts = [p for p in filtered_posts if p['created_at'] >= start_date]
-            elif filters['date'] == 'week':
-                start_date = now - timedelta(days=7)
-                filtered_posts = [p for p in filtered_posts if p['created_at'] >= start_date]
-            elif filters['date'] == 'month':
-                start_date = now - timedelta(days=30)
-                filtered_posts = [p for p in filtered_posts if p['created_at'] >= start_date]
+        # Фильтр по дате (created_at из БД — с таймзоной)
+        window_start = self.date_window_start(filters.get('date'))
+        if window_start is not None:
+            filtered_posts = [p for p in filtered_posts if p['created_at'] >= window_start]
         
         # Фильтр по статусу
-        if filters.get('status') != 'all':
+        if filters.get('status') not in (None, 'all'):
             filtered_posts = [p for p in filtered_posts if p['status'] == filters['status']]
         
         # Сортировка
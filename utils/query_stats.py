@@ -0,0 +1,76 @@
+"""
+@file: utils/query_stats.py
+@description: Отпечатки SQL-запросов, скрытие параметров и поиск вызывающего метода для статистики БД
+@dependencies: -
+@created: 2026-10-17
+"""
+
+import hashlib
+import re
+import sys
+from functools import lru_cache
+from datetime import date, datetime
+from typing import Any, List, Sequence
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+# Числа, кроме плейсхолдеров $1, $2, ...
+_NUMBER_LITERAL = re.compile(r'(?<![$\w])\d+\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+# Первая таблица после FROM / INTO / UPDATE — для читаемой метки запроса
+_TABLE = re.compile(r'\b(?:from|into|update)\s+([a-z_][a-z0-9_.]*)', re.IGNORECASE)
+
+def normalize_query(query: str) -> str:
+    """SQL без литералов и лишних пробелов: одинаковые по структуре запросы совпадают"""
+    normalized = _STRING_LITERAL.sub('?', query)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _IN_LIST.sub('(?)', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip()
+
+@lru_cache(maxsize=2048)
+def fingerprint_query(query: str) -> str:
+    """Короткая метка запроса: «select posts#1a2b3c4d»"""
+    normalized = normalize_query(query)
+    verb = normalized.split(' ', 1)[0].lower()
+    table_match = _TABLE.search(normalized)
+    table = table_match.group(1).lower() if table_match else '-'
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:8]
+    return f"{verb} {table}#{digest}"
+
+def redact_params(args: Sequence[Any]) -> List[str]:
+    """Параметры запроса без значений: только тип и размер (текст постов и ID в лог не попадают)"""
+    redacted = []
+    for value in args:
+        if value is None:
+            redacted.append('NULL')
+        elif isinstance(value, bool):
+            redacted.append('bool')
+        elif isinstance(value, (int, float)):
+            redacted.append(type(value).__name__)
+        elif isinstance(value, (str, bytes)):
+            redacted.append(f"{type(value).__name__}({len(value)})")
+        elif isinstance(value, (datetime, date)):
+            redacted.append(type(value).__name__)
+        elif isinstance(value, (list, tuple)):
+            redacted.append(f"{type(value).__name__}[{len(value)}]")
+        else:
+            redacted.append(type(value).__name__)
+    return redacted
+
+def find_caller(skip_files: Sequence[str]) -> str:
+    """«модуль.метод» ближайшего кадра стека вне skip_files (файлов слоя БД)"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        if frame.f_code.co_filename not in skip_files and module != 'contextlib':
+            return f"{module.rsplit('.', 1)[-1]}.{frame.f_code.co_qualname}"
+        frame = frame.f_back
+    return '?'
+
+@lru_cache(maxsize=2048)
+def is_read_query(query: str) -> bool:
+    """Только чтение: запрос можно безопасно выполнить повторно под EXPLAIN ANALYZE"""
+    normalized = normalize_query(query).lower()
+    if not normalized.startswith(('select', 'with')):
+        return False
+    return not re.search(r'\b(insert|update|delete|merge|for update|pg_notify|nextval|setval)\b', normalized)
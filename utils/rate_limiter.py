@@ -0,0 +1,121 @@
+"""
+@file: utils/rate_limiter.py
+@description: Token bucket лимитер отправки сообщений с учетом лимитов Telegram
+@dependencies: -
+@created: 2026-10-17
+"""
+
+import asyncio
+import time
+from typing import Dict
+
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько секунд ждать до появления токена"""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def consume(self, now: float) -> None:
+        """Забирает токен (вызывать после wait_time() == 0)"""
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, now: float, seconds: float) -> None:
+        """Блокирует bucket на seconds (ответ RetryAfter)"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+        self.updated = now
+
+    def is_idle(self, now: float) -> bool:
+        """Bucket полон и не заблокирован — его можно выбросить"""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+class TelegramRateLimiter:
+    """Глобальный лимит сообщений в секунду плюс лимит на каждый чат
+
+    Лимиты по умолчанию соответствуют документации Bot API: ~30 сообщений
+    в секунду на бота, 1 сообщение в секунду в личный чат и 20 сообщений
+    в минуту в группу или канал.
+    """
+
+    MAX_CHAT_BUCKETS = 1000
+
+    def __init__(self, global_rate: float = 30, private_chat_rate: float = 1,
+                 group_chat_per_minute: float = 20, group_burst: float = 3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_per_minute / 60
+        self.group_burst = group_burst
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self.throttled_count = 0
+        self.retry_after_count = 0
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.MAX_CHAT_BUCKETS:
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items()
+                    if not value.is_idle(now)
+                }
+            if chat_id > 0:
+                bucket = TokenBucket(self.private_chat_rate, 1)
+            else:
+                bucket = TokenBucket(self.group_chat_rate, self.group_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def acquire(self, chat_id: int) -> float:
+        """Ждет разрешения на отправку в чат, возвращает время ожидания"""
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            chat_bucket = self._chat_bucket(chat_id, now)
+            wait = max(self.global_bucket.wait_time(now), chat_bucket.wait_time(now))
+            if wait <= 0:
+                # Между проверкой и списанием нет await — операция атомарна для event loop
+                self.global_bucket.consume(now)
+                chat_bucket.consume(now)
+                if waited:
+                    self.throttled_count += 1
+                return waited
+            waited += wait
+            await asyncio.sleep(wait)
+
+    def on_retry_after(self, chat_id: int, retry_after: float) -> None:
+        """Учитывает ответ 429 RetryAfter: чат блокируется на retry_after секунд"""
+        now = time.monotonic()
+        self._chat_bucket(chat_id, now).block(now, retry_after)
+        self.retry_after_count += 1
+        logger.warning("⏳ Flood control для чата %s: пауза %s сек", chat_id, retry_after)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика лимитера"""
+        return {
+            'chats_tracked': len(self._chat_buckets),
+            'throttled_count': self.throttled_count,
+            'retry_after_count': self.retry_after_count
+        }